@@ -0,0 +1,46 @@
+"""Store payload_hash as 16-byte BYTEA digest
+
+Revision ID: 8c9d0e1f2a3b
+Revises: 7a8b9c0d1e2f
+Create Date: 2026-10-19 10:00:00.000000
+
+Converted rows keep their MD5 digests (decoded from hex), while rows hashed after the
+upgrade default to BLAKE2b (PAYLOAD_HASH_ALGORITHM), so one column mixes both algorithms
+until the ELT rewrites a row. The raw-vs-staging anti-join stays correct only because
+staging.records copies raw.data's hash verbatim instead of recomputing it: both sides of
+a row always carry the same digest, whichever algorithm produced it.
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8c9d0e1f2a3b'
+down_revision: Union[str, Sequence[str], None] = '7a8b9c0d1e2f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Existing values are 32-char hex MD5; anything else cannot be decoded and is reset to NULL
+# (NULL raw hashes are recomputed by the ELT, NULL staging hashes simply don't match the anti-join)
+HEX_TO_BYTEA = "CASE WHEN payload_hash ~ '^[0-9a-fA-F]{32}$' THEN decode(payload_hash, 'hex') END"
+
+
+def upgrade() -> None:
+    # 1. raw.data: convert column and rebuild the index on half-size keys
+    op.execute("DROP INDEX IF EXISTS raw.idx_raw_payload_hash")
+    op.execute(f"ALTER TABLE raw.data ALTER COLUMN payload_hash TYPE BYTEA USING {HEX_TO_BYTEA}")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_raw_payload_hash ON raw.data (payload_hash)")
+
+    # 2. staging.records: convert column and index it for the raw-vs-staging anti-join
+    op.execute(f"ALTER TABLE staging.records ALTER COLUMN payload_hash TYPE BYTEA USING {HEX_TO_BYTEA}")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_staging_payload_hash ON staging.records (payload_hash)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS staging.idx_staging_payload_hash")
+    op.execute("ALTER TABLE staging.records ALTER COLUMN payload_hash TYPE TEXT USING encode(payload_hash, 'hex')")
+
+    op.execute("DROP INDEX IF EXISTS raw.idx_raw_payload_hash")
+    op.execute("ALTER TABLE raw.data ALTER COLUMN payload_hash TYPE TEXT USING encode(payload_hash, 'hex')")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_raw_payload_hash ON raw.data (payload_hash)")
@@ -0,0 +1,45 @@
+"""Create etl.rejected_records dead-letter table
+
+Revision ID: 9d0e1f2a3b4c
+Revises: 8c9d0e1f2a3b
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9d0e1f2a3b4c'
+down_revision: Union[str, Sequence[str], None] = '8c9d0e1f2a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SCHEMA IF NOT EXISTS etl")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS etl.rejected_records (
+            id BIGSERIAL PRIMARY KEY,
+            raw_id TEXT NOT NULL,
+            source TEXT,
+            source_type TEXT,
+            stage TEXT NOT NULL,
+            error_class TEXT,
+            error_message TEXT,
+            payload_hash BYTEA,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            rejected_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+            resolved_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    # One open rejection per row and stage: repeated failures bump attempts instead of piling up
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_rejected_records_open
+        ON etl.rejected_records (raw_id, stage) WHERE resolved_at IS NULL
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_rejected_records_rejected_at ON etl.rejected_records (rejected_at)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS etl.rejected_records")
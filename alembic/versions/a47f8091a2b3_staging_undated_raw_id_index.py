@@ -0,0 +1,30 @@
+"""Keyset index on staging.records (raw_id) for undated rows of the read API
+
+Revision ID: a47f8091a2b3
+Revises: f36e7f8091a2
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a47f8091a2b3'
+down_revision: Union[str, Sequence[str], None] = 'f36e7f8091a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # After the dated rows /v1/transactions pages undated ones with raw_id < (cursor) ORDER BY raw_id DESC
+    # LIMIT n; without this index every such page scans and sorts all undated rows.
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_staging_undated_raw_id
+        ON staging.records (raw_id)
+        WHERE date IS NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS staging.idx_staging_undated_raw_id")
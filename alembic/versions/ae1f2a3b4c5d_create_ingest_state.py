@@ -0,0 +1,36 @@
+"""Create etl.ingest_state for manifest-driven ingestion
+
+Revision ID: ae1f2a3b4c5d
+Revises: 9d0e1f2a3b4c
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'ae1f2a3b4c5d'
+down_revision: Union[str, Sequence[str], None] = '9d0e1f2a3b4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SCHEMA IF NOT EXISTS etl")
+    # Content hash of the last loaded values per manifest entry; unchanged ranges are skipped
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS etl.ingest_state (
+            spreadsheet_id TEXT NOT NULL,
+            range TEXT NOT NULL,
+            source TEXT NOT NULL,
+            content_hash BYTEA NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            loaded_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+            PRIMARY KEY (spreadsheet_id, range, source)
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS etl.ingest_state")
@@ -0,0 +1,53 @@
+"""Create etl.jobs work queue
+
+Revision ID: bf2a3b4c5d6e
+Revises: ae1f2a3b4c5d
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'bf2a3b4c5d6e'
+down_revision: Union[str, Sequence[str], None] = 'ae1f2a3b4c5d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SCHEMA IF NOT EXISTS etl")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS etl.jobs (
+            id BIGSERIAL PRIMARY KEY,
+            source TEXT NOT NULL,
+            source_type TEXT NOT NULL,
+            raw_ids TEXT[] NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'running', 'done', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            leased_by TEXT,
+            lease_expires_at TIMESTAMP WITH TIME ZONE,
+            rows_upserted INTEGER,
+            rows_rejected INTEGER,
+            error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()),
+            started_at TIMESTAMP WITH TIME ZONE,
+            finished_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    # Claim scans only open jobs in id order
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_open
+        ON etl.jobs (id) WHERE status IN ('pending', 'running')
+    """)
+    # Enqueue skips raw ids already held by an open job (raw_ids @> ARRAY[id])
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_open_raw_ids
+        ON etl.jobs USING GIN (raw_ids) WHERE status IN ('pending', 'running')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS etl.jobs")
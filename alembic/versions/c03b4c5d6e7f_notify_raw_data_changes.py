@@ -0,0 +1,79 @@
+"""Notify raw_data_changed on raw.data inserts and payload updates
+
+Revision ID: c03b4c5d6e7f
+Revises: bf2a3b4c5d6e
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c03b4c5d6e7f'
+down_revision: Union[str, Sequence[str], None] = 'bf2a3b4c5d6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 1. Statement-level function: one NOTIFY per 50 changed ids and source, so a bulk load
+    #    sends a handful of messages and each payload stays well under the 8000-byte limit
+    op.execute("""
+        CREATE OR REPLACE FUNCTION raw.fn_notify_raw_data_changed()
+        RETURNS TRIGGER AS $$
+        DECLARE
+            chunk RECORD;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                FOR chunk IN
+                    SELECT source, json_agg(id) AS ids
+                    FROM (
+                        SELECT source, id, (row_number() OVER (PARTITION BY source ORDER BY id) - 1) / 50 AS grp
+                        FROM new_rows
+                    ) t
+                    GROUP BY source, grp
+                LOOP
+                    PERFORM pg_notify('raw_data_changed', json_build_object('source', chunk.source, 'ids', chunk.ids)::text);
+                END LOOP;
+            ELSE
+                -- Updates only matter when the payload actually changed
+                FOR chunk IN
+                    SELECT source, json_agg(id) AS ids
+                    FROM (
+                        SELECT n.source, n.id, (row_number() OVER (PARTITION BY n.source ORDER BY n.id) - 1) / 50 AS grp
+                        FROM new_rows n
+                        JOIN old_rows o ON o.id = n.id
+                        WHERE o.payload_hash IS DISTINCT FROM n.payload_hash
+                    ) t
+                    GROUP BY source, grp
+                LOOP
+                    PERFORM pg_notify('raw_data_changed', json_build_object('source', chunk.source, 'ids', chunk.ids)::text);
+                END LOOP;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # 2. Transition tables allow a single event per trigger, so INSERT and UPDATE get one each
+    op.execute("""
+        CREATE TRIGGER trg_notify_raw_data_insert
+        AFTER INSERT ON raw.data
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION raw.fn_notify_raw_data_changed();
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_notify_raw_data_update
+        AFTER UPDATE ON raw.data
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION raw.fn_notify_raw_data_changed();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_raw_data_update ON raw.data")
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_raw_data_insert ON raw.data")
+    op.execute("DROP FUNCTION IF EXISTS raw.fn_notify_raw_data_changed")
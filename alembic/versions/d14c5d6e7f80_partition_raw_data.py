@@ -0,0 +1,224 @@
+"""Partition raw.data by source and extraction month, BRIN on extracted_at
+
+Revision ID: d14c5d6e7f80
+Revises: c03b4c5d6e7f
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd14c5d6e7f80'
+down_revision: Union[str, Sequence[str], None] = 'c03b4c5d6e7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same body as c03b4c5d6e7f plus an opt-out: the legacy mover sets etl.skip_notify so
+# re-homing old rows does not wake up every serve daemon
+NOTIFY_FUNCTION = """
+    CREATE OR REPLACE FUNCTION raw.fn_notify_raw_data_changed()
+    RETURNS TRIGGER AS $$
+    DECLARE
+        chunk RECORD;
+    BEGIN
+        IF current_setting('etl.skip_notify', true) = 'on' THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            FOR chunk IN
+                SELECT source, json_agg(id) AS ids
+                FROM (
+                    SELECT source, id, (row_number() OVER (PARTITION BY source ORDER BY id) - 1) / 50 AS grp
+                    FROM new_rows
+                ) t
+                GROUP BY source, grp
+            LOOP
+                PERFORM pg_notify('raw_data_changed', json_build_object('source', chunk.source, 'ids', chunk.ids)::text);
+            END LOOP;
+        ELSE
+            -- Updates only matter when the payload actually changed
+            FOR chunk IN
+                SELECT source, json_agg(id) AS ids
+                FROM (
+                    SELECT n.source, n.id, (row_number() OVER (PARTITION BY n.source ORDER BY n.id) - 1) / 50 AS grp
+                    FROM new_rows n
+                    JOIN old_rows o ON o.id = n.id
+                    WHERE o.payload_hash IS DISTINCT FROM n.payload_hash
+                ) t
+                GROUP BY source, grp
+            LOOP
+                PERFORM pg_notify('raw_data_changed', json_build_object('source', chunk.source, 'ids', chunk.ids)::text);
+            END LOOP;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+def _create_notify_triggers() -> None:
+    op.execute("""
+        CREATE TRIGGER trg_notify_raw_data_insert
+        AFTER INSERT ON raw.data
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION raw.fn_notify_raw_data_changed();
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_notify_raw_data_update
+        AFTER UPDATE ON raw.data
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION raw.fn_notify_raw_data_changed();
+    """)
+
+
+def upgrade() -> None:
+    # 1. Keep the old heap as raw.data_legacy; its rows are moved in batches by `main.py migrate-raw`,
+    #    so the migration itself only takes a brief lock for the renames
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_raw_data_update ON raw.data")
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_raw_data_insert ON raw.data")
+    op.execute("ALTER TABLE raw.data RENAME TO data_legacy")
+    op.execute("ALTER INDEX raw.data_pkey RENAME TO data_legacy_pkey")
+    op.execute("ALTER INDEX IF EXISTS raw.idx_raw_payload_hash RENAME TO idx_raw_legacy_payload_hash")
+
+    # 2. LIST by source, each source RANGE by extraction month. A unique key on a partitioned
+    #    table must contain the partition columns, so the primary key is (id, source, extracted_at)
+    op.execute("""
+        CREATE TABLE raw.data (
+            id TEXT NOT NULL,
+            source TEXT NOT NULL,
+            payload JSONB,
+            payload_hash BYTEA,
+            extracted_at TIMESTAMPTZ NOT NULL DEFAULT timezone('utc'::text, now()),
+            CONSTRAINT data_pkey PRIMARY KEY (id, source, extracted_at)
+        ) PARTITION BY LIST (source)
+    """)
+    op.execute("CREATE INDEX idx_raw_data_payload_hash ON raw.data (payload_hash)")
+    # Rows arrive in extraction order, so a block-range index stays tiny and still skips old ranges
+    op.execute("CREATE INDEX idx_raw_data_extracted_at_brin ON raw.data USING brin (extracted_at)")
+
+    # 3. Global uniqueness of raw ids lives in a small unpartitioned table: loaders claim an id here
+    #    with ON CONFLICT DO NOTHING and insert into raw.data only the ids they won
+    op.execute("""
+        CREATE TABLE raw.data_ids (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL
+        )
+    """)
+
+    # 4. Creates the source partition and p_months monthly sub-partitions starting at p_from (UTC months)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION raw.ensure_data_partitions(
+            p_source TEXT, p_from TIMESTAMPTZ DEFAULT now(), p_months INTEGER DEFAULT 2
+        )
+        RETURNS VOID AS $$
+        DECLARE
+            parent TEXT := 'data_' || left(regexp_replace(lower(p_source), '[^a-z0-9]+', '_', 'g'), 40)
+                           || '_' || left(md5(p_source), 6);
+            month_start TIMESTAMP;
+            child TEXT;
+        BEGIN
+            -- Two loaders of a new source must not race on CREATE TABLE
+            PERFORM pg_advisory_xact_lock(hashtext('raw.data partitions:' || p_source));
+            IF to_regclass(format('raw.%I', parent)) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE raw.%I PARTITION OF raw.data FOR VALUES IN (%L) PARTITION BY RANGE (extracted_at)',
+                    parent, p_source
+                );
+            END IF;
+            FOR i IN 0 .. p_months - 1 LOOP
+                month_start := date_trunc('month', p_from AT TIME ZONE 'UTC') + make_interval(months => i);
+                child := parent || '_' || to_char(month_start, 'YYYYMM');
+                IF to_regclass(format('raw.%I', child)) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE raw.%I PARTITION OF raw.%I FOR VALUES FROM (%L) TO (%L)',
+                        child, parent,
+                        month_start AT TIME ZONE 'UTC',
+                        (month_start + interval '1 month') AT TIME ZONE 'UTC'
+                    );
+                END IF;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # 5. Moves up to p_limit legacy rows; an id already claimed in raw.data_ids was reloaded after the
+    #    rename, so the newer row wins and the legacy copy is dropped. Returns rows removed from legacy.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION raw.move_legacy_data(p_limit INTEGER)
+        RETURNS INTEGER AS $$
+        DECLARE
+            moved INTEGER;
+        BEGIN
+            PERFORM set_config('etl.skip_notify', 'on', true);
+            WITH batch AS (
+                DELETE FROM raw.data_legacy
+                WHERE ctid = ANY (ARRAY(
+                    SELECT ctid FROM raw.data_legacy LIMIT p_limit FOR UPDATE SKIP LOCKED
+                ))
+                RETURNING id, source, payload, payload_hash,
+                          COALESCE(extracted_at, timezone('utc'::text, now())) AS extracted_at
+            ), claimed AS (
+                INSERT INTO raw.data_ids (id, source)
+                SELECT id, source FROM batch
+                ON CONFLICT (id) DO NOTHING
+                RETURNING id
+            ), inserted AS (
+                INSERT INTO raw.data (id, source, payload, payload_hash, extracted_at)
+                SELECT b.id, b.source, b.payload, b.payload_hash, b.extracted_at
+                FROM batch b JOIN claimed c ON c.id = b.id
+            )
+            SELECT count(*) INTO moved FROM batch;
+            PERFORM set_config('etl.skip_notify', 'off', true);
+            RETURN moved;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # 6. Partitions for every month already present in legacy, plus the current and next month
+    op.execute("""
+        SELECT raw.ensure_data_partitions(source, month_start, 1)
+        FROM (
+            SELECT DISTINCT source,
+                   date_trunc('month', COALESCE(extracted_at, now()) AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS month_start
+            FROM raw.data_legacy
+        ) t
+    """)
+    op.execute("SELECT raw.ensure_data_partitions(source) FROM (SELECT DISTINCT source FROM raw.data_legacy) t")
+
+    # 7. Same notifications as before, now on the partitioned parent
+    op.execute(NOTIFY_FUNCTION)
+    _create_notify_triggers()
+
+
+def downgrade() -> None:
+    # Not online: folds the partitions and whatever is still in legacy back into one heap
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_raw_data_update ON raw.data")
+    op.execute("DROP TRIGGER IF EXISTS trg_notify_raw_data_insert ON raw.data")
+    op.execute("DROP FUNCTION IF EXISTS raw.move_legacy_data")
+    op.execute("DROP FUNCTION IF EXISTS raw.ensure_data_partitions")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS raw.data_legacy (
+            id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            payload JSONB,
+            payload_hash BYTEA,
+            extracted_at TIMESTAMPTZ DEFAULT timezone('utc'::text, now())
+        )
+    """)
+    op.execute("""
+        INSERT INTO raw.data_legacy (id, source, payload, payload_hash, extracted_at)
+        SELECT id, source, payload, payload_hash, extracted_at FROM raw.data
+        ON CONFLICT (id) DO NOTHING
+    """)
+    op.execute("DROP TABLE raw.data")
+    op.execute("DROP TABLE raw.data_ids")
+    op.execute("ALTER TABLE raw.data_legacy RENAME TO data")
+    op.execute("ALTER INDEX IF EXISTS raw.data_legacy_pkey RENAME TO data_pkey")
+    op.execute("DROP INDEX IF EXISTS raw.idx_raw_legacy_payload_hash")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_raw_payload_hash ON raw.data (payload_hash)")
+    # The etl.skip_notify check is harmless on the plain table, so the function is kept as is
+    _create_notify_triggers()
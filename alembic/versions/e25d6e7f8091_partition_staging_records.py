@@ -0,0 +1,232 @@
+"""Partition staging.records by source_type and business-date year
+
+Revision ID: e25d6e7f8091
+Revises: d14c5d6e7f80
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e25d6e7f8091'
+down_revision: Union[str, Sequence[str], None] = 'd14c5d6e7f80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Views read staging.records, so they are dropped with the old table and recreated unchanged
+# (same SQL as 129f09ac6c14 and b80da1af78f7)
+VIEWS = {
+    "marts.financials_v": """
+        CREATE OR REPLACE VIEW marts.financials_v AS
+        SELECT
+            to_char(date_trunc('month', COALESCE(payment_date, date)), 'YYYY-MM') AS year_month,
+            type,
+            ROUND(SUM(total_rub)) AS total_rub,
+            COUNT(*) as record_count,
+            now() as last_updated
+        FROM staging.records
+        WHERE type IN ('Доход', 'Расход', 'Income', 'Expense')
+          AND COALESCE(payment_date, date) >= '2005-01-01'::timestamptz
+        GROUP BY 1, 2
+        ORDER BY 1 DESC, 2;
+    """,
+    "marts.expenses_by_category_v": """
+        CREATE OR REPLACE VIEW marts.expenses_by_category_v AS
+        SELECT
+            COALESCE(category, 'Uncategorized') AS category,
+            ROUND(SUM(total_rub)) AS total_rub,
+            COUNT(*) as record_count,
+            now() as last_updated
+        FROM staging.records
+        WHERE (type = 'Расход' OR type = 'Expense')
+        GROUP BY 1
+        ORDER BY 2 DESC;
+    """,
+    "marts.web_transactions_v": """
+        CREATE OR REPLACE VIEW marts.web_transactions_v AS
+        SELECT
+            raw_id,
+            date,
+            payment_date,
+            type,
+            client,
+            vendor,
+            category,
+            total_rub,
+            currency,
+            description,
+            source_type
+        FROM staging.records
+        ORDER BY date DESC;
+    """,
+    "marts.dim_clients_v": """
+        CREATE OR REPLACE VIEW marts.dim_clients_v AS
+        WITH explicit AS (
+            SELECT
+                client as name,
+                received_at as updated_at,
+                'manual' as origin
+            FROM staging.records
+            WHERE source_type = 'ref_clients'
+        ),
+        implicit AS (
+            SELECT DISTINCT
+                client as name,
+                NULL::timestamp as updated_at,
+                'transaction' as origin
+            FROM staging.records
+            WHERE client IS NOT NULL AND client != ''
+        )
+        SELECT DISTINCT ON (name) name, updated_at, origin
+        FROM (SELECT * FROM explicit UNION ALL SELECT * FROM implicit) all_clients
+        ORDER BY name, origin DESC; -- manual preferred over transaction
+    """,
+    "marts.dim_categories_v": """
+        CREATE OR REPLACE VIEW marts.dim_categories_v AS
+        SELECT DISTINCT
+            COALESCE(category, 'Uncategorized') as name
+        FROM staging.records
+        WHERE category IS NOT NULL AND category != ''
+        ORDER BY 1;
+    """,
+    "marts.dim_vendors_v": """
+        CREATE OR REPLACE VIEW marts.dim_vendors_v AS
+        SELECT DISTINCT
+            vendor as name
+        FROM staging.records
+        WHERE vendor IS NOT NULL AND vendor != ''
+        ORDER BY 1;
+    """,
+}
+
+
+def _drop_views() -> None:
+    for name in VIEWS:
+        op.execute(f"DROP VIEW IF EXISTS {name}")
+
+
+def _create_views() -> None:
+    for sql in VIEWS.values():
+        op.execute(sql)
+
+
+def upgrade() -> None:
+    # 1. Keep the old heap aside; LIKE copies every column it has, including ones added outside migrations
+    _drop_views()
+    op.execute("DROP TRIGGER IF EXISTS trg_audit_staging_records ON staging.records")
+    op.execute("ALTER TABLE staging.records RENAME TO records_unpartitioned")
+    op.execute("UPDATE staging.records_unpartitioned SET source_type = 'live' WHERE source_type IS NULL")
+
+    # 2. LIST by source_type, each type RANGE by business date (UTC years). Unknown types land in
+    #    staging.records_default, rows without a date in the type's own default partition.
+    op.execute("""
+        CREATE TABLE staging.records (LIKE staging.records_unpartitioned INCLUDING DEFAULTS)
+        PARTITION BY LIST (source_type)
+    """)
+    op.execute("ALTER TABLE staging.records ALTER COLUMN source_type SET DEFAULT 'live'")
+    op.execute("ALTER TABLE staging.records ALTER COLUMN source_type SET NOT NULL")
+    op.execute("CREATE TABLE staging.records_default PARTITION OF staging.records DEFAULT")
+
+    # 3. Creates the source_type partition and, if p_year is given, its year partition. Rows that were
+    #    routed to a default partition in the meantime move into the new partition before ATTACH,
+    #    which would otherwise fail validating the default.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION staging.ensure_records_partitions(p_source_type TEXT, p_year INTEGER DEFAULT NULL)
+        RETURNS VOID AS $$
+        DECLARE
+            parent TEXT := 'records_' || left(regexp_replace(lower(p_source_type), '[^a-z0-9]+', '_', 'g'), 40)
+                           || '_' || left(md5(p_source_type), 6);
+            child TEXT;
+            lo TIMESTAMPTZ;
+            hi TIMESTAMPTZ;
+        BEGIN
+            -- ATTACH validates the default partition; one creator at a time keeps that check cheap and race-free
+            PERFORM pg_advisory_xact_lock(hashtext('staging.records partitions'));
+            IF to_regclass(format('staging.%I', parent)) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE staging.%I (LIKE staging.records INCLUDING DEFAULTS) PARTITION BY RANGE (date)', parent
+                );
+                EXECUTE format('CREATE TABLE staging.%I PARTITION OF staging.%I DEFAULT', parent || '_default', parent);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM staging.records_default WHERE source_type = %L RETURNING *) '
+                    'INSERT INTO staging.%I SELECT * FROM moved',
+                    p_source_type, parent
+                );
+                EXECUTE format('ALTER TABLE staging.records ATTACH PARTITION staging.%I FOR VALUES IN (%L)', parent, p_source_type);
+            END IF;
+
+            IF p_year IS NULL THEN
+                RETURN;
+            END IF;
+            child := parent || '_' || p_year;
+            IF to_regclass(format('staging.%I', child)) IS NULL THEN
+                lo := make_timestamptz(p_year, 1, 1, 0, 0, 0, 'UTC');
+                hi := make_timestamptz(p_year + 1, 1, 1, 0, 0, 0, 'UTC');
+                EXECUTE format('CREATE TABLE staging.%I (LIKE staging.records INCLUDING DEFAULTS)', child);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM staging.%I WHERE date >= %L AND date < %L RETURNING *) '
+                    'INSERT INTO staging.%I SELECT * FROM moved',
+                    parent || '_default', lo, hi, child
+                );
+                EXECUTE format(
+                    'ALTER TABLE staging.%I ATTACH PARTITION staging.%I FOR VALUES FROM (%L) TO (%L)',
+                    parent, child, lo, hi
+                );
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # 4. Partitions for every source_type/year already in staging, then the data itself
+    op.execute("""
+        SELECT staging.ensure_records_partitions(source_type, year)
+        FROM (
+            SELECT DISTINCT source_type, extract(year FROM date AT TIME ZONE 'UTC')::int AS year
+            FROM staging.records_unpartitioned
+        ) t
+    """)
+    op.execute("INSERT INTO staging.records SELECT * FROM staging.records_unpartitioned")
+    op.execute("DROP TABLE staging.records_unpartitioned")
+
+    # 5. Indexes after the bulk copy. A unique key on a partitioned table must contain the partition
+    #    columns; NULLS NOT DISTINCT keeps undated rows unique too, so ON CONFLICT still matches them.
+    op.execute("""
+        ALTER TABLE staging.records
+        ADD CONSTRAINT records_raw_id_key UNIQUE NULLS NOT DISTINCT (raw_id, source_type, date)
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_staging_type ON staging.records (type)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_staging_payload_hash ON staging.records (payload_hash)")
+
+    # 6. AFTER UPDATE row triggers do not fire when an UPDATE moves a row to another partition
+    #    (it becomes DELETE + INSERT), so the audit runs BEFORE UPDATE and sees every payload change
+    op.execute("""
+        CREATE TRIGGER trg_audit_staging_records
+        BEFORE UPDATE ON staging.records
+        FOR EACH ROW
+        EXECUTE FUNCTION staging.fn_audit_record_changes();
+    """)
+    _create_views()
+
+
+def downgrade() -> None:
+    _drop_views()
+    op.execute("DROP TRIGGER IF EXISTS trg_audit_staging_records ON staging.records")
+    op.execute("CREATE TABLE staging.records_unpartitioned (LIKE staging.records INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE staging.records_unpartitioned ALTER COLUMN source_type DROP NOT NULL")
+    op.execute("INSERT INTO staging.records_unpartitioned SELECT * FROM staging.records")
+    op.execute("DROP TABLE staging.records")
+    op.execute("DROP FUNCTION IF EXISTS staging.ensure_records_partitions")
+    op.execute("ALTER TABLE staging.records_unpartitioned RENAME TO records")
+    op.execute("ALTER TABLE staging.records ADD PRIMARY KEY (raw_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_staging_type ON staging.records (type)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_staging_source ON staging.records (source_type)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_staging_payload_hash ON staging.records (payload_hash)")
+    op.execute("""
+        CREATE TRIGGER trg_audit_staging_records
+        AFTER UPDATE ON staging.records
+        FOR EACH ROW
+        EXECUTE FUNCTION staging.fn_audit_record_changes();
+    """)
+    _create_views()
@@ -0,0 +1,31 @@
+"""Keyset index on staging.records (date, raw_id) for the read API
+
+Revision ID: f36e7f8091a2
+Revises: e25d6e7f8091
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f36e7f8091a2'
+down_revision: Union[str, Sequence[str], None] = 'e25d6e7f8091'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /v1/transactions pages with (date, raw_id) < (cursor) ORDER BY date DESC, raw_id DESC LIMIT n;
+    # each partition walks this index backwards and Merge Append stops after n rows.
+    # Partial: undated rows are paged by raw_id alone and use idx_staging_undated_raw_id (a47f8091a2b3).
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_staging_date_raw_id
+        ON staging.records (date, raw_id)
+        WHERE date IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS staging.idx_staging_date_raw_id")
@@ -0,0 +1 @@
+"""Микробенчмарки горячего пути ELT."""
@@ -0,0 +1,50 @@
+"""Бенчмарки хеширования payload: legacy hex-хеши против 16-байтовых дайджестов.
+
+Использование:
+    python -m benchmarks.bench_hash --output bench_hash.json
+    python -m benchmarks.bench_hash --compare bench_hash.json --max-ratio 1.2
+"""
+
+import hashlib
+import json
+
+from benchmarks.payloads import generate_payloads
+from benchmarks.runner import Case, main
+from src.utils import HASH_FUNCTIONS, canonical_json
+
+
+def build_cases(size: int) -> list[Case]:
+    """Собирает кейсы хеширования на size синтетических строках."""
+    payloads = generate_payloads(size)
+    encoded = [canonical_json(p) for p in payloads]
+
+    def run_legacy_md5_hex() -> None:
+        # Pre-migration load path: stdlib dumps + hex MD5 stored as TEXT
+        for p in payloads:
+            hashlib.md5(json.dumps(p, sort_keys=True).encode()).hexdigest()
+
+    def run_legacy_sha256_hex() -> None:
+        for p in payloads:
+            hashlib.sha256(json.dumps(p, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def run_canonical_json() -> None:
+        for p in payloads:
+            canonical_json(p)
+
+    cases = [
+        Case("legacy_md5_hex", run_legacy_md5_hex, len(payloads)),
+        Case("legacy_sha256_hex", run_legacy_sha256_hex, len(payloads)),
+        Case("canonical_json", run_canonical_json, len(payloads)),
+    ]
+    for name, digest in HASH_FUNCTIONS.items():
+
+        def run_digest(digest=digest) -> None:
+            for data in encoded:
+                digest(data)
+
+        cases.append(Case(f"digest_{name}", run_digest, len(encoded)))
+    return cases
+
+
+if __name__ == "__main__":
+    main(build_cases, "Payload hashing micro-benchmarks")
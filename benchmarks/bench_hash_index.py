@@ -0,0 +1,94 @@
+"""Размер индекса и время anti-join: payload_hash TEXT (hex) против BYTEA (16 байт).
+
+Нужна доступная БД (временные таблицы, данные не трогаются):
+    python -m benchmarks.bench_hash_index --rows 200000 --output bench_hash_index.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import asyncpg
+
+# Column expression per key layout; md5(i) stands in for the payload digest
+LAYOUTS = {
+    "text_hex": ("TEXT", "md5(i::text)"),
+    "bytea_16": ("BYTEA", "decode(md5(i::text), 'hex')"),
+}
+
+
+async def _bench_layout(conn: asyncpg.Connection, name: str, column_type: str, expr: str, rows: int) -> dict[str, Any]:
+    raw, staging = f"bench_raw_{name}", f"bench_staging_{name}"
+    await conn.execute(f"CREATE TEMP TABLE {raw} (payload_hash {column_type})")
+    await conn.execute(f"CREATE TEMP TABLE {staging} (payload_hash {column_type})")
+    await conn.execute(f"INSERT INTO {raw} SELECT {expr} FROM generate_series(1, $1) AS i", rows)
+    # Staging lags by 10%, so the anti-join returns the newest tenth of raw
+    await conn.execute(f"INSERT INTO {staging} SELECT {expr} FROM generate_series(1, $1) AS i", rows * 9 // 10)
+    await conn.execute(f"CREATE INDEX ON {raw} (payload_hash)")
+    await conn.execute(f"CREATE INDEX ON {staging} (payload_hash)")
+    await conn.execute(f"ANALYZE {raw}")
+    await conn.execute(f"ANALYZE {staging}")
+
+    start = time.perf_counter()
+    changed = await conn.fetchval(
+        f"SELECT count(*) FROM {raw} r LEFT JOIN {staging} s ON r.payload_hash = s.payload_hash "
+        "WHERE s.payload_hash IS NULL"
+    )
+    anti_join = time.perf_counter() - start
+
+    sizes = await conn.fetchrow(
+        "SELECT pg_relation_size($1::regclass) AS table_bytes, pg_indexes_size($1::regclass) AS index_bytes",
+        raw,
+    )
+    return {
+        "rows": rows,
+        "changed": changed,
+        "table_bytes": sizes["table_bytes"],
+        "index_bytes": sizes["index_bytes"],
+        "anti_join_ms": round(anti_join * 1000, 2),
+    }
+
+
+async def run(dsn: str, rows: int) -> dict[str, Any]:
+    conn = await asyncpg.connect(dsn=dsn)
+    try:
+        results = {}
+        for name, (column_type, expr) in LAYOUTS.items():
+            results[name] = await _bench_layout(conn, name, column_type, expr, rows)
+            r = results[name]
+            print(
+                f"{name:<10} index {r['index_bytes'] / 2**20:>8.2f} MB  table {r['table_bytes'] / 2**20:>8.2f} MB  "
+                f"anti-join {r['anti_join_ms']:>9.1f} ms",
+                file=sys.stderr,
+            )
+        return {"rows": rows, "results": results}
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="payload_hash key layout benchmark (index size, anti-join)")
+    parser.add_argument("--dsn", help="Postgres DSN (default: POSTGRES_URI setting)")
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows in the synthetic raw table")
+    parser.add_argument("--output", type=Path, help="Write JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    dsn = args.dsn
+    if not dsn:
+        from src.config import settings
+
+        dsn = str(settings.POSTGRES_URI)
+    report = asyncio.run(run(dsn, args.rows))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
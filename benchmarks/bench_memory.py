@@ -0,0 +1,83 @@
+"""Память нормализованных записей: dict на строку против StagingRow (tracemalloc).
+
+Использование:
+    python -m benchmarks.bench_memory --size 5000 --output bench_memory.json
+
+Цифры приводятся к 100k строк; tracemalloc замедляет нормализацию в несколько раз.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+from benchmarks.payloads import generate_payloads
+from src.transform import _prepare_staging_rows, normalize_records
+
+PER_ROWS = 100_000
+
+
+def _measure(raw: list[dict[str, Any]], as_rows: bool) -> dict[str, Any]:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        normalized, _ = normalize_records(raw, as_rows=as_rows)
+        retained, normalize_peak = tracemalloc.get_traced_memory()
+        after_normalize = tracemalloc.take_snapshot()
+
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        prepared = _prepare_staging_rows(normalized)
+        after_prepare, prepare_peak = tracemalloc.get_traced_memory()
+        prepare_snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    size = len(raw)
+    scale = PER_ROWS / size
+    blocks = sum(s.count_diff for s in after_normalize.compare_to(before, "filename"))
+    prepare_blocks = sum(s.count_diff for s in prepare_snapshot.compare_to(after_normalize, "filename"))
+    del normalized, prepared
+    return {
+        "rows": size,
+        "normalized_mb_per_100k": round(retained * scale / 2**20, 1),
+        "normalize_peak_mb_per_100k": round(normalize_peak * scale / 2**20, 1),
+        "retained_blocks_per_row": round(blocks / size, 1),
+        "prepare_extra_mb_per_100k": round((after_prepare - base) * scale / 2**20, 1),
+        "prepare_peak_mb_per_100k": round((prepare_peak - base) * scale / 2**20, 1),
+        "prepare_blocks_per_row": round(prepare_blocks / size, 1) + 0.0,
+    }
+
+
+def run(size: int) -> dict[str, Any]:
+    payloads = generate_payloads(size)
+    received_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    raw = [{"raw_id": i, "received_at": received_at, "raw_payload": p} for i, p in enumerate(payloads)]
+    results = {}
+    for name, as_rows in (("dict", False), ("staging_row", True)):
+        results[name] = _measure(raw, as_rows)
+        print(f"{name:<12} {results[name]}", file=sys.stderr)
+    return {"results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memory per normalized row: dict vs StagingRow")
+    parser.add_argument("--size", type=int, default=5_000, help="Synthetic rows (results are scaled to 100k)")
+    parser.add_argument("--output", type=Path, help="Write JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    text = json.dumps(run(args.size), indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Партиционирование raw.data: сколько партиций читают горячие запросы и за какое время, против одной таблицы.
+
+Нужна доступная БД (временные таблицы, данные не трогаются):
+    python -m benchmarks.bench_raw_partitions --rows 300000 --sources 5 --months 24 --output bench_partitions.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+import asyncpg
+
+# The same shapes as the ELT: changed rows of one source in extraction order, ids of one source,
+# and a recent-months window of one source
+QUERIES = {
+    "changed_by_source": "SELECT id FROM {table} WHERE source = $1 ORDER BY extracted_at, id LIMIT 1000",
+    "ids_by_source": "SELECT id FROM {table} WHERE id = ANY($2::text[]) AND source = $1",
+    "recent_months": "SELECT count(*) FROM {table} WHERE source = $1 AND extracted_at >= now() - interval '2 months'",
+}
+
+
+async def _create_tables(conn: asyncpg.Connection, rows: int, sources: int, months: int) -> None:
+    await conn.execute(
+        "CREATE TEMP TABLE bench_raw_plain "
+        "(id TEXT PRIMARY KEY, source TEXT NOT NULL, payload_hash BYTEA, extracted_at TIMESTAMPTZ NOT NULL)"
+    )
+    await conn.execute(
+        "CREATE TEMP TABLE bench_raw_part "
+        "(id TEXT NOT NULL, source TEXT NOT NULL, payload_hash BYTEA, extracted_at TIMESTAMPTZ NOT NULL, "
+        "PRIMARY KEY (id, source, extracted_at)) PARTITION BY LIST (source)"
+    )
+    for s in range(sources):
+        await conn.execute(
+            f"CREATE TEMP TABLE bench_raw_part_s{s} PARTITION OF bench_raw_part "
+            f"FOR VALUES IN ('src{s}') PARTITION BY RANGE (extracted_at)"
+        )
+        for m in range(months + 1):
+            await conn.execute(
+                f"CREATE TEMP TABLE bench_raw_part_s{s}_m{m} PARTITION OF bench_raw_part_s{s} FOR VALUES "
+                f"FROM (date_trunc('month', now()) - interval '{m} months') "
+                f"TO (date_trunc('month', now()) - interval '{m - 1} months')"
+            )
+
+    # Rows spread evenly over sources and months, inserted in extraction order like real loads
+    fill = (
+        "INSERT INTO {table} SELECT 'r' || i, 'src' || (i % $2), decode(md5(i::text), 'hex'), "
+        "now() - make_interval(secs => ($1 - i)::float8 / $1 * $3 * 30 * 86400) "
+        "FROM generate_series(1, $1) AS i"
+    )
+    for table in ("bench_raw_plain", "bench_raw_part"):
+        await conn.execute(fill.format(table=table), rows, sources, months)
+        await conn.execute(f"CREATE INDEX ON {table} USING brin (extracted_at)")
+        await conn.execute(f"CREATE INDEX ON {table} (source, extracted_at)")
+        await conn.execute(f"ANALYZE {table}")
+
+
+def _scanned_relations(plan: dict[str, Any]) -> set[str]:
+    """Имена таблиц, которые план действительно читает (после статической и runtime-отсечки)."""
+    found = set()
+    if "Relation Name" in plan and plan.get("Actual Loops", 1) > 0:
+        found.add(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found |= _scanned_relations(child)
+    return found
+
+
+async def _explain(conn: asyncpg.Connection, sql: str, *args: Any) -> dict[str, Any]:
+    start = time.perf_counter()
+    (raw,) = await conn.fetchrow(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", *args)
+    elapsed = time.perf_counter() - start
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+    return {
+        "relations_scanned": len(_scanned_relations(plan["Plan"])),
+        "execution_ms": round(plan["Execution Time"], 2),
+        "wall_ms": round(elapsed * 1000, 2),
+    }
+
+
+async def run(dsn: str, rows: int, sources: int, months: int) -> dict[str, Any]:
+    conn = await asyncpg.connect(dsn=dsn)
+    try:
+        await _create_tables(conn, rows, sources, months)
+        ids = [f"r{i}" for i in range(1, rows, max(rows // 500, 1))]
+        results: dict[str, Any] = {}
+        for name, template in QUERIES.items():
+            args: tuple[Any, ...] = ("src1", ids) if "$2" in template else ("src1",)
+            results[name] = {
+                table: await _explain(conn, template.format(table=table), *args)
+                for table in ("bench_raw_plain", "bench_raw_part")
+            }
+            plain, part = results[name]["bench_raw_plain"], results[name]["bench_raw_part"]
+            print(
+                f"{name:<18} plain {plain['execution_ms']:>9.1f} ms | partitioned {part['execution_ms']:>9.1f} ms, "
+                f"partitions read {part['relations_scanned']}/{sources * (months + 1)}",
+                file=sys.stderr,
+            )
+        return {"rows": rows, "sources": sources, "months": months, "results": results}
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="raw.data partition pruning benchmark")
+    parser.add_argument("--dsn", help="Postgres DSN (default: POSTGRES_URI setting)")
+    parser.add_argument("--rows", type=int, default=300_000, help="Rows in the synthetic raw table")
+    parser.add_argument("--sources", type=int, default=5, help="Distinct sources (LIST partitions)")
+    parser.add_argument("--months", type=int, default=24, help="Months of history (RANGE sub-partitions)")
+    parser.add_argument("--output", type=Path, help="Write JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    dsn = args.dsn
+    if not dsn:
+        from src.config import settings
+
+        dsn = str(settings.POSTGRES_URI)
+    report = asyncio.run(run(dsn, args.rows, args.sources, args.months))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Партиционирование staging.records: запросы в стиле financials_v и web_transactions_v против одной таблицы.
+
+Нужна доступная БД (временные таблицы, данные не трогаются):
+    python -m benchmarks.bench_staging_partitions --static-rows 400000 --live-rows 50000 --output bench_staging.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+import asyncpg
+
+from benchmarks.bench_raw_partitions import _explain
+
+# Static archives cover these years; live rows are the last LIVE_YEARS years up to now
+STATIC_YEARS = range(2010, 2024)
+LIVE_YEARS = 3
+
+# $1 is the lower date bound of the "recent" window; the *_all cases are the views as shipped (no filter)
+QUERIES = {
+    "financials_live_recent": """
+        SELECT to_char(date_trunc('month', COALESCE(payment_date, date)), 'YYYY-MM') AS year_month,
+               type, ROUND(SUM(total_rub)) AS total_rub, COUNT(*) AS record_count
+        FROM {table}
+        WHERE source_type = 'live' AND date >= $1 AND type IN ('Доход', 'Расход', 'Income', 'Expense')
+        GROUP BY 1, 2
+    """,
+    "web_transactions_live_recent": """
+        SELECT raw_id, date, payment_date, type, client, category, total_rub, source_type
+        FROM {table}
+        WHERE source_type = 'live' AND date >= $1
+        ORDER BY date DESC
+        LIMIT 100
+    """,
+    "financials_all": """
+        SELECT to_char(date_trunc('month', COALESCE(payment_date, date)), 'YYYY-MM') AS year_month,
+               type, ROUND(SUM(total_rub)) AS total_rub, COUNT(*) AS record_count
+        FROM {table}
+        WHERE type IN ('Доход', 'Расход', 'Income', 'Expense')
+          AND COALESCE(payment_date, date) >= '2005-01-01'::timestamptz
+        GROUP BY 1, 2
+    """,
+}
+
+_COLUMNS = (
+    "raw_id TEXT NOT NULL, source_type TEXT NOT NULL, date TIMESTAMPTZ, payment_date TIMESTAMPTZ, "
+    "type TEXT, client TEXT, category TEXT, total_rub NUMERIC"
+)
+
+
+async def _create_tables(conn: asyncpg.Connection, static_rows: int, live_rows: int) -> int:
+    this_year = datetime.date.today().year
+    live_years = range(this_year - LIVE_YEARS + 1, this_year + 2)
+    await conn.execute(f"CREATE TEMP TABLE bench_staging_plain ({_COLUMNS}, PRIMARY KEY (raw_id))")
+    await conn.execute(
+        f"CREATE TEMP TABLE bench_staging_part ({_COLUMNS}, UNIQUE NULLS NOT DISTINCT (raw_id, source_type, date)) "
+        "PARTITION BY LIST (source_type)"
+    )
+    partitions = 0
+    for source_type, years in (("static", STATIC_YEARS), ("live", live_years)):
+        parent = f"bench_staging_part_{source_type}"
+        await conn.execute(
+            f"CREATE TEMP TABLE {parent} PARTITION OF bench_staging_part "
+            f"FOR VALUES IN ('{source_type}') PARTITION BY RANGE (date)"
+        )
+        await conn.execute(f"CREATE TEMP TABLE {parent}_default PARTITION OF {parent} DEFAULT")
+        partitions += 1
+        for year in years:
+            await conn.execute(
+                f"CREATE TEMP TABLE {parent}_{year} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{year}-01-01 00:00+00') TO ('{year + 1}-01-01 00:00+00')"
+            )
+            partitions += 1
+
+    # $2..$3 is the year span of the source_type; rows are spread evenly over it
+    fill = """
+        INSERT INTO {table}
+        SELECT $1::text || i, $1::text,
+               make_timestamptz($2::int, 1, 1, 0, 0, 0, 'UTC')
+                   + ((i % 1000) / 1000.0 * ($3::int - $2::int))::float8 * interval '365 days',
+               NULL,
+               (ARRAY['Доход', 'Расход', 'Прочее'])[1 + i % 3],
+               'client ' || (i % 500),
+               'cat ' || (i % 40),
+               (i % 10000) + 0.5
+        FROM generate_series(1, $4::int) AS i
+    """
+    for table in ("bench_staging_plain", "bench_staging_part"):
+        await conn.execute(fill.format(table=table), "static", STATIC_YEARS.start, STATIC_YEARS.stop, static_rows)
+        await conn.execute(fill.format(table=table), "live", live_years.start, this_year + 1, live_rows)
+        await conn.execute(f"CREATE INDEX ON {table} (type)")
+        await conn.execute(f"CREATE INDEX ON {table} (date)")
+        await conn.execute(f"ANALYZE {table}")
+    return partitions
+
+
+async def run(dsn: str, static_rows: int, live_rows: int) -> dict[str, Any]:
+    conn = await asyncpg.connect(dsn=dsn)
+    try:
+        partitions = await _create_tables(conn, static_rows, live_rows)
+        since = datetime.datetime(datetime.date.today().year, 1, 1, tzinfo=datetime.timezone.utc)
+        results: dict[str, Any] = {}
+        for name, template in QUERIES.items():
+            args: tuple[Any, ...] = (since,) if "$1" in template else ()
+            results[name] = {
+                table: await _explain(conn, template.format(table=table), *args)
+                for table in ("bench_staging_plain", "bench_staging_part")
+            }
+            plain, part = results[name]["bench_staging_plain"], results[name]["bench_staging_part"]
+            print(
+                f"{name:<30} plain {plain['execution_ms']:>9.1f} ms | partitioned {part['execution_ms']:>9.1f} ms, "
+                f"partitions read {part['relations_scanned']}/{partitions}",
+                file=sys.stderr,
+            )
+        return {"static_rows": static_rows, "live_rows": live_rows, "partitions": partitions, "results": results}
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="staging.records partition pruning benchmark")
+    parser.add_argument("--dsn", help="Postgres DSN (default: POSTGRES_URI setting)")
+    parser.add_argument("--static-rows", type=int, default=400_000, help="Rows of the static archive")
+    parser.add_argument("--live-rows", type=int, default=50_000, help="Rows of the live source")
+    parser.add_argument("--output", type=Path, help="Write JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    dsn = args.dsn
+    if not dsn:
+        from src.config import settings
+
+        dsn = str(settings.POSTGRES_URI)
+    report = asyncio.run(run(dsn, args.static_rows, args.live_rows))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
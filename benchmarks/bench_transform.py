@@ -0,0 +1,76 @@
+"""Бенчмарки нормализации и подготовки записей к загрузке.
+
+Использование:
+    python -m benchmarks.bench_transform --output bench.json
+    python -m benchmarks.bench_transform --compare bench.json --max-ratio 1.2
+"""
+
+import datetime
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+from benchmarks.payloads import generate_payloads
+from benchmarks.runner import Case, main
+from src.models import StagingRecord, validate_staging_batch, validate_staging_record
+from src.transform import _get, _prepare_staging_rows, _staging_data, _to_decimal, _to_timestamptz, normalize_record
+from src.utils import payload_hash
+
+# Lookups that hit directly, hit via Cyrillic alias, and miss (forcing the normalized-key fallback)
+GET_VARIANTS = [
+    ["Client", "Клиент", "client"],
+    ["Total RUB", "РУБ сумма", "total_rub", "rub_summa", "РУБ Сумма"],
+    ["Payment date (orig)", "Дата платежа (ориг)", "payment_date_orig"],
+]
+
+
+def _normalize_all(payloads: list[dict], received_at: datetime.datetime) -> None:
+    for i, p in enumerate(payloads):
+        normalize_record(i, i, received_at, p)
+
+
+def _get_all(payloads: list[dict]) -> None:
+    for p in payloads:
+        for variants in GET_VARIANTS:
+            _get(p, variants)
+
+
+def _apply(func: Callable[[Any], Any], values: list[Any]) -> None:
+    for v in values:
+        func(v)
+
+
+def _validate_all(records: list[dict]) -> None:
+    for rec in records:
+        StagingRecord(**rec).model_dump()
+
+
+def _validate_all_fast(records: list[dict]) -> None:
+    for rec in records:
+        validate_staging_record(rec, "fast")
+
+
+def build_cases(size: int) -> list[Case]:
+    """Собирает кейсы горячего пути на size синтетических строках."""
+    payloads = generate_payloads(size)
+    received_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+    normalized = [normalize_record(i, i, received_at, p) for i, p in enumerate(payloads)]
+    unvalidated = [_staging_data(i, i, received_at, p) for i, p in enumerate(payloads)]
+    decimals = [v for p in payloads for k, v in p.items() if k in ("Total RUB", "РУБ Сумма", "FX USD", "Курс USD")]
+    dates = [v for p in payloads for k, v in p.items() if k in ("Date", "Дата")]
+
+    return [
+        Case("normalize_record", partial(_normalize_all, payloads, received_at), len(payloads)),
+        Case("_get", partial(_get_all, payloads), len(payloads) * len(GET_VARIANTS)),
+        Case("_to_decimal", partial(_apply, _to_decimal, decimals), len(decimals)),
+        Case("_to_timestamptz", partial(_apply, _to_timestamptz, dates), len(dates)),
+        Case("payload_hash", partial(_apply, payload_hash, payloads), len(payloads)),
+        Case("staging_record_validate", partial(_validate_all, normalized), len(normalized)),
+        Case("staging_validate_fast", partial(_validate_all_fast, unvalidated), len(unvalidated)),
+        Case("staging_validate_batch_fast", partial(validate_staging_batch, unvalidated, "fast"), len(unvalidated)),
+        Case("prepare_staging_rows", partial(_prepare_staging_rows, normalized), len(normalized)),
+    ]
+
+
+if __name__ == "__main__":
+    main(build_cases, "Transform hot-path micro-benchmarks")
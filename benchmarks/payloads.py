@@ -0,0 +1,97 @@
+"""Генератор синтетических payload, повторяющих заголовки реальной таблицы."""
+
+import random
+from typing import Any
+
+# Header variants seen in the live sheet and in static archives (English and Cyrillic)
+HEADER_SETS: list[dict[str, str]] = [
+    {
+        "date": "Date",
+        "payment_date": "Payment date",
+        "client": "Client",
+        "vendor": "Vendor",
+        "type": "Type",
+        "category": "Category",
+        "subcategory": "Subcategory",
+        "description": "Description",
+        "currency": "Currency",
+        "total_rub": "Total RUB",
+        "total_usd": "Total USD",
+        "fx_usd": "FX USD",
+        "hours": "Hours",
+        "year": "Year",
+        "month": "Month",
+    },
+    {
+        "date": "Дата",
+        "payment_date": "Дата платежа",
+        "client": "Клиент",
+        "vendor": "Поставщик",
+        "type": "Тип",
+        "category": "Категория",
+        "subcategory": "Подкатегория",
+        "description": "Описание",
+        "currency": "Валюта",
+        "total_rub": "РУБ Сумма",
+        "total_usd": "USD сумма",
+        "fx_usd": "Курс USD",
+        "hours": "Часы",
+        "year": "Год",
+        "month": "Месяц",
+    },
+]
+
+CLIENTS = ['АО "Первая компания"', "ИП Иванов", "ООО Ромашка", "Test Client LLC", ""]
+VENDORS = ['ООО "Поставщик"', "Vendor Inc", "ИП Петров", ""]
+TYPES = ["Доход", "Расход", "Income", "Expense", "Перевод"]
+CATEGORIES = ["Сопровождение", "Продажи", "Marketing", "Аренда", "Зарплата"]
+CURRENCIES = ["RUB", "rub", "USD", "EUR"]
+
+
+def _comma_decimal(rng: random.Random) -> str:
+    value = rng.uniform(0, 500_000)
+    style = rng.randrange(4)
+    if style == 0:
+        return f"{value:.2f}".replace(".", ",")
+    if style == 1:
+        return f"{value:,.2f}".replace(",", " ").replace(".", ",")
+    if style == 2:
+        return f"{value:.2f}"
+    return ""
+
+
+def _ddmmyyyy(rng: random.Random) -> str:
+    return f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(2010, 2025)}"
+
+
+def generate_payload(rng: random.Random) -> dict[str, Any]:
+    """Возвращает одну синтетическую строку таблицы."""
+    headers = rng.choice(HEADER_SETS)
+    date = _ddmmyyyy(rng)
+    payload = {
+        headers["date"]: date,
+        headers["payment_date"]: rng.choice([date, _ddmmyyyy(rng), ""]),
+        headers["client"]: rng.choice(CLIENTS),
+        headers["vendor"]: rng.choice(VENDORS),
+        headers["type"]: rng.choice(TYPES),
+        headers["category"]: rng.choice(CATEGORIES),
+        headers["subcategory"]: rng.choice(CATEGORIES),
+        headers["description"]: "Оплата по договору №" + str(rng.randint(1, 9999)),
+        headers["currency"]: rng.choice(CURRENCIES),
+        headers["total_rub"]: _comma_decimal(rng),
+        headers["total_usd"]: _comma_decimal(rng),
+        headers["fx_usd"]: f"{rng.uniform(60, 100):.4f}".replace(".", ","),
+        headers["hours"]: rng.choice(["", "8", "1,5"]),
+        headers["year"]: date[-4:],
+        headers["month"]: str(int(date[3:5])),
+    }
+    # Sheet exports pad unnamed columns up to A:AF
+    for i in range(len(payload) + 1, 33):
+        payload[f"Column_{i}"] = ""
+    return payload
+
+
+def generate_payloads(count: int, seed: int = 42) -> list[dict[str, Any]]:
+    """Возвращает детерминированный набор из count синтетических строк."""
+    rng = random.Random(seed)
+    return [generate_payload(rng) for _ in range(count)]
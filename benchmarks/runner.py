@@ -0,0 +1,106 @@
+"""Общий раннер бенчмарков: замер, JSON-отчет и сравнение с базовой линией."""
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+
+@dataclass
+class Case:
+    """Один бенчмарк: func обрабатывает ops элементов за вызов."""
+
+    name: str
+    func: Callable[[], Any]
+    ops: int
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(case: Case, repeat: int, warmup: int = 1) -> dict[str, Any]:
+    """Замеряет кейс repeat раз и возвращает нс на операцию."""
+    for _ in range(warmup):
+        case.func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        case.func()
+        timings.append((time.perf_counter_ns() - start) / case.ops)
+    return {
+        "ns_per_op_min": round(min(timings), 1),
+        "ns_per_op_median": round(statistics.median(timings), 1),
+        "ops": case.ops,
+        "repeat": repeat,
+    }
+
+
+def run_cases(cases: list[Case], repeat: int) -> dict[str, Any]:
+    """Прогоняет набор кейсов и собирает машиночитаемый отчет."""
+    results = {}
+    for case in cases:
+        results[case.name] = measure(case, repeat)
+        print(f"{case.name:<40} {results[case.name]['ns_per_op_min']:>12.1f} ns/op", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+            "git_rev": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], max_ratio: float) -> list[str]:
+    """Возвращает список кейсов, замедлившихся сильнее max_ratio относительно базовой линии."""
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("ns_per_op_min"):
+            continue
+        ratio = result["ns_per_op_min"] / base["ns_per_op_min"]
+        if ratio > max_ratio:
+            regressions.append(f"{name}: {base['ns_per_op_min']} -> {result['ns_per_op_min']} ns/op (x{ratio:.2f})")
+    return regressions
+
+
+def main(build_cases: Callable[[int], list[Case]], description: str, default_size: int = 1000) -> None:
+    """CLI-обертка: --size, --repeat, --output, --compare, --max-ratio."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--size", type=int, default=default_size, help="Synthetic rows per case")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions per case")
+    parser.add_argument("--output", type=Path, help="Write JSON report to this file (default: stdout)")
+    parser.add_argument("--compare", type=Path, help="Baseline JSON report to compare against")
+    parser.add_argument("--max-ratio", type=float, default=1.2, help="Allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    # Per-row validation warnings would otherwise dominate the timings and flood stderr
+    logging.disable(logging.CRITICAL)
+    report = run_cases(build_cases(args.size), args.repeat)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text(encoding="utf-8")), args.max_ratio)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
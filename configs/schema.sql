@@ -25,9 +25,9 @@ CREATE TABLE IF NOT EXISTS raw.source_events (
     last_seen TIMESTAMPTZ DEFAULT now()
 );
 
--- Add hash tracking to existing raw.data table
+-- Add hash tracking to existing raw.data table (16-byte digest, see PAYLOAD_HASH_ALGORITHM)
 ALTER TABLE raw.data
-    ADD COLUMN IF NOT EXISTS payload_hash TEXT,
+    ADD COLUMN IF NOT EXISTS payload_hash BYTEA,
     ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ DEFAULT now();
 
 -- Index for incremental processing
@@ -92,7 +92,7 @@ CREATE TABLE IF NOT EXISTS staging.records (
     kategoriya TEXT,
     podstatya TEXT,
     vidy_raskhodov TEXT,
-    payload_hash TEXT NOT NULL,
+    payload_hash BYTEA NOT NULL,
     raw_payload JSONB
 );
 
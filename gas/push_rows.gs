@@ -0,0 +1,150 @@
+/**
+ * PUSH ROWS: ОТПРАВКА ПРАВОК В ETL
+ * Назначение: Отправлять измененные строки (PK + значения) в `main.py push-server`,
+ * чтобы правки доходили до витрин за секунды без полной выгрузки листа.
+ *
+ * УСТАНОВКА:
+ * 1. Script Properties: PUSH_URL (https://host:8080/v1/rows) и INGEST_TOKEN (тот же, что в .env сервера).
+ * 2. Запустить installPushTriggers() один раз (простой onEdit не может вызывать UrlFetchApp).
+ *
+ * ФУНКЦИИ:
+ * 1. pushOnEdit: Устанавливаемый триггер на редактирование, отправляет затронутые строки.
+ * 2. flushPushQueue: Раз в минуту повторяет отправку строк, которые не удалось отправить.
+ */
+
+/* ====== КОНФИГУРАЦИЯ ====== */
+const PUSH_CFG = {
+  source: 'google_sheets',  // source в raw.data (сервер принимает только свои источники)
+  sheetName: null,          // null = любой лист, иначе только этот
+  headerRow: 2,             // Строка с заголовками
+  startRow: 3,              // Первая строка с данными
+  pkHeader: 'PK',           // Колонка Primary Key (см. SheetService.gs)
+  maxRowsPerRequest: 500,   // Строк в одном POST
+  queueKey: 'PUSH_QUEUE'    // Ключ Document Properties для неотправленных строк
+};
+
+/**
+ * Устанавливаемый триггер: отправить строки, затронутые правкой
+ */
+function pushOnEdit(e) {
+  const sheet = e.range.getSheet();
+  if (PUSH_CFG.sheetName && sheet.getName() !== PUSH_CFG.sheetName) return;
+
+  const first = Math.max(e.range.getRow(), PUSH_CFG.startRow);
+  const last = e.range.getLastRow();
+  if (last < first) return;
+
+  const rows = [];
+  for (let r = first; r <= last; r++) rows.push(r);
+  pushRows_(sheet, rows);
+}
+
+/**
+ * Триггер по времени: повторная отправка очереди
+ */
+function flushPushQueue() {
+  const lock = LockService.getDocumentLock();
+  if (!lock.tryLock(5000)) return;
+  let queued;
+  try {
+    const props = PropertiesService.getDocumentProperties();
+    queued = JSON.parse(props.getProperty(PUSH_CFG.queueKey) || '{}');
+    props.deleteProperty(PUSH_CFG.queueKey);
+  } finally {
+    lock.releaseLock();
+  }
+
+  const ss = SpreadsheetApp.getActiveSpreadsheet();
+  Object.keys(queued).forEach(sheetName => {
+    const sheet = ss.getSheetByName(sheetName);
+    if (sheet) pushRows_(sheet, queued[sheetName]);
+  });
+}
+
+/**
+ * Однократная установка триггеров
+ */
+function installPushTriggers() {
+  const ss = SpreadsheetApp.getActiveSpreadsheet();
+  ScriptApp.getProjectTriggers()
+    .filter(t => ['pushOnEdit', 'flushPushQueue'].indexOf(t.getHandlerFunction()) >= 0)
+    .forEach(t => ScriptApp.deleteTrigger(t));
+  ScriptApp.newTrigger('pushOnEdit').forSpreadsheet(ss).onEdit().create();
+  ScriptApp.newTrigger('flushPushQueue').timeBased().everyMinutes(1).create();
+}
+
+/* ====== ВНУТРЕННИЕ ФУНКЦИИ ====== */
+
+/**
+ * Читает строки (отображаемые значения, как при выгрузке через Sheets API) и отправляет пачками
+ */
+function pushRows_(sheet, rowNumbers) {
+  const lastCol = sheet.getLastColumn();
+  const headers = sheet.getRange(PUSH_CFG.headerRow, 1, 1, lastCol).getDisplayValues()[0];
+  const pkIdx = headers.indexOf(PUSH_CFG.pkHeader);
+  if (pkIdx < 0) return;
+
+  const unique = Array.from(new Set(rowNumbers)).sort((a, b) => a - b);
+  const payloadRows = [];
+  const sent = [];
+  unique.forEach(r => {
+    const values = sheet.getRange(r, 1, 1, lastCol).getDisplayValues()[0];
+    // Строки без PK ждут, пока SheetService.gs его присвоит
+    if (!values[pkIdx]) return;
+    payloadRows.push({ pk: values[pkIdx], values: values });
+    sent.push(r);
+  });
+
+  for (let i = 0; i < payloadRows.length; i += PUSH_CFG.maxRowsPerRequest) {
+    const chunk = payloadRows.slice(i, i + PUSH_CFG.maxRowsPerRequest);
+    if (!postRows_({ source: PUSH_CFG.source, headers: headers, rows: chunk })) {
+      enqueueRows_(sheet.getName(), sent.slice(i));
+      return;
+    }
+  }
+}
+
+/**
+ * POST в push-server; false — строки нужно отправить повторно (сеть, 5xx, 429)
+ */
+function postRows_(body) {
+  const props = PropertiesService.getScriptProperties();
+  try {
+    const resp = UrlFetchApp.fetch(props.getProperty('PUSH_URL'), {
+      method: 'post',
+      contentType: 'application/json',
+      headers: { Authorization: 'Bearer ' + props.getProperty('INGEST_TOKEN') },
+      payload: JSON.stringify(body),
+      muteHttpExceptions: true
+    });
+    const code = resp.getResponseCode();
+    if (code >= 200 && code < 300) {
+      // pk, уже занятые другим источником, повтор не исправит: только сообщаем о них
+      const rejected = JSON.parse(resp.getContentText()).rejected || [];
+      if (rejected.length) console.warn(`push-server отклонил строки (pk занят другим источником): ${rejected.join(', ')}`);
+      return true;
+    }
+    console.warn(`push-server ответил ${code}: ${resp.getContentText().slice(0, 200)}`);
+    // 4xx (кроме 429) не исправится повтором — не копим такие строки в очереди
+    return code >= 400 && code < 500 && code !== 429;
+  } catch (err) {
+    console.warn('push-server недоступен: ' + err.message);
+    return false;
+  }
+}
+
+/**
+ * Откладывает номера строк до следующего flushPushQueue
+ */
+function enqueueRows_(sheetName, rowNumbers) {
+  const lock = LockService.getDocumentLock();
+  if (!lock.tryLock(5000)) return;
+  try {
+    const props = PropertiesService.getDocumentProperties();
+    const queued = JSON.parse(props.getProperty(PUSH_CFG.queueKey) || '{}');
+    queued[sheetName] = Array.from(new Set((queued[sheetName] || []).concat(rowNumbers)));
+    props.setProperty(PUSH_CFG.queueKey, JSON.stringify(queued));
+  } finally {
+    lock.releaseLock();
+  }
+}
@@ -8,44 +8,175 @@
 Использование:
     python main.py run          # Полный инкрементальный запуск
     python main.py run --test   # Тестовый режим (первые 100 записей, показать примеры)
+    python main.py run --pair google_sheets:live --pair archive_2023:static  # Несколько источников сразу
+    python main.py run --config configs/sources.toml  # Источники из TOML-файла
     python main.py load <SPREADSHEET_ID> [RANGE]  # Загрузить из Google Sheets
+    python main.py ingest configs/ingest.toml  # Загрузить все таблицы из манифеста
+    python main.py enqueue      # Поставить измененные raw-записи в очередь etl.jobs
+    python main.py worker       # Обрабатывать задания очереди (любое число воркеров/хостов)
+    python main.py serve        # Демон: LISTEN raw_data_changed, обработка новых записей за секунды
+    python main.py push-server  # HTTP-прием правок строк из Apps Script (gas/push_rows.gs)
+    python main.py read-api     # HTTP-чтение витрин для веб-приложения (кэш, ETag, gzip)
+    python main.py retry-rejected  # Повторить записи из etl.rejected_records
+    python main.py migrate-raw  # Перенести raw.data_legacy в партиционированный raw.data пачками
     python main.py check        # Проверить окружение
 """
 import sys
 import asyncio
 import argparse
+import datetime
 import logging
 import json
+import hashlib
+import os
+import signal
+import socket
 import time
+from collections.abc import Callable, Coroutine
 from typing import List, Dict, Any
 
-from src.transform import get_changed_raw_records, normalize_record, upsert_staging_records_batch
+from src.transform import (
+    get_changed_raw_records,
+    get_raw_records_by_ids,
+    normalize_records,
+    upsert_staging_records_batch,
+)
+from src.sources import (
+    SheetEntry,
+    SourceSpec,
+    check_unique,
+    get_ingest_hash,
+    load_manifest,
+    load_sources,
+    parse_source_pair,
+    save_ingest_hash,
+)
+from src.jobs import Job, claim_job, complete_job, enqueue_changed, extend_lease, fail_expired, fail_job
+from src.rejects import RejectSink, fetch_open_rejections, resolve_rejections
+from src.marts import notify_marts_changed
+from src.partitions import ensure_raw_partitions, legacy_raw_rows, move_legacy_raw
 from src.db import init_db_pool, close_db_pool, fetch
 from src.config import settings
-from src.sheets import fetch_google_sheets
+from src.utils import canonical_json, hash_bytes
 from src.logger import setup_logging
+from src import metrics, profiling, tracing
+from src.querystats import QUERY_STATS
 
 
 logger = logging.getLogger(__name__)
 
+# --- Metrics ---
+
+def _record_stage(stage: str, duration: float, rows: int, labels: Dict[str, str]) -> None:
+    """Фиксирует длительность и пропускную способность этапа."""
+    metrics.STAGE_DURATION.observe(duration, stage=stage, **labels)
+    if duration > 0:
+        metrics.ROWS_PER_SECOND.set(rows / duration, stage=stage, **labels)
+
+
+async def _export_metrics(job: str) -> None:
+    textfile = f"{settings.METRICS_DIR}/{job}.prom" if settings.METRICS_DIR else None
+    await metrics.export_metrics(job, textfile, settings.METRICS_PUSHGATEWAY_URL)
+
+
+def _log_query_report() -> None:
+    """Печатает топ запросов к БД по суммарному времени за команду."""
+    if QUERY_STATS and settings.QUERY_REPORT_TOP > 0:
+        logger.info("🗄️ Топ запросов к БД:\n" + QUERY_STATS.report(settings.QUERY_REPORT_TOP))
+
+
 # --- Command: RUN ---
 
-async def run_incremental_elt(test_mode: bool = False, source: str = 'google_sheets', source_type: str = 'live'):
+def _source_result(spec: SourceSpec) -> Dict[str, Any]:
+    return {"source": spec.name, "found": 0, "normalized": 0, "upserted": 0, "rejected": 0, "duration": 0.0}
+
+
+async def _normalize_stage(
+    raw_records: List[Dict[str, Any]], source_type: str, reject_sink: RejectSink, labels: Dict[str, str]
+) -> tuple[List[Any], float]:
+    """Этап нормализации run: ошибки уходят в reject_sink. Возвращает (строки StagingRow, длительность)."""
+    logger.info("🛠️ 2. Нормализация данных...")
+    norm_start = time.time()
+    with tracing.span("elt.normalize", rows=len(raw_records)) as norm_span:
+        # Rows come out in loader column order, so the upsert binds them without per-row copies
+        normalized_records, failed = normalize_records(raw_records, source_type=source_type, as_rows=True)
+        errors = len(failed)
+        # Show first 5 errors only to keep log compact
+        for raw_rec, e in failed[:5]:
+            logger.error(f"❌ Ошибка нормализации (ID={raw_rec.get('raw_id')}): {e}")
+        for raw_rec, e in failed:
+            reject_sink.add(raw_rec.get('raw_id'), "normalize", e, raw_rec.get('payload_hash'))
+        await reject_sink.flush()
+        norm_span.set_attribute("errors", errors)
+
+    norm_duration = time.time() - norm_start
+    metrics.ROWS_NORMALIZED.inc(len(normalized_records), **labels)
+    metrics.ROWS_FAILED.inc(errors, stage="normalize", **labels)
+    _record_stage("normalize", norm_duration, len(raw_records), labels)
+    logger.info(
+        f"✨ Нормализовано: {len(normalized_records)} "
+        f"(ошибок: {errors}) за {norm_duration:.1f}с"
+    )
+
+    # Monitoring: Check error rate
+    total_processed = len(raw_records)
+    if total_processed > 0:
+        error_rate = errors / total_processed
+        if error_rate > 0.1:  # 10% threshold
+            logger.warning(
+                f"⚠️ ВНИМАНИЕ: Высокий процент ошибок! "
+                f"{error_rate:.1%} ({errors}/{total_processed})."
+            )
+    return normalized_records, norm_duration
+
+
+async def _upsert_stage(
+    spec: SourceSpec, normalized_records: List[Any], reject_sink: RejectSink, labels: Dict[str, str]
+) -> tuple[int, float]:
+    """Этап сохранения run: upsert в staging и уведомление витрин. Возвращает (сохранено, длительность)."""
+    upsert_start = time.time()
+    upserted_count = 0
+    if normalized_records:
+        logger.info(f"💾 3. Сохранение {len(normalized_records)} записей в БД...")
+        with tracing.span("elt.upsert", rows=len(normalized_records)):
+            upserted_count = await upsert_staging_records_batch(
+                normalized_records,
+                batch_size=settings.BATCH_SIZE,
+                metric_labels=labels,
+                reject_sink=reject_sink,
+                concurrency=spec.concurrency,
+            )
+        logger.info(f"✅ Успешно сохранено: {upserted_count}")
+        if upserted_count:
+            await notify_marts_changed(spec.source_type)
+    else:
+        logger.warning("⚠️ Нет записей для сохранения.")
+    upsert_duration = time.time() - upsert_start
+    metrics.ROWS_UPSERTED.inc(upserted_count, **labels)
+    metrics.ROWS_FAILED.inc(len(normalized_records) - upserted_count, stage="upsert", **labels)
+    _record_stage("upsert", upsert_duration, upserted_count, labels)
+    return upserted_count, upsert_duration
+
+
+async def _process_source(spec: SourceSpec, test_mode: bool = False) -> Dict[str, Any]:
     """
-    Запустить инкрементальный ELT: трансформация измененных raw-записей в staging.
-    
-    Args:
-        test_mode: Если True, обрабатывать только первые 100 записей и показать примеры
+    Инкрементальный ELT одного источника на уже открытом пуле.
+
+    Returns:
+        Итоги источника для сводки run: found, normalized, upserted, rejected, duration
     """
-    await init_db_pool()
-    
-    try:
+    source, source_type = spec.source, spec.source_type
+    labels = {"source": source, "source_type": source_type}
+    reject_sink = RejectSink(source, source_type)
+    result = _source_result(spec)
+
+    with tracing.span("elt.source", source=source, source_type=source_type):
         # Determine processing limits
         limit = settings.TEST_LIMIT if test_mode else None
         batch_size = settings.BATCH_SIZE
         
         mode_str = "ТЕСТОВЫЙ" if test_mode else "ПОЛНЫЙ"
-        logger.info(f"🚀 === {mode_str} ELT ПРОЦЕСС ===")
+        logger.info(f"🚀 === {mode_str} ELT ПРОЦЕСС ({spec.name}) ===")
         logger.info(f"Пакет: {batch_size}, Лимит: {limit or 'Нет'}")
         
         start_time = time.time()
@@ -55,167 +186,810 @@ async def run_incremental_elt(test_mode: bool = False, source: str = 'google_she
         query_start = time.time()
         raw_records = await get_changed_raw_records(source=source, limit=limit)
         query_duration = time.time() - query_start
+        metrics.ROWS_READ.inc(len(raw_records), **labels)
+        _record_stage("query", query_duration, len(raw_records), labels)
         
+        result["found"] = len(raw_records)
         if not raw_records:
-            logger.info("💤 Новых записей не найдено. Работа завершена.")
-            return
+            logger.info(f"💤 {spec.name}: новых записей не найдено.")
+            result["duration"] = time.time() - start_time
+            return result
         
         logger.info(f"✅ Найдено записей: {len(raw_records)} (поиск занял {query_duration:.1f}с)")
         
         # Step 2: Normalize records
-        logger.info("🛠️ 2. Нормализация данных...")
-        norm_start = time.time()
-        normalized_records: List[Dict[str, Any]] = []
-        errors = 0
-        
-        for idx, raw_rec in enumerate(raw_records):
-            try:
-                normalized = normalize_record(
-                    raw_id=raw_rec['raw_id'],
-                    sheet_row_number=raw_rec.get('sheet_row_number'),
-                    received_at=raw_rec['received_at'],
-                    payload=raw_rec['raw_payload'],
-                    source_type=source_type
-                )
-                normalized_records.append(normalized)
-                
-            except Exception as e:
-                errors += 1
-                # Log errors only if critical or in debug
-                if errors <= 5: # Show first 5 errors only to keep log compact
-                    logger.error(f"❌ Ошибка нормализации (ID={raw_rec.get('raw_id')}): {e}")
-                continue
-        
-        norm_duration = time.time() - norm_start
-        logger.info(
-            f"✨ Нормализовано: {len(normalized_records)} "
-            f"(ошибок: {errors}) за {norm_duration:.1f}с"
-        )
+        normalized_records, norm_duration = await _normalize_stage(raw_records, source_type, reject_sink, labels)
 
-        # Monitoring: Check error rate
-        total_processed = len(raw_records)
-        if total_processed > 0:
-            error_rate = errors / total_processed
-            if error_rate > 0.1:  # 10% threshold
-                logger.warning(
-                    f"⚠️ ВНИМАНИЕ: Высокий процент ошибок! "
-                    f"{error_rate:.1%} ({errors}/{total_processed})."
-                )
-        
         # Step 3: Show examples in test mode
         if test_mode and normalized_records:
             logger.info("--- ПРИМЕРЫ ЗАПИСЕЙ (первые 3) ---")
             
             for i, rec in enumerate(normalized_records[:3], 1):
-                logger.info(f"Запись {i}: {rec.get('client')} | {rec.get('total_rub')} руб. | {rec.get('category')}")
+                logger.info(f"Запись {i}: {rec.client} | {rec.total_rub} руб. | {rec.category}")
                 
         # Step 4: Upsert to staging
-        upsert_start = time.time()
-        upserted_count = 0
-        if normalized_records:
-            logger.info(f"💾 3. Сохранение {len(normalized_records)} записей в БД...")
-            upserted_count = await upsert_staging_records_batch(
-                normalized_records,
-                batch_size=batch_size
-            )
-            logger.info(f"✅ Успешно сохранено: {upserted_count}")
-        else:
-            logger.warning("⚠️ Нет записей для сохранения.")
-        upsert_duration = time.time() - upsert_start
+        upserted_count, upsert_duration = await _upsert_stage(spec, normalized_records, reject_sink, labels)
         
         total_duration = time.time() - start_time
+        _record_stage("total", total_duration, upserted_count, labels)
         
         # Summary
-        logger.info("📊 === ИТОГИ ===")
+        result.update(
+            normalized=len(normalized_records),
+            upserted=upserted_count,
+            rejected=reject_sink.total,
+            duration=total_duration,
+        )
+        logger.info(f"📊 === ИТОГИ ({spec.name}) ===")
         logger.info(f"Время: {total_duration:.1f}с | Обработано: {len(raw_records)} | Сохранено: {upserted_count}")
-        logger.info(f"Этапы (сек): Поиск={query_duration:.1f}, Норм={norm_duration:.1f}, Сохр={upsert_duration:.1f}")
+        logger.info(
+            f"Этапы (сек): Поиск={query_duration:.1f}, Норм={norm_duration:.1f}, Сохр={upsert_duration:.1f}"
+        )
+        if reject_sink.total:
+            logger.info(
+                f"Отклонено: {reject_sink.total} (etl.rejected_records, повтор: python main.py retry-rejected)"
+            )
         logger.info("=========================")
-        
+        return result
+
+
+async def run_incremental_elt(test_mode: bool = False, source: str = 'google_sheets', source_type: str = 'live'):
+    """
+    Запустить инкрементальный ELT: трансформация измененных raw-записей в staging.
+    
+    Args:
+        test_mode: Если True, обрабатывать только первые 100 записей и показать примеры
+    """
+    await init_db_pool()
+    try:
+        await _process_source(SourceSpec(source, source_type), test_mode)
     except Exception as e:
         logger.error(f"ELT process failed: {e}", exc_info=True)
         raise
-    
     finally:
+        await _export_metrics(f"run_{source}_{source_type}")
         await close_db_pool()
 
 
-async def load_raw(source: str, records: List[Dict[str, Any]]):
-    """Bulk insert raw records into raw.data table."""
+async def _process_sources(
+    specs: List[SourceSpec], test_mode: bool = False, max_concurrency: int | None = None
+) -> List[Dict[str, Any]]:
+    """Обрабатывает источники одновременно на уже открытом пуле и печатает сводку по каждому."""
+    max_concurrency = max_concurrency or settings.RUN_MAX_CONCURRENCY
+    semaphore = asyncio.Semaphore(max_concurrency)
+    logger.info(f"🚀 Источников: {len(specs)}, одновременно: {max_concurrency}")
+
+    async def run_one(spec: SourceSpec) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.time()
+            try:
+                return {**await _process_source(spec, test_mode), "status": "ok"}
+            except Exception as e:
+                # One broken source must not stop the others
+                logger.error(f"❌ {spec.name}: ELT failed: {e}", exc_info=True)
+                return {
+                    **_source_result(spec), "duration": time.time() - start, "status": f"error: {type(e).__name__}"
+                }
+
+    results = await asyncio.gather(*(run_one(spec) for spec in specs))
+
+    logger.info("📊 === ИТОГИ ПО ИСТОЧНИКАМ ===")
+    logger.info(f"{'Источник':<32} {'Найдено':>8} {'Норм':>8} {'Сохр':>8} {'Откл':>6} {'Сек':>7}  Статус")
+    for r in results:
+        logger.info(
+            f"{r['source']:<32} {r['found']:>8} {r['normalized']:>8} {r['upserted']:>8} "
+            f"{r['rejected']:>6} {r['duration']:>7.1f}  {r['status']}"
+        )
+    logger.info("=========================")
+    return results
+
+
+async def run_sources(specs: List[SourceSpec], test_mode: bool = False, max_concurrency: int | None = None):
+    """
+    Обработать несколько источников одновременно на одном пуле соединений.
+
+    Args:
+        specs: Пары source/source_type с лимитом параллельных батчей на источник
+        max_concurrency: Сколько источников обрабатывается одновременно (по умолчанию RUN_MAX_CONCURRENCY)
+    """
+    await init_db_pool()
+    try:
+        results = await _process_sources(specs, test_mode, max_concurrency)
+    finally:
+        await _export_metrics("run_multi")
+        await close_db_pool()
+
+    failed = [r['source'] for r in results if r['status'] != "ok"]
+    if failed:
+        raise RuntimeError(f"ELT failed for sources: {', '.join(failed)}")
+    return results
+
+
+async def _normalize_and_upsert(
+    raw_records: List[Dict[str, Any]],
+    source_type: str,
+    sink: RejectSink,
+    labels: Dict[str, str],
+    concurrency: int = 1,
+) -> tuple[int, int]:
+    """Нормализует и сохраняет прочитанные raw-записи; ошибки уходят в sink. Возвращает (нормализовано, сохранено)."""
+    normalized, failed = normalize_records(raw_records, source_type=source_type, as_rows=True)
+    for raw_rec, e in failed:
+        sink.add(raw_rec['raw_id'], "normalize", e, raw_rec.get('payload_hash'))
+    await sink.flush()
+    upserted = await upsert_staging_records_batch(
+        normalized, batch_size=settings.BATCH_SIZE, metric_labels=labels, reject_sink=sink, concurrency=concurrency
+    )
+    if upserted:
+        await notify_marts_changed(source_type)
+    return len(normalized), upserted
+
+
+# --- Command: ENQUEUE / WORKER ---
+
+async def run_enqueue(specs: List[SourceSpec]):
+    """Поставить измененные raw-записи источников в очередь etl.jobs пакетами по BATCH_SIZE."""
+    await init_db_pool()
+    try:
+        for spec in specs:
+            created = await enqueue_changed(spec.source, spec.source_type, settings.BATCH_SIZE)
+            logger.info(f"📬 {spec.name}: поставлено заданий: {created} (по {settings.BATCH_SIZE} строк)")
+    finally:
+        await close_db_pool()
+
+
+async def _process_job(job: Job, worker_id: str) -> Dict[str, int]:
+    """Выполняет одно задание очереди, продлевая аренду, пока оно обрабатывается."""
+    lease = settings.JOB_LEASE_SECONDS
+    current = asyncio.current_task()
+    lease_lost = False
+
+    async def heartbeat():
+        nonlocal lease_lost
+        while True:
+            await asyncio.sleep(lease / 3)
+            if not await extend_lease(job, worker_id, lease):
+                # Another worker owns the job now and redoes it; finishing here would only duplicate work
+                lease_lost = True
+                current.cancel()
+                return
+
+    labels = {"source": job.source, "source_type": job.source_type}
+    sink = RejectSink(job.source, job.source_type)
+    superseded = {"jobs": 1, "failed": 0, "superseded": 1, "upserted": 0, "rejected": 0}
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        with tracing.span("worker.job", job_id=job.id, rows=len(job.raw_ids), attempt=job.attempts):
+            raw_records = await get_raw_records_by_ids(job.raw_ids, job.source)
+            metrics.ROWS_READ.inc(len(raw_records), **labels)
+            _, upserted = await _normalize_and_upsert(raw_records, job.source_type, sink, labels)
+        metrics.ROWS_UPSERTED.inc(upserted, **labels)
+        if not await complete_job(job, worker_id, upserted, sink.total):
+            logger.warning(f"⚠️ Задание {job.id}: аренда перехвачена другим воркером, результат не засчитан")
+            return superseded
+        logger.info(
+            f"✅ Задание {job.id} ({job.source}/{job.source_type}): сохранено {upserted}, отклонено {sink.total}"
+        )
+        return {"jobs": 1, "failed": 0, "superseded": 0, "upserted": upserted, "rejected": sink.total}
+    except asyncio.CancelledError:
+        if not lease_lost:
+            raise
+        current.uncancel()
+        logger.warning(f"⚠️ Задание {job.id}: аренда перехвачена другим воркером, обработка прервана")
+        return superseded
+    except Exception as e:
+        logger.error(f"❌ Задание {job.id} не выполнено (попытка {job.attempts}): {e}", exc_info=True)
+        await fail_job(job, worker_id, e, settings.JOB_MAX_ATTEMPTS)
+        return {"jobs": 1, "failed": 1, "superseded": 0, "upserted": 0, "rejected": 0}
+    finally:
+        heartbeat_task.cancel()
+
+
+async def _wait_for_stop(stop: asyncio.Event, timeout: float) -> None:
+    """Ждет stop не дольше timeout секунд."""
+    try:
+        await asyncio.wait_for(stop.wait(), timeout)
+    except TimeoutError:
+        pass
+
+
+async def _work_slot(
+    worker_id: str, stop: asyncio.Event, totals: Dict[str, int], source: str | None, drain: bool
+) -> None:
+    """Один слот воркера: захватывает и выполняет задания до stop (при drain — пока очередь не опустеет)."""
+    while not stop.is_set():
+        try:
+            job = await claim_job(worker_id, settings.JOB_LEASE_SECONDS, settings.JOB_MAX_ATTEMPTS, source)
+            if job is None:
+                if drain:
+                    return
+                expired = await fail_expired(settings.JOB_MAX_ATTEMPTS)
+                if expired:
+                    logger.warning(f"⚠️ Заданий с истекшей арендой и без попыток: {expired} (status=failed)")
+                await _wait_for_stop(stop, settings.WORKER_POLL_SECONDS)
+                continue
+            for key, value in (await _process_job(job, worker_id)).items():
+                totals[key] += value
+        except Exception as e:
+            # A lost connection must not end the other slots; a job left running is reclaimed after its lease
+            logger.error(
+                f"❌ Воркер {worker_id}: ошибка БД ({e}), повтор через {settings.WORKER_POLL_SECONDS:.0f}с"
+            )
+            await _wait_for_stop(stop, settings.WORKER_POLL_SECONDS)
+
+
+async def run_worker(source: str | None = None, concurrency: int = 1, drain: bool = False):
+    """
+    Обрабатывать задания из etl.jobs, пока не придет SIGTERM/SIGINT.
+
+    Любое число воркеров на любых хостах захватывают задания через FOR UPDATE SKIP LOCKED;
+    задание упавшего воркера снова становится доступным после JOB_LEASE_SECONDS.
+
+    Args:
+        source: Брать задания только этого источника
+        concurrency: Сколько заданий этот процесс выполняет одновременно
+        drain: Завершиться, когда очередь опустеет
+    """
+    worker_base = f"{socket.gethostname()}:{os.getpid()}"
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    totals = {"jobs": 0, "failed": 0, "superseded": 0, "upserted": 0, "rejected": 0}
+    start_time = time.time()
+
+    await init_db_pool()
+    logger.info(f"👷 Воркер {worker_base}: параллельно {concurrency}, источник: {source or 'все'}")
+    try:
+        await asyncio.gather(
+            *(_work_slot(f"{worker_base}:{n}", stop, totals, source, drain) for n in range(concurrency))
+        )
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await _export_metrics(f"worker_{socket.gethostname()}")
+        await close_db_pool()
+
+    logger.info("📊 === ИТОГИ ВОРКЕРА ===")
+    logger.info(
+        f"Время: {time.time() - start_time:.1f}с | Заданий: {totals['jobs']} (ошибок: {totals['failed']}, "
+        f"перехвачено: {totals['superseded']}) | "
+        f"Сохранено: {totals['upserted']} | Отклонено: {totals['rejected']}"
+    )
+    logger.info("=========================")
+    return totals
+
+
+# --- Command: SERVE ---
+
+async def _process_changed_ids(spec: SourceSpec, raw_ids: List[str]) -> int:
+    """Нормализует и сохраняет только указанные raw-записи (микропакет из LISTEN)."""
+    labels = {"source": spec.source, "source_type": spec.source_type}
+    sink = RejectSink(spec.source, spec.source_type)
+    with tracing.span("serve.batch", source=spec.source, rows=len(raw_ids)):
+        raw_records = await get_raw_records_by_ids(raw_ids, spec.source)
+        metrics.ROWS_READ.inc(len(raw_records), **labels)
+        normalized, upserted = await _normalize_and_upsert(
+            raw_records, spec.source_type, sink, labels, spec.concurrency
+        )
+    metrics.ROWS_NORMALIZED.inc(normalized, **labels)
+    metrics.ROWS_UPSERTED.inc(upserted, **labels)
+    if raw_records:
+        oldest = min(r['received_at'] for r in raw_records)
+        lag = (datetime.datetime.now(datetime.UTC) - oldest).total_seconds()
+        metrics.RAW_TO_STAGING_LAG.observe(lag, **labels)
+        logger.info(f"⚡ {spec.name}: сохранено {upserted}/{len(raw_ids)}, отклонено {sink.total}, задержка {lag:.1f}с")
+    return upserted
+
+
+async def run_serve(specs: List[SourceSpec], catch_up: bool = True):
+    """
+    Долгоживущий режим: LISTEN на уведомления триггера raw.data и обработка новых id микропакетами.
+
+    Args:
+        specs: Источники, которые обрабатывает демон (уведомления других источников пропускаются)
+        catch_up: После (пере)подключения прогнать обычный инкрементальный ELT, чтобы подобрать пропущенное
+    """
+    from src.daemon import ChangeBatcher, serve
+
+    by_source = {spec.source: spec for spec in specs}
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    last_export = time.monotonic()
+
+    async def process(source: str, raw_ids: List[str]):
+        nonlocal last_export
+        spec = by_source.get(source)
+        if spec is None:
+            logger.debug(f"Уведомление для необслуживаемого источника {source} пропущено")
+            return
+        await _process_changed_ids(spec, raw_ids)
+        if time.monotonic() - last_export >= settings.SERVE_METRICS_INTERVAL:
+            last_export = time.monotonic()
+            await _export_metrics("serve")
+
+    async def catch_up_all():
+        await _process_sources(specs)
+
+    batcher = ChangeBatcher(
+        settings.SERVE_DEBOUNCE_MS / 1000, settings.SERVE_MAX_WAIT_MS / 1000, settings.BATCH_SIZE
+    )
+    await init_db_pool()
+    logger.info(
+        f"🛰️ serve: источники {', '.join(by_source)}; debounce {settings.SERVE_DEBOUNCE_MS:.0f}мс, "
+        f"макс. ожидание {settings.SERVE_MAX_WAIT_MS:.0f}мс"
+    )
+    try:
+        await serve(process, stop, batcher, catch_up_all if catch_up else None)
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await _export_metrics("serve")
+        await close_db_pool()
+    logger.info("🛑 serve остановлен")
+
+
+# --- Command: PUSH-SERVER ---
+
+async def run_push_server(specs: List[SourceSpec], host: str, port: int, normalize: bool = True):
+    """
+    HTTP-прием изменений строк из Apps Script: запись в raw.data и нормализация только этих строк.
+
+    Args:
+        specs: Источники, которые принимает сервер, и их source_type
+        normalize: Нормализовать принятые строки сразу (False, если их подхватывает main.py serve)
+    """
+    if not settings.INGEST_TOKEN:
+        raise RuntimeError("INGEST_TOKEN is not set: refusing to start an unauthenticated push server")
+    from aiohttp import web
+
+    from src.daemon import BatchConsumer, ChangeBatcher
+    from src.push_server import create_app
+
+    by_source = {spec.source: spec for spec in specs}
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def load_rows(source: str, records: List[Dict[str, Any]]) -> List[str]:
+        with tracing.span("push.load_raw", source=source, rows=len(records)):
+            rejected = await load_raw(source, records, update_existing=True)
+        metrics.ROWS_LOADED.inc(len(records) - len(rejected), source=source, source_type="raw")
+        return rejected
+
+    async def process(source: str, raw_ids: List[str]):
+        await _process_changed_ids(by_source[source], raw_ids)
+
+    # Edits arrive row by row; the debouncer turns a burst of requests into one normalize/upsert
+    batcher = ChangeBatcher(settings.SERVE_DEBOUNCE_MS / 1000, settings.SERVE_MAX_WAIT_MS / 1000, settings.BATCH_SIZE)
+    consumer = BatchConsumer(batcher, process)
+    app = create_app(
+        settings.INGEST_TOKEN.get_secret_value(),
+        set(by_source),
+        load_rows,
+        batcher.add if normalize else None,
+        settings.PUSH_MAX_ROWS,
+    )
+    runner = web.AppRunner(app, access_log=None)
+
+    await init_db_pool()
+    try:
+        if normalize:
+            consumer.start()
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"📡 push-server: http://{host}:{port}/v1/rows, источники: {', '.join(by_source)}")
+        await stop.wait()
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        # Stop accepting requests first, then finish the rows already accepted
+        await runner.cleanup()
+        await consumer.stop()
+        await _export_metrics("push")
+        await close_db_pool()
+    logger.info("🛑 push-server остановлен")
+
+
+# --- Command: READ-API ---
+
+async def run_read_api(host: str, port: int):
+    """HTTP-чтение витрин: транзакции постранично, агрегаты из кэша, который сбрасывает ELT через marts_changed."""
+    from aiohttp import web
+
+    from src.read_api import TTLCache, create_app, listen_for_changes
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    cache = TTLCache(settings.READ_API_CACHE_SIZE, settings.READ_API_CACHE_TTL)
+    app = create_app(fetch, cache, settings.READ_API_PAGE_SIZE, settings.READ_API_MAX_PAGE_SIZE)
+    runner = web.AppRunner(app, access_log=None)
+
+    await init_db_pool()
+    try:
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(f"📖 read-api: http://{host}:{port}/v1/transactions, /v1/aggregates/<name>")
+        await listen_for_changes(cache, stop)
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
+        await close_db_pool()
+    logger.info("🛑 read-api остановлен")
+
+
+# --- Command: RETRY-REJECTED ---
+
+async def run_retry_rejected(source: str | None = None, stage: str | None = None):
+    """Повторно обработать только записи из etl.rejected_records."""
+    await init_db_pool()
+    start_time = time.time()
+    retried = resolved = 0
+    try:
+        open_rejections = await fetch_open_rejections(source, stage)
+        if not open_rejections:
+            logger.info("💤 Открытых отклоненных записей нет.")
+            return
+
+        # Normalization depends on source_type, so retry each (source, source_type) group separately
+        groups: Dict[tuple, Dict[str, None]] = {}
+        for row in open_rejections:
+            groups.setdefault((row['source'], row['source_type']), {})[row['raw_id']] = None
+
+        for (group_source, source_type), ids in groups.items():
+            source_type = source_type or 'live'
+            labels = {"source": group_source or "unknown", "source_type": source_type}
+            sink = RejectSink(group_source, source_type)
+            raw_records = await get_raw_records_by_ids(list(ids), group_source)
+            missing = len(ids) - len(raw_records)
+            if missing:
+                logger.warning(f"⚠️ {missing} отклоненных записей больше нет в raw.data (source={group_source})")
+
+            await _normalize_and_upsert(raw_records, source_type, sink, labels)
+
+            fixed = [r['raw_id'] for r in raw_records if str(r['raw_id']) not in sink.rejected_ids]
+            await resolve_rejections(fixed, group_source, stage)
+            retried += len(raw_records)
+            resolved += len(fixed)
+            logger.info(
+                f"🔁 source={group_source}, source_type={source_type}: "
+                f"повторено {len(raw_records)}, исправлено {len(fixed)}, снова отклонено {sink.total}"
+            )
+    finally:
+        await close_db_pool()
+
+    logger.info("📊 === ИТОГИ ===")
+    logger.info(f"Время: {time.time() - start_time:.1f}с | Повторено: {retried} | Исправлено: {resolved}")
+    logger.info("=========================")
+
+
+# raw.data is partitioned, so its primary key includes source and extracted_at; raw.data_ids keeps ids
+# globally unique and only the ids claimed there are inserted (the first version of a row wins)
+_RAW_INSERT_SQL = """
+    WITH v AS (
+        SELECT * FROM unnest($2::text[], $3::text[], $4::bytea[]) AS v(id, payload, payload_hash)
+    ), claimed AS (
+        INSERT INTO raw.data_ids (id, source) SELECT id, $1 FROM v
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    )
+    INSERT INTO raw.data (id, source, payload, payload_hash)
+    SELECT v.id, $1, v.payload::jsonb, v.payload_hash FROM v JOIN claimed USING (id)
+"""
+# Unchanged rows are skipped, so re-sent edits neither touch the row nor fire the raw.data triggers
+_RAW_UPSERT_SQL = """
+    WITH v AS (
+        SELECT * FROM unnest($2::text[], $3::text[], $4::bytea[]) AS v(id, payload, payload_hash)
+    ), updated AS (
+        UPDATE raw.data d SET
+            payload = v.payload::jsonb,
+            payload_hash = v.payload_hash,
+            extracted_at = now()
+        FROM v
+        WHERE d.source = $1 AND d.id = v.id AND d.payload_hash IS DISTINCT FROM v.payload_hash
+    ), claimed AS (
+        INSERT INTO raw.data_ids (id, source) SELECT id, $1 FROM v
+        ON CONFLICT (id) DO NOTHING
+        RETURNING id
+    ), inserted AS (
+        INSERT INTO raw.data (id, source, payload, payload_hash)
+        SELECT v.id, $1, v.payload::jsonb, v.payload_hash FROM v JOIN claimed USING (id)
+    )
+    -- Ids neither claimed now nor already stored for this source belong to another source: nothing was written
+    SELECT v.id FROM v
+    WHERE v.id NOT IN (SELECT id FROM claimed)
+      AND NOT EXISTS (SELECT 1 FROM raw.data d WHERE d.source = $1 AND d.id = v.id)
+"""
+
+
+async def load_raw(source: str, records: List[Dict[str, Any]], update_existing: bool = False) -> List[str]:
+    """Bulk insert raw records into raw.data table.
+
+    update_existing: overwrite rows whose payload changed (push edits) instead of keeping the first version.
+    Returns the ids left unwritten because another source owns them (update_existing only, otherwise []).
+    """
     if not records:
-        return
-    
+        return []
+
+    rows: Dict[str, tuple] = {}
+    for r in records:
+        # One canonical serialization per row: the same bytes are hashed and inserted
+        payload_json = r.get('payload_json') or canonical_json(r['payload'])
+        digest = r.get('payload_hash') or hash_bytes(payload_json)
+        # One statement sees each id once: the first version for plain loads, the last one for updates
+        if update_existing or r['id'] not in rows:
+            rows[r['id']] = (payload_json.decode('utf-8'), digest)
+
     pool = await init_db_pool()
     async with pool.acquire() as conn:
+        await ensure_raw_partitions(conn, source)
+        args = (source, list(rows), [payload for payload, _ in rows.values()], [digest for _, digest in rows.values()])
         async with conn.transaction():
-            await conn.executemany(
-                "INSERT INTO raw.data (id, source, payload, payload_hash) VALUES ($1, $2, $3, $4) ON CONFLICT (id) DO NOTHING",
-                [
-                    (
-                        r['id'],
-                        source,
-                        json.dumps(r['payload'], ensure_ascii=False),
-                        __import__('hashlib').md5(
-                            json.dumps(r['payload'], sort_keys=True).encode()
-                        ).hexdigest()
+            if not update_existing:
+                await conn.execute(_RAW_INSERT_SQL, *args)
+                return []
+            return [r['id'] for r in await conn.fetch(_RAW_UPSERT_SQL, *args)]
+
+
+def _explicit_raw_id(r: Dict[str, Any], id_columns: tuple = ()) -> str | None:
+    """raw id строки из id_columns или колонки pk/id/row_id/uuid; None, если его нет."""
+    if id_columns:
+        # Composite id from the configured columns; a row with any of them empty falls back to the hash
+        parts = [str(r[c]).strip() for c in id_columns]
+        return ":".join(parts) if all(parts) else None
+    # Normalize keys to find 'id' case-insensitively
+    keys_norm = {k.lower().strip(): k for k in r.keys()}
+    id_key = keys_norm.get('pk') or keys_norm.get('id') or keys_norm.get('row_id') or keys_norm.get('uuid')
+    if id_key and r[id_key]:
+        return str(r[id_key]).strip()
+    return None
+
+
+def _prepare_raw_rows(records: List[Dict[str, Any]], id_columns: tuple = ()) -> List[Dict[str, Any]]:
+    """Назначает строкам raw id (id_columns, колонка pk/id/row_id/uuid или хеш содержимого) и хеш payload."""
+    if records and id_columns:
+        missing = [c for c in id_columns if c not in records[0]]
+        if missing:
+            raise ValueError(f"id_columns not found in sheet header: {missing}")
+
+    rows = []
+    seen_hashes: set[bytes] = set()
+    duplicates_count = 0
+    
+    for i, r in enumerate(records):
+        # 1. Try to get explicit ID
+        raw_id = _explicit_raw_id(r, id_columns)
+        
+        # Canonical bytes and the 16-byte digest are reused by load_raw for the insert
+        payload_json = canonical_json(r)
+        digest = hash_bytes(payload_json)
+
+        # 2. Fallback to Content Hash
+        if not raw_id:
+            # User warning logic: Check for full duplicates in source
+            if digest in seen_hashes:
+                duplicates_count += 1
+                if duplicates_count <= 5:
+                    logger.warning(
+                        f"⚠️ Найдена строка-дубликат (строка {i+2}). Рекомендуется добавить уникальный ID. "
+                        f"Content hash: {digest.hex()[:8]}"
                     )
-                    for r in records
-                ]
-            )
+            seen_hashes.add(digest)
+            
+            # We still need a unique ID for DB constraints, so we use hash + row info as fallback
+            # But heavily encourage PK usage in logs.
+            # Auto ids must stay identical to previous loads, so they keep the legacy SHA-256 form
+            h = hashlib.sha256(json.dumps(r, sort_keys=True).encode('utf-8')).hexdigest()
+            raw_id = f"gsheet_auto_{h[:12]}_{i}"
 
+        rows.append({
+            'id': raw_id,
+            'payload': r,
+            'payload_json': payload_json,
+            'payload_hash': digest,
+        })
+    
+    if duplicates_count > 0:
+         logger.warning(
+             f"⚠️ Всего найдено дубликатов хешей данных: {duplicates_count}. Это может привести к проблемам. "
+             "Рекомендуется добавить колонку 'id' в Google Sheet."
+         )
+    return rows
 
-async def run_load_sheets(spreadsheet_id: str, range_name: str, source: str = 'google_sheets'):
-    """Load data from Google Sheets into raw.data."""
-    await init_db_pool()
+
+async def _load_sheet(entry: SheetEntry, track_state: bool = False, force: bool = False) -> Dict[str, Any]:
+    """
+    Загрузить один диапазон Google Sheets в raw.data на уже открытом пуле.
+
+    Args:
+        track_state: Сверять хеш содержимого с etl.ingest_state и пропускать неизмененный диапазон
+        force: Загрузить даже без изменений (хеш в etl.ingest_state все равно обновляется)
+    """
+    # Sheets (pandas, aiohttp, google-auth) and the archive (pyarrow) are only needed here
+    from src.archive import cancel_archive_task, start_archive_task, wait_archive_task
+    from src.sheets import fetch_google_sheets
+
+    archive_task = None
+    start_time = time.time()
+    records: List[Dict[str, Any]] = []
+    result: Dict[str, Any] = {"name": entry.name, "fetched": 0, "loaded": 0, "status": "ok", "archive": "пропущен"}
+    # raw.data has no source_type yet, so load metrics use a fixed tag
+    labels = {"source": entry.source, "source_type": "raw"}
     try:
-        logger.info(f"📥 Извлечение из Google Sheets: {spreadsheet_id} {range_name} (source={source}) ...")
-        records = await fetch_google_sheets(spreadsheet_id, range_name)
+        logger.info(f"📥 Извлечение из Google Sheets: {entry.spreadsheet_id} {entry.range} (source={entry.source}) ...")
+        fetch_start = time.time()
+        records = await fetch_google_sheets(entry.spreadsheet_id, entry.range, entry.columns)
+        result["fetched"] = len(records)
+        metrics.ROWS_READ.inc(len(records), **labels)
+        _record_stage("fetch", time.time() - fetch_start, len(records), labels)
         logger.info(f"✅ Получено {len(records)} строк. Загрузка в raw.data ...")
-        
+
         # Prepare rows with duplicate detection
-        rows = []
-        seen_hashes = {}
-        duplicates_count = 0
-        
-        for i, r in enumerate(records):
-            # 1. Try to get explicit ID
-            # Normalize keys to find 'id' case-insensitively
-            keys_norm = {k.lower().strip(): k for k in r.keys()}
-            id_key = keys_norm.get('pk') or keys_norm.get('id') or keys_norm.get('row_id') or keys_norm.get('uuid')
-            
-            raw_id = None
-            if id_key and r[id_key]:
-                raw_id = str(r[id_key]).strip()
-            
-            # 2. Fallback to Content Hash
-            import hashlib
-            payload_str = json.dumps(r, sort_keys=True)
-            h = hashlib.sha256(payload_str.encode('utf-8')).hexdigest()
-            
-            if not raw_id:
-                # User warning logic: Check for full duplicates in source
-                if h in seen_hashes:
-                    duplicates_count += 1
-                    if duplicates_count <= 5:
-                        logger.warning(f"⚠️ Найдена строка-дубликат (строка {i+2}). Рекомендуется добавить уникальный ID. Content hash: {h[:8]}")
-                seen_hashes[h] = True
-                
-                # We still need a unique ID for DB constraints, so we use hash + row info as fallback
-                # But heavily encourage PK usage in logs
-                raw_id = f"gsheet_auto_{h[:12]}_{i}"
-
-            rows.append({
-                'id': raw_id,
-                'payload': r
-            })
-        
-        if duplicates_count > 0:
-             logger.warning(f"⚠️ Всего найдено дубликатов хешей данных: {duplicates_count}. Это может привести к проблемам. Рекомендуется добавить колонку 'id' в Google Sheet.")
+        rows = _prepare_raw_rows(records, entry.id_columns)
+        # Row digests already cover headers, values and order, so hashing them is enough to detect any change
+        content_hash = hash_bytes(b"".join(row['payload_hash'] for row in rows))
+        if track_state and not force and await get_ingest_hash(entry) == content_hash:
+            logger.info(f"💤 {entry.name}: без изменений с последней загрузки, пропуск.")
+            result["status"] = "unchanged"
+            return result
+
+        # Archive runs in the background so a slow storage endpoint doesn't delay the DB load
+        if records:
+            archive_task = start_archive_task(records, entry.spreadsheet_id, settings.ARCHIVE_PATH, entry.range)
 
-        await load_raw(source, rows)
+        load_start = time.time()
+        with tracing.span("db.load_raw", rows=len(rows)):
+            await load_raw(entry.source, rows)
+        result["loaded"] = len(rows)
+        metrics.ROWS_LOADED.inc(len(rows), **labels)
+        _record_stage("load_raw", time.time() - load_start, len(rows), labels)
         logger.info(f"💾 Загружено {len(rows)} строк.")
+        if track_state:
+            await save_ingest_hash(entry, content_hash, len(rows))
+        return result
+    except BaseException:
+        # The raw load failed: don't hold the error for up to ARCHIVE_TIMEOUT waiting on the archive
+        if archive_task is not None and not result["loaded"]:
+            await cancel_archive_task(archive_task)
+            archive_task = None
+            result["archive"] = "отменен"
+        raise
+    finally:
+        if archive_task is not None:
+            outcome = await wait_archive_task(archive_task, settings.ARCHIVE_TIMEOUT)
+            if not outcome.ok:
+                result["archive"] = f"ОШИБКА ({outcome.error})"
+            elif outcome.uploaded:
+                result["archive"] = f"OK за {outcome.duration:.1f}с"
+            else:
+                result["archive"] = f"пропущен (хранилище не настроено, локально: {outcome.path})"
+            _record_stage("archive", outcome.duration, len(records) if outcome.ok else 0, labels)
+        result["duration"] = time.time() - start_time
+        _record_stage("total", result["duration"], result["loaded"], labels)
+
+
+async def run_load_sheets(spreadsheet_id: str, range_name: str, source: str = 'google_sheets'):
+    """Load data from Google Sheets into raw.data."""
+    await init_db_pool()
+    start_time = time.time()
+    result: Dict[str, Any] = {"loaded": 0, "archive": "пропущен"}
+    try:
+        result = await _load_sheet(SheetEntry(spreadsheet_id, range_name, source))
+    finally:
+        await _export_metrics(f"load_{source}")
+        await close_db_pool()
+
+        logger.info("📊 === ИТОГИ ===")
+        logger.info(
+            f"Время: {time.time() - start_time:.1f}с | Загружено: {result['loaded']} | Архив: {result['archive']}"
+        )
+        logger.info("=========================")
+
+
+# --- Command: INGEST ---
+
+async def run_ingest(
+    manifest_path: str,
+    max_parallel: int | None = None,
+    force: bool = False,
+    run_elt: bool = False,
+):
+    """
+    Загрузить все таблицы из манифеста configs/*.toml одним процессом.
+
+    Args:
+        max_parallel: Сколько диапазонов загружается одновременно
+            (по умолчанию max_parallel манифеста / INGEST_MAX_PARALLEL)
+        force: Загрузить даже диапазоны без изменений
+        run_elt: После загрузки выполнить ELT для источников с новыми данными
+    """
+    entries, manifest_parallel = load_manifest(manifest_path)
+    max_parallel = max_parallel or manifest_parallel or settings.INGEST_MAX_PARALLEL
+    semaphore = asyncio.Semaphore(max_parallel)
+    start_time = time.time()
+    logger.info(f"📋 Манифест {manifest_path}: {len(entries)} диапазонов, одновременно: {max_parallel}")
+
+    async def load_one(entry: SheetEntry) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await _load_sheet(entry, track_state=True, force=force)
+            except Exception as e:
+                # One broken spreadsheet must not stop the rest of the manifest
+                logger.error(f"❌ {entry.name}: загрузка не удалась: {e}", exc_info=True)
+                return {
+                    "name": entry.name, "fetched": 0, "loaded": 0, "duration": 0.0,
+                    "status": f"error: {type(e).__name__}", "archive": "пропущен",
+                }
+
+    await init_db_pool()
+    elt_results: List[Dict[str, Any]] = []
+    try:
+        results = await asyncio.gather(*(load_one(entry) for entry in entries))
+        if run_elt:
+            changed = [e for e, r in zip(entries, results, strict=True) if r['status'] == "ok" and r['loaded']]
+            specs = list(dict.fromkeys(SourceSpec(e.source, e.source_type) for e in changed))
+            if specs:
+                elt_results = await _process_sources(specs)
+            else:
+                logger.info("💤 Новых данных нет, ELT не требуется.")
     finally:
+        await _export_metrics("ingest")
         await close_db_pool()
 
+    logger.info("📊 === ИТОГИ INGEST ===")
+    for r in results:
+        logger.info(
+            f"{r['name']}: {r['status']} | Получено: {r['fetched']} | Загружено: {r['loaded']} | Архив: {r['archive']}"
+        )
+    unchanged = sum(r['status'] == "unchanged" for r in results)
+    logger.info(f"Время: {time.time() - start_time:.1f}с | Диапазонов: {len(results)} | Без изменений: {unchanged}")
+    logger.info("=========================")
+
+    failed = [r['name'] for r in results if r['status'].startswith("error")]
+    failed += [r['source'] for r in elt_results if r['status'] != "ok"]
+    if failed:
+        raise RuntimeError(f"Ingest failed for: {', '.join(failed)}")
+    return results
+
+
+# --- Command: MIGRATE-RAW ---
+
+async def run_migrate_raw(batch_size: int = 5000, pause: float = 0.1, drop_legacy: bool = False):
+    """
+    Онлайн-перенос строк из raw.data_legacy в партиционированный raw.data.
+
+    Args:
+        batch_size: Строк в одной транзакции переноса
+        pause: Пауза между пачками, секунды (снижает нагрузку на рабочую БД)
+        drop_legacy: Удалить raw.data_legacy после переноса
+    """
+    start_time = time.time()
+    await init_db_pool()
+    try:
+        remaining = await legacy_raw_rows()
+        if remaining is None:
+            logger.info("💤 raw.data_legacy не найдена: перенос уже выполнен.")
+            return 0
+        logger.info(f"🚚 Перенос raw.data_legacy → raw.data: ~{remaining} строк, пачками по {batch_size}")
+
+        def progress(moved: int, total: int) -> None:
+            logger.info(f"🚚 Перенесено {total} строк (+{moved})")
+
+        total = await move_legacy_raw(batch_size, pause=pause, drop_legacy=drop_legacy, on_batch=progress)
+    finally:
+        await close_db_pool()
+
+    logger.info(f"✅ Перенос завершен: {total} строк за {time.time() - start_time:.1f}с")
+    return total
+
 
 async def run_check_env():
     """Check environment, .env, and DB connection."""
@@ -245,6 +1019,42 @@ async def run_check_env():
         await close_db_pool()
 
 
+def _default_specs(args: argparse.Namespace, specs: List[SourceSpec]) -> List[SourceSpec]:
+    return specs or [SourceSpec(args.source, args.source_type)]
+
+
+def _run_command(args: argparse.Namespace, specs: List[SourceSpec], max_concurrency: int | None) -> Coroutine:
+    if specs:
+        return run_sources(specs, test_mode=args.test, max_concurrency=max_concurrency)
+    return run_incremental_elt(test_mode=args.test, source=args.source, source_type=args.source_type)
+
+
+# Coroutine of each CLI command from (args, specs from --pair/--config, max_concurrency)
+COMMANDS: Dict[str, Callable[[argparse.Namespace, List[SourceSpec], int | None], Coroutine]] = {
+    "run": _run_command,
+    "load": lambda args, specs, _: run_load_sheets(args.spreadsheet_id, args.range, source=args.source),
+    "enqueue": lambda args, specs, _: run_enqueue(_default_specs(args, specs)),
+    "worker": lambda args, specs, _: run_worker(source=args.source, concurrency=args.concurrency, drain=args.drain),
+    "serve": lambda args, specs, _: run_serve(_default_specs(args, specs), catch_up=not args.no_catch_up),
+    "push-server": lambda args, specs, _: run_push_server(
+        _default_specs(args, specs),
+        args.host or settings.PUSH_HOST,
+        args.port or settings.PUSH_PORT,
+        normalize=not args.no_normalize,
+    ),
+    "read-api": lambda args, specs, _: run_read_api(
+        args.host or settings.READ_API_HOST, args.port or settings.READ_API_PORT
+    ),
+    "ingest": lambda args, specs, _: run_ingest(
+        args.manifest, max_parallel=args.max_parallel, force=args.force, run_elt=args.run
+    ),
+    "retry-rejected": lambda args, specs, _: run_retry_rejected(source=args.source, stage=args.stage),
+    "migrate-raw": lambda args, specs, _: run_migrate_raw(
+        args.batch_size, pause=args.pause, drop_legacy=args.drop_legacy
+    ),
+    "check": lambda args, specs, _: run_check_env(),
+}
+
 
 def main():
     """Точка входа CLI."""
@@ -253,6 +1063,15 @@ def main():
     )
     parser.add_argument("--debug", action="store_true", help="Set log level to DEBUG")
     parser.add_argument("--json-logs", action="store_true", help="Enable JSON logging format")
+    parser.add_argument(
+        "--trace", choices=["none", "console", "file"], help="Trace exporter (default: TRACE_EXPORTER setting)"
+    )
+    parser.add_argument(
+        "--profile",
+        choices=profiling.PROFILE_MODES,
+        help="Profile the command: cpu (cProfile .prof), sampling (pyinstrument speedscope), "
+        "memory (tracemalloc top allocation sites per stage); output goes to ARCHIVE_PATH/profiles",
+    )
 
     subparsers = parser.add_subparsers(dest="command", required=True)
     
@@ -265,6 +1084,15 @@ def main():
     )
     p_run.add_argument("--source", default="google_sheets", help="Raw data source name")
     p_run.add_argument("--source-type", default="live", help="Target staging source_type tag")
+    p_run.add_argument(
+        "--pair",
+        action="append",
+        type=parse_source_pair,
+        metavar="SOURCE[:TYPE[:CONCURRENCY]]",
+        help="Process several sources concurrently on one pool (repeatable; overrides --source/--source-type)",
+    )
+    p_run.add_argument("--config", help="TOML file with [[sources]] to process concurrently")
+    p_run.add_argument("--max-concurrency", type=int, help="Sources processed at once (default: RUN_MAX_CONCURRENCY)")
     
     # Load command
     p_load = subparsers.add_parser('load', help='Load from Google Sheets')
@@ -272,6 +1100,77 @@ def main():
     p_load.add_argument('range', nargs='?', default='Sheet1!A:AF', help='Range (default: Sheet1!A:AF)')
     p_load.add_argument('--source', default='google_sheets', help='Store as this source in raw.data')
     
+    # Enqueue command
+    p_enqueue = subparsers.add_parser('enqueue', help='Record changed raw rows as claimable jobs in etl.jobs')
+    p_enqueue.add_argument("--source", default="google_sheets", help="Raw data source name")
+    p_enqueue.add_argument("--source-type", default="live", help="Target staging source_type tag")
+    p_enqueue.add_argument(
+        "--pair", action="append", type=parse_source_pair, metavar="SOURCE[:TYPE]",
+        help="Enqueue several sources (repeatable)",
+    )
+    p_enqueue.add_argument("--config", help="TOML file with [[sources]] to enqueue")
+
+    # Worker command
+    p_worker = subparsers.add_parser('worker', help='Claim and process jobs from etl.jobs')
+    p_worker.add_argument('--source', help='Only jobs of this raw source')
+    p_worker.add_argument('--concurrency', type=int, default=1, help='Jobs processed at once by this process')
+    p_worker.add_argument('--drain', action='store_true', help='Exit when the queue is empty instead of polling')
+
+    # Serve command
+    p_serve = subparsers.add_parser(
+        'serve', help='Daemon: LISTEN for raw.data changes and process them in micro-batches'
+    )
+    p_serve.add_argument("--source", default="google_sheets", help="Raw data source name")
+    p_serve.add_argument("--source-type", default="live", help="Target staging source_type tag")
+    p_serve.add_argument(
+        "--pair", action="append", type=parse_source_pair, metavar="SOURCE[:TYPE[:CONCURRENCY]]",
+        help="Serve several sources (repeatable)",
+    )
+    p_serve.add_argument("--config", help="TOML file with [[sources]] to serve")
+    p_serve.add_argument('--no-catch-up', action='store_true', help='Skip the incremental pass after (re)connecting')
+
+    # Push-server command
+    p_push = subparsers.add_parser('push-server', help='HTTP endpoint for row edits pushed by Apps Script')
+    p_push.add_argument("--source", default="google_sheets", help="Raw data source name")
+    p_push.add_argument("--source-type", default="live", help="Target staging source_type tag")
+    p_push.add_argument(
+        "--pair", action="append", type=parse_source_pair, metavar="SOURCE[:TYPE[:CONCURRENCY]]",
+        help="Accept several sources (repeatable)",
+    )
+    p_push.add_argument("--config", help="TOML file with [[sources]] to accept")
+    p_push.add_argument('--host', default=None, help='Bind address (default: PUSH_HOST)')
+    p_push.add_argument('--port', type=int, default=None, help='Port (default: PUSH_PORT)')
+    p_push.add_argument('--no-normalize', action='store_true', help='Only write raw.data (let "serve" normalize)')
+
+    # Read-api command
+    p_read = subparsers.add_parser('read-api', help='HTTP read API over marts for the web app')
+    p_read.add_argument('--host', default=None, help='Bind address (default: READ_API_HOST)')
+    p_read.add_argument('--port', type=int, default=None, help='Port (default: READ_API_PORT)')
+
+    # Ingest command
+    p_ingest = subparsers.add_parser('ingest', help='Load every spreadsheet range listed in a TOML manifest')
+    p_ingest.add_argument(
+        'manifest', nargs='?', default='configs/ingest.toml', help='Manifest path (default: configs/ingest.toml)'
+    )
+    p_ingest.add_argument(
+        '--max-parallel', type=int, help='Ranges loaded at once (default: manifest max_parallel / INGEST_MAX_PARALLEL)'
+    )
+    p_ingest.add_argument('--force', action='store_true', help='Load ranges even if their content is unchanged')
+    p_ingest.add_argument('--run', action='store_true', help='Run ELT for sources that received new data')
+
+    # Retry-rejected command
+    p_retry = subparsers.add_parser('retry-rejected', help='Re-process rows from etl.rejected_records')
+    p_retry.add_argument('--source', help='Only rejections of this raw source')
+    p_retry.add_argument('--stage', choices=['normalize', 'upsert'], help='Only rejections from this stage')
+
+    # Migrate-raw command
+    p_migrate = subparsers.add_parser(
+        'migrate-raw', help='Move rows from raw.data_legacy into partitioned raw.data online'
+    )
+    p_migrate.add_argument('--batch-size', type=int, default=5000, help='Rows moved per transaction')
+    p_migrate.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches')
+    p_migrate.add_argument('--drop-legacy', action='store_true', help='Drop raw.data_legacy once it is empty')
+
     # Check command
     p_check = subparsers.add_parser('check', help='Check environment')
     
@@ -281,20 +1180,35 @@ def main():
     log_level = "DEBUG" if getattr(args, 'debug', False) else settings.LOG_LEVEL
     json_format = getattr(args, 'json_logs', False)
     setup_logging(level=log_level, json_format=json_format)
+    tracing.configure(args.trace or settings.TRACE_EXPORTER, settings.TRACE_FILE)
+
+    specs: List[SourceSpec] = []
+    max_concurrency = None
+    if args.command in ('run', 'enqueue', 'serve', 'push-server') and (args.pair or args.config):
+        try:
+            if args.config:
+                specs, max_concurrency = load_sources(args.config)
+            specs += args.pair or []
+            check_unique(specs)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        max_concurrency = getattr(args, "max_concurrency", None) or max_concurrency
     
     try:
-        if args.command == 'run':
-            asyncio.run(run_incremental_elt(test_mode=args.test, source=args.source, source_type=args.source_type))
-        elif args.command == 'load':
-            asyncio.run(run_load_sheets(args.spreadsheet_id, args.range, source=args.source))
-        elif args.command == 'check':
-            asyncio.run(run_check_env())
+        # Root span: every stage of the command ends up in a single trace
+        with (
+            profiling.profile_command(args.profile, args.command, settings.ARCHIVE_PATH),
+            tracing.span(f"command.{args.command}"),
+        ):
+            asyncio.run(COMMANDS[args.command](args, specs, max_concurrency))
     except KeyboardInterrupt:
         logger.info("Process interrupted by user")
         sys.exit(1)
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        _log_query_report()
 
 
 if __name__ == "__main__":
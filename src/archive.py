@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+import logging
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .db import storage_configured, upload_to_supabase_storage
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BUCKET = "archives"
+ARCHIVE_COMPRESSION = "zstd"
+ARCHIVE_BATCH_ROWS = 5000
+
+
+def _archive_columns(records: list[dict[str, Any]]) -> list[str]:
+    """Возвращает упорядоченное объединение ключей всех записей."""
+    return list(dict.fromkeys(key for record in records for key in record))
+
+
+def _iter_record_batches(
+    records: list[dict[str, Any]], schema: pa.Schema, batch_rows: int
+) -> Iterator[pa.RecordBatch]:
+    """Порционно конвертирует записи в RecordBatch без промежуточного DataFrame."""
+    for start in range(0, len(records), batch_rows):
+        chunk = records[start : start + batch_rows]
+        arrays = []
+        for name in schema.names:
+            column = [record.get(name) for record in chunk]
+            arrays.append(pa.array([None if v is None else str(v) for v in column], type=pa.string()))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet_archive(
+    records: list[dict[str, Any]],
+    path: Path,
+    metadata: dict[str, str] | None = None,
+    batch_rows: int = ARCHIVE_BATCH_ROWS,
+) -> int:
+    """Пишет записи в Parquet (zstd) потоково, пакетами RecordBatch; возвращает размер файла."""
+    columns = _archive_columns(records)
+    schema = pa.schema([pa.field(name, pa.string()) for name in columns], metadata=metadata)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with pq.ParquetWriter(tmp_path, schema, compression=ARCHIVE_COMPRESSION) as writer:
+        for batch in _iter_record_batches(records, schema, batch_rows):
+            writer.write_batch(batch)
+    tmp_path.replace(path)
+    return path.stat().st_size
+
+
+async def archive_records(
+    records: list[dict[str, Any]],
+    spreadsheet_id: str,
+    archive_root: str | Path,
+    range_name: str | None = None,
+    upload: bool = True,
+) -> Path | None:
+    """Архивирует выгрузку в Parquet и (если upload) загружает файл в Supabase storage потоком."""
+    if not records:
+        return None
+
+    date_str = datetime.date.today().isoformat()
+    file_name = f"google_sheets_{spreadsheet_id}.parquet"
+    # Hive-style layout (dt=YYYY-MM-DD) so the archive can be queried as a dataset for backfills
+    out_path = Path(archive_root) / "parquet" / f"dt={date_str}" / file_name
+    metadata = {"spreadsheet_id": spreadsheet_id, "range": range_name or "", "rows": str(len(records))}
+
+    with span("archive.write_parquet", rows=len(records)) as sp:
+        size = await asyncio.to_thread(write_parquet_archive, records, out_path, metadata)
+        sp.set_attribute("bytes", size)
+    logger.info(f"🗄️ Архив записан: {out_path} ({size / 1024:.1f} КБ)")
+
+    if upload:
+        await upload_to_supabase_storage(
+            ARCHIVE_BUCKET, f"dt={date_str}/{file_name}", out_path, "application/vnd.apache.parquet"
+        )
+    return out_path
+
+
+# --- Background Archiving ---
+
+
+@dataclass
+class ArchiveOutcome:
+    """Итог фоновой архивации для сводки запуска."""
+
+    ok: bool
+    path: Path | None = None
+    error: str | None = None
+    duration: float = 0.0
+    # False when storage isn't configured: the Parquet file is only kept locally
+    uploaded: bool = False
+
+
+async def _supervised_archive(
+    records: list[dict[str, Any]], spreadsheet_id: str, archive_root: str | Path, range_name: str | None
+) -> ArchiveOutcome:
+    start = time.time()
+    upload = storage_configured()
+    try:
+        path = await archive_records(records, spreadsheet_id, archive_root, range_name, upload)
+        return ArchiveOutcome(ok=True, path=path, duration=time.time() - start, uploaded=upload)
+    except Exception as exc:
+        logger.warning("⚠️ Архивация не удалась: %s", exc)
+        return ArchiveOutcome(ok=False, error=f"{type(exc).__name__}: {exc}", duration=time.time() - start)
+
+
+def start_archive_task(
+    records: list[dict[str, Any]], spreadsheet_id: str, archive_root: str | Path, range_name: str | None = None
+) -> asyncio.Task[ArchiveOutcome]:
+    """Запускает архивацию в фоне, параллельно с загрузкой в БД."""
+    return asyncio.create_task(
+        _supervised_archive(records, spreadsheet_id, archive_root, range_name), name=f"archive:{spreadsheet_id}"
+    )
+
+
+async def wait_archive_task(task: asyncio.Task[ArchiveOutcome], timeout: float) -> ArchiveOutcome:
+    """Дожидается фоновой архивации с таймаутом; при превышении отменяет задачу."""
+    try:
+        return await asyncio.wait_for(task, timeout=timeout)
+    except TimeoutError:
+        logger.warning(f"⚠️ Архивация не завершилась за {timeout:.0f}с и была отменена")
+        return ArchiveOutcome(ok=False, error=f"timeout after {timeout:.0f}s", duration=timeout)
+
+
+async def cancel_archive_task(task: asyncio.Task[ArchiveOutcome]) -> None:
+    """Отменяет фоновую архивацию и дожидается ее остановки."""
+    task.cancel()
+    await asyncio.wait([task])
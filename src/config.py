@@ -2,7 +2,9 @@
 Настройки конфигурации с использованием Pydantic v2.
 """
 
-from pydantic import Field
+from typing import Literal
+
+from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,19 +14,80 @@ class Settings(BaseSettings):
     POSTGRES_URI: str = Field(..., validation_alias="POSTGRES_URI")
     SUPABASE_URL: str | None = None
     SUPABASE_SERVICE_KEY: str | None = None
+    # Files at or above this size go through the resumable (TUS) upload; Supabase requires 6 MB chunks
+    STORAGE_RESUMABLE_THRESHOLD: int = Field(default=6 * 1024 * 1024, validation_alias="STORAGE_RESUMABLE_THRESHOLD")
+    STORAGE_CHUNK_SIZE: int = Field(default=6 * 1024 * 1024, validation_alias="STORAGE_CHUNK_SIZE")
     # Google Sheets configuration
     SHEETS_API_KEY: str | None = None  # Fallback для публичного доступа
     SHEETS_SA_JSON: str | None = None  # Путь к JSON сервисного аккаунта
     ARCHIVE_PATH: str = Field(default="./archive")
+    # Max seconds to wait for the background archive upload before the command exits
+    ARCHIVE_TIMEOUT: float = Field(default=300.0, validation_alias="ARCHIVE_TIMEOUT")
     LOG_LEVEL: str = Field(default="INFO")
+    # OpenMetrics export: textfile directory (empty disables) and optional Pushgateway URL
+    METRICS_DIR: str = Field(default="./archive/metrics", validation_alias="METRICS_DIR")
+    METRICS_PUSHGATEWAY_URL: str | None = Field(default=None, validation_alias="METRICS_PUSHGATEWAY_URL")
+    # Tracing: none | console (waterfall in logs) | file (OTLP JSON lines in TRACE_FILE)
+    TRACE_EXPORTER: str = Field(default="none", validation_alias="TRACE_EXPORTER")
+    TRACE_FILE: str = Field(default="./archive/traces/traces.jsonl", validation_alias="TRACE_FILE")
+    # Statements slower than this are logged with their parameter shape (types/lengths, never values)
+    SLOW_QUERY_MS: float = Field(default=500.0, validation_alias="SLOW_QUERY_MS")
+    # How many statements to show in the end-of-command query report (0 disables it)
+    QUERY_REPORT_TOP: int = Field(default=10, validation_alias="QUERY_REPORT_TOP")
     # Connection pool sizing for asyncpg (small defaults to avoid exhausting hosted DB limits)
     DB_POOL_MIN: int = Field(default=1, validation_alias="DB_POOL_MIN")
     DB_POOL_MAX: int = Field(default=4, validation_alias="DB_POOL_MAX")
+    # "transaction" when POSTGRES_URI points at a transaction-mode pooler (Supabase pooler on :6543,
+    # pgbouncer pool_mode=transaction): no prepared-statement cache, staging upserts as one unnest statement
+    DB_POOLER_MODE: Literal["session", "transaction"] = Field(default="session", validation_alias="DB_POOLER_MODE")
+    # Direct (non-pooled) DSN for LISTEN connections, which a transaction pooler cannot keep; defaults to POSTGRES_URI
+    POSTGRES_DIRECT_URI: str | None = Field(default=None, validation_alias="POSTGRES_DIRECT_URI")
     SHEETS_SPREADSHEET_ID: str | None = None
     SHEETS_RANGE: str | None = None
+    # 16-byte payload_hash digest: blake2b (default) or md5 (same values as the legacy hex hashes)
+    PAYLOAD_HASH_ALGORITHM: Literal["blake2b", "md5"] = Field(
+        default="blake2b", validation_alias="PAYLOAD_HASH_ALGORITHM"
+    )
+    # StagingRecord validation: strict (full model) or fast (TypeAdapter over untyped fields only)
+    STAGING_VALIDATION: Literal["strict", "fast"] = Field(default="fast", validation_alias="STAGING_VALIDATION")
     # ELT processing configuration
     BATCH_SIZE: int = Field(default=2000, validation_alias="BATCH_SIZE")
     TEST_LIMIT: int = Field(default=100, validation_alias="TEST_LIMIT")
+    # How many sources "run --pair/--config" processes at once on the shared pool
+    RUN_MAX_CONCURRENCY: int = Field(default=2, validation_alias="RUN_MAX_CONCURRENCY")
+    # How many manifest ranges "ingest" fetches and loads at once
+    INGEST_MAX_PARALLEL: int = Field(default=3, validation_alias="INGEST_MAX_PARALLEL")
+
+    # --- Work queue (etl.jobs) ---
+    # A job whose worker stops renewing its lease for this long is claimable again
+    JOB_LEASE_SECONDS: float = Field(default=300.0, validation_alias="JOB_LEASE_SECONDS")
+    # Claims per job before it is marked failed
+    JOB_MAX_ATTEMPTS: int = Field(default=3, validation_alias="JOB_MAX_ATTEMPTS")
+    WORKER_POLL_SECONDS: float = Field(default=5.0, validation_alias="WORKER_POLL_SECONDS")
+
+    # --- Serve (LISTEN/NOTIFY daemon) ---
+    # A micro-batch is processed after this much silence on the channel...
+    SERVE_DEBOUNCE_MS: float = Field(default=500.0, validation_alias="SERVE_DEBOUNCE_MS")
+    # ...but never later than this after its first notification, even under a steady stream
+    SERVE_MAX_WAIT_MS: float = Field(default=5000.0, validation_alias="SERVE_MAX_WAIT_MS")
+    SERVE_METRICS_INTERVAL: float = Field(default=60.0, validation_alias="SERVE_METRICS_INTERVAL")
+
+    # --- Push server (Apps Script row edits) ---
+    # Shared secret sent by gas/push_rows.gs as "Authorization: Bearer <token>"; the server won't start without it
+    INGEST_TOKEN: SecretStr | None = Field(default=None, validation_alias="INGEST_TOKEN")
+    PUSH_HOST: str = Field(default="0.0.0.0", validation_alias="PUSH_HOST")
+    PUSH_PORT: int = Field(default=8080, validation_alias="PUSH_PORT")
+    PUSH_MAX_ROWS: int = Field(default=5000, validation_alias="PUSH_MAX_ROWS")
+
+    # --- Read API (marts for the web app) ---
+    READ_API_HOST: str = Field(default="0.0.0.0", validation_alias="READ_API_HOST")
+    READ_API_PORT: int = Field(default=8081, validation_alias="READ_API_PORT")
+    # Upper bound on staleness of cached aggregates if a marts_changed notification is missed
+    READ_API_CACHE_TTL: float = Field(default=300.0, validation_alias="READ_API_CACHE_TTL")
+    READ_API_CACHE_SIZE: int = Field(default=128, validation_alias="READ_API_CACHE_SIZE")
+    # Default page of /v1/transactions; ?limit= may ask for up to READ_API_MAX_PAGE_SIZE
+    READ_API_PAGE_SIZE: int = Field(default=100, validation_alias="READ_API_PAGE_SIZE")
+    READ_API_MAX_PAGE_SIZE: int = Field(default=1000, validation_alias="READ_API_MAX_PAGE_SIZE")
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
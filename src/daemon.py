@@ -0,0 +1,192 @@
+"""Режим serve: LISTEN raw_data_changed, склейка уведомлений в микропакеты и обработка только этих id."""
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from .db import connect_listener
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "raw_data_changed"
+RECONNECT_MIN_SECONDS = 1.0
+RECONNECT_MAX_SECONDS = 60.0
+
+
+def parse_notification(payload: str) -> tuple[str, list[str]]:
+    """Разбирает уведомление триггера: {"source": ..., "ids": [...]}."""
+    data = json.loads(payload)
+    return data["source"], [str(i) for i in data["ids"]]
+
+
+class ChangeBatcher:
+    """Копит id из уведомлений и отдает микропакет после паузы debounce, по размеру или по возрасту."""
+
+    def __init__(self, debounce: float, max_wait: float, max_batch: int):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        # Dicts keep arrival order and drop repeated ids (a row updated twice is processed once)
+        self._pending: dict[str, dict[str, None]] = {}
+        self._size = 0
+        self._first_at = 0.0
+        self._last_at = 0.0
+        self._event = asyncio.Event()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, source: str, ids: list[str]) -> None:
+        now = time.monotonic()
+        if not self._size:
+            self._first_at = now
+        self._last_at = now
+        pending = self._pending.setdefault(source, {})
+        before = len(pending)
+        pending.update(dict.fromkeys(ids))
+        self._size += len(pending) - before
+        self._event.set()
+
+    def take(self) -> dict[str, list[str]]:
+        """Забирает все накопленные id по источникам."""
+        batch = {source: list(ids) for source, ids in self._pending.items() if ids}
+        self._pending.clear()
+        self._size = 0
+        return batch
+
+    async def next_batch(self) -> dict[str, list[str]]:
+        """Ждет первое уведомление, затем тишину в debounce секунд (но не дольше max_wait) или max_batch id."""
+        while not self._size:
+            self._event.clear()
+            await self._event.wait()
+        while self._size < self.max_batch:
+            deadline = min(self._last_at + self.debounce, self._first_at + self.max_wait)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._event.clear()
+            try:
+                await asyncio.wait_for(self._event.wait(), remaining)
+            except TimeoutError:
+                pass
+        return self.take()
+
+
+class BatchConsumer:
+    """Фоновая задача: забирает микропакеты из ChangeBatcher и передает их в process(source, ids)."""
+
+    def __init__(self, batcher: ChangeBatcher, process: Callable[[str, list[str]], Awaitable[Any]]):
+        self.batcher = batcher
+        self.process = process
+        self.task: asyncio.Task[None] | None = None
+        self._in_flight: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def _process_batch(self, batch: dict[str, list[str]]) -> None:
+        for source, ids in batch.items():
+            try:
+                await self.process(source, ids)
+            except Exception as e:
+                # The rows stay changed in raw.data, so the next catch-up picks them up again
+                logger.error(f"❌ Обработка {len(ids)} записей ({source}) не удалась: {e}", exc_info=True)
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self.batcher.next_batch()
+            self._in_flight = asyncio.create_task(self._process_batch(batch))
+            # Shielded: stopping cancels the wait for the next batch, never a half-written upsert
+            await asyncio.shield(self._in_flight)
+
+    async def stop(self) -> None:
+        """Останавливается, дождавшись текущего пакета и обработав все накопленное."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        if self._in_flight is not None:
+            await self._in_flight
+        if len(self.batcher):
+            await self._process_batch(self.batcher.take())
+
+
+async def serve(
+    process: Callable[[str, list[str]], Awaitable[Any]],
+    stop: asyncio.Event,
+    batcher: ChangeBatcher,
+    catch_up: Callable[[], Awaitable[Any]] | None = None,
+) -> None:
+    """
+    Слушает CHANNEL на отдельном соединении и передает микропакеты в process(source, ids).
+
+    После каждого (пере)подключения вызывается catch_up, чтобы подобрать изменения,
+    пришедшие, пока LISTEN не работал. Возвращается после stop, обработав накопленное.
+    """
+
+    def on_notify(conn: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            source, ids = parse_notification(payload)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"⚠️ Некорректное уведомление {channel}: {e}")
+            return
+        batcher.add(source, ids)
+
+    consumer = BatchConsumer(batcher, process)
+    consumer.start()
+    try:
+        await listen(CHANNEL, on_notify, stop, on_connect=catch_up, watch=consumer.task)
+    finally:
+        await consumer.stop()
+
+
+async def listen(
+    channel: str,
+    on_notify: Callable[[Any, int, str, str], None],
+    stop: asyncio.Event,
+    on_connect: Callable[[], Awaitable[Any]] | None = None,
+    watch: asyncio.Task[Any] | None = None,
+) -> None:
+    """
+    Держит LISTEN channel на отдельном соединении до stop, переподключаясь с backoff при обрыве.
+
+    on_connect вызывается после каждого (пере)подключения, когда LISTEN уже активен;
+    если задача watch завершилась, ее исключение пробрасывается наружу.
+    """
+    stop_wait = asyncio.create_task(stop.wait())
+    delay = RECONNECT_MIN_SECONDS
+    try:
+        while not stop.is_set():
+            lost = asyncio.Event()
+            try:
+                conn = await connect_listener(channel, on_notify)
+            except Exception as e:
+                logger.error(f"❌ LISTEN {channel}: нет соединения ({e}), повтор через {delay:.0f}с")
+                await asyncio.wait([stop_wait], timeout=delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+            conn.add_termination_listener(lambda _conn, lost=lost: lost.set())
+            delay = RECONNECT_MIN_SECONDS
+            logger.info(f"👂 LISTEN {channel}")
+            try:
+                # LISTEN is already active, so nothing committed from here on can slip past on_connect
+                if on_connect is not None:
+                    await on_connect()
+                lost_wait = asyncio.create_task(lost.wait())
+                waits = [stop_wait, lost_wait] if watch is None else [stop_wait, lost_wait, watch]
+                await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                lost_wait.cancel()
+                if watch is not None and watch.done():
+                    watch.result()  # re-raise an unexpected failure of the watched task
+                if lost.is_set() and not stop.is_set():
+                    logger.warning(f"⚠️ Соединение LISTEN {channel} потеряно, переподключение")
+            finally:
+                if not conn.is_closed():
+                    await conn.close()
+    finally:
+        stop_wait.cancel()
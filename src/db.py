@@ -1,15 +1,26 @@
+import asyncio
+import base64
 import json
 import logging
-from collections.abc import Iterable
+import os
+from collections.abc import AsyncIterator, Callable, Iterable
 from contextlib import asynccontextmanager
-from typing import Any
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urljoin
 
-import aiohttp
 import asyncpg
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
 
 from .config import settings
+from .querystats import QUERY_STATS, instrument_connection, rows_from_status
+from .tracing import span, traced
+from .utils import encode_json_param, json_loads
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# aiohttp, aiofiles and google-auth are imported inside the functions that use them:
+# they cost hundreds of milliseconds at startup and `run`/`check` never need them.
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +29,15 @@ logger = logging.getLogger(__name__)
 _pool: asyncpg.Pool | None = None
 
 
+def _connect_kwargs() -> dict[str, Any]:
+    """Параметры asyncpg для DB_POOLER_MODE."""
+    if settings.DB_POOLER_MODE == "transaction":
+        # The pooler hands each transaction to any server connection, where asyncpg's named
+        # statements from an earlier transaction do not exist
+        return {"statement_cache_size": 0}
+    return {}
+
+
 async def init_db_pool(min_size: int | None = None, max_size: int | None = None) -> asyncpg.Pool:
     """Инициализирует глобальный пул соединений asyncpg."""
     global _pool
@@ -31,12 +51,18 @@ async def init_db_pool(min_size: int | None = None, max_size: int | None = None)
         if max_size < 1:
             max_size = 1
 
-        import asyncio
         import re
 
         try:
             _pool = await asyncio.wait_for(
-                asyncpg.create_pool(dsn=str(settings.POSTGRES_URI), min_size=min_size, max_size=max_size), timeout=30.0
+                asyncpg.create_pool(
+                    dsn=str(settings.POSTGRES_URI),
+                    min_size=min_size,
+                    max_size=max_size,
+                    init=_init_connection,
+                    **_connect_kwargs(),
+                ),
+                timeout=30.0,
             )
         except Exception as e:
             # Mask password in DSN for logging
@@ -53,6 +79,37 @@ async def close_db_pool() -> None:
         _pool = None
 
 
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """Настраивает новое соединение: JSON-кодеки и сбор статистики запросов."""
+    # json/jsonb arrive as Python objects and pre-serialized text is sent without a second dumps
+    for typename in ("json", "jsonb"):
+        await conn.set_type_codec(
+            typename, encoder=encode_json_param, decoder=json_loads, schema="pg_catalog", format="text"
+        )
+    instrument_connection(conn)
+
+
+async def _connect_one_off(dsn: str | None = None) -> asyncpg.Connection:
+    conn = await asyncpg.connect(dsn=dsn or str(settings.POSTGRES_URI), **_connect_kwargs())
+    await _init_connection(conn)
+    return conn
+
+
+async def connect_listener(channel: str, callback: Callable[..., Any]) -> asyncpg.Connection:
+    """Открывает отдельное от пула соединение и подписывает его на LISTEN channel."""
+    if settings.DB_POOLER_MODE == "transaction" and not settings.POSTGRES_DIRECT_URI:
+        logger.warning(
+            f"⚠️ LISTEN {channel} через пулер транзакций: уведомления могут теряться, задайте POSTGRES_DIRECT_URI"
+        )
+    conn = await _connect_one_off(settings.POSTGRES_DIRECT_URI)
+    try:
+        await conn.add_listener(channel, callback)
+    except Exception:
+        await conn.close()
+        raise
+    return conn
+
+
 def get_db_pool() -> asyncpg.Pool | None:
     return _pool
 
@@ -68,7 +125,9 @@ async def acquire():
 
 async def execute(sql: str, *args: Any) -> str:
     async with acquire() as conn:
-        return await conn.execute(sql, *args)
+        status = await conn.execute(sql, *args)
+    QUERY_STATS.add_rows(sql, rows_from_status(status))
+    return status
 
 
 async def executemany(sql: str, args_iter: Iterable[Iterable[Any]]) -> None:
@@ -79,7 +138,7 @@ async def executemany(sql: str, args_iter: Iterable[Iterable[Any]]) -> None:
 
 async def executemany_one_off(sql: str, args_iter: Iterable[Iterable[Any]]) -> None:
     """Запускает executemany, используя одноразовое соединение."""
-    conn = await asyncpg.connect(dsn=str(settings.POSTGRES_URI))
+    conn = await _connect_one_off()
     try:
         async with conn.transaction():
             await conn.executemany(sql, args_iter)
@@ -89,23 +148,28 @@ async def executemany_one_off(sql: str, args_iter: Iterable[Iterable[Any]]) -> N
 
 async def fetch(sql: str, *args: Any):
     async with acquire() as conn:
-        return await conn.fetch(sql, *args)
+        rows = await conn.fetch(sql, *args)
+    QUERY_STATS.add_rows(sql, len(rows))
+    return rows
 
 
 async def fetch_one_off(sql: str, *args: Any):
     """Запускает запрос с одноразовым соединением."""
-    conn = await asyncpg.connect(dsn=str(settings.POSTGRES_URI))
+    conn = await _connect_one_off()
     try:
         result = await conn.fetch(sql, *args)
+        QUERY_STATS.add_rows(sql, len(result))
         return result
     finally:
         await conn.close()
 
 
 async def execute_one_off(sql: str, *args: Any):
-    conn = await asyncpg.connect(dsn=str(settings.POSTGRES_URI))
+    conn = await _connect_one_off()
     try:
-        return await conn.execute(sql, *args)
+        status = await conn.execute(sql, *args)
+        QUERY_STATS.add_rows(sql, rows_from_status(status))
+        return status
     finally:
         await conn.close()
 
@@ -129,10 +193,14 @@ def load_service_account_info() -> dict | None:
         return None
 
 
+@traced("google.access_token")
 def get_google_access_token() -> str | None:
     info = load_service_account_info()
     if not info:
         return None
+    from google.auth.transport.requests import Request
+    from google.oauth2 import service_account
+
     creds = service_account.Credentials.from_service_account_info(
         info, scopes=["https://www.googleapis.com/auth/spreadsheets"]
     )
@@ -140,22 +208,145 @@ def get_google_access_token() -> str | None:
     return creds.token
 
 
-async def upload_to_supabase_storage(
-    bucket: str, path: str, file_bytes: bytes, content_type: str = "application/octet-stream"
-) -> dict[str, Any]:
-    if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_KEY:
+UPLOAD_READ_CHUNK = 256 * 1024
+
+
+async def _iter_file_chunks(file_path: Path, chunk_size: int = UPLOAD_READ_CHUNK) -> AsyncIterator[bytes]:
+    """Читает файл асинхронно фиксированными порциями."""
+    import aiofiles
+
+    async with aiofiles.open(file_path, "rb") as fh:
+        while chunk := await fh.read(chunk_size):
+            yield chunk
+
+
+def storage_configured() -> bool:
+    return bool(settings.SUPABASE_URL and settings.SUPABASE_SERVICE_KEY)
+
+
+def _storage_auth_headers() -> dict[str, str]:
+    if not storage_configured():
         raise RuntimeError("Supabase storage not configured")
-    url = f"{settings.SUPABASE_URL}/storage/v1/object/{bucket}/{path}"
-    headers = {
+    return {
         "apikey": settings.SUPABASE_SERVICE_KEY,
         "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
-        "Content-Type": content_type,
     }
+
+
+async def upload_to_supabase_storage(
+    bucket: str, path: str, file_bytes: bytes | Path, content_type: str = "application/octet-stream"
+) -> dict[str, Any]:
+    headers = _storage_auth_headers()
+    size = os.path.getsize(file_bytes) if isinstance(file_bytes, Path) else len(file_bytes)
+    with span("storage.upload", bucket=bucket, path=path, bytes=size) as sp:
+        if isinstance(file_bytes, Path) and size >= settings.STORAGE_RESUMABLE_THRESHOLD:
+            sp.set_attribute("mode", "resumable")
+            return await upload_resumable_to_supabase_storage(bucket, path, file_bytes, content_type)
+        sp.set_attribute("mode", "single")
+        return await _put_to_supabase_storage(bucket, path, file_bytes, content_type, headers)
+
+
+async def _put_to_supabase_storage(
+    bucket: str, path: str, file_bytes: bytes | Path, content_type: str, headers: dict[str, str]
+) -> dict[str, Any]:
+    import aiohttp
+
+    url = f"{settings.SUPABASE_URL}/storage/v1/object/{bucket}/{path}"
+    headers["Content-Type"] = content_type
+    body: bytes | AsyncIterator[bytes]
+    if isinstance(file_bytes, Path):
+        # Stream from disk instead of loading the whole archive into memory
+        headers["Content-Length"] = str(os.path.getsize(file_bytes))
+        body = _iter_file_chunks(file_bytes)
+    else:
+        body = file_bytes
     async with aiohttp.ClientSession() as session:
-        async with session.put(url, data=file_bytes, headers=headers) as resp:
+        async with session.put(url, data=body, headers=headers) as resp:
             try:
                 data: dict[str, Any] = await resp.json()
                 return data
             except Exception:
                 text = await resp.text()
                 return {"status": resp.status, "text": text}
+
+
+# --- Resumable (TUS) Upload ---
+
+TUS_VERSION = "1.0.0"
+
+
+def _tus_metadata(**fields: str) -> str:
+    return ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in fields.items())
+
+
+async def _tus_current_offset(session: "aiohttp.ClientSession", location: str, headers: dict[str, str]) -> int:
+    """Запрашивает у сервера последний подтвержденный offset загрузки."""
+    async with session.head(location, headers=headers) as resp:
+        if resp.status != 200:
+            raise RuntimeError(f"TUS HEAD failed: HTTP {resp.status}")
+        return int(resp.headers["Upload-Offset"])
+
+
+async def upload_resumable_to_supabase_storage(
+    bucket: str,
+    path: str,
+    file_path: Path,
+    content_type: str = "application/octet-stream",
+    chunk_size: int | None = None,
+    retries: int = 5,
+    backoff: float = 1.0,
+) -> dict[str, Any]:
+    """Загружает файл в Supabase storage по протоколу TUS порциями с докачкой после сбоя."""
+    import aiofiles
+    import aiohttp
+
+    chunk_size = chunk_size or settings.STORAGE_CHUNK_SIZE
+    size = os.path.getsize(file_path)
+    endpoint = f"{settings.SUPABASE_URL}/storage/v1/upload/resumable"
+    headers = {**_storage_auth_headers(), "Tus-Resumable": TUS_VERSION}
+
+    async with aiohttp.ClientSession() as session:
+        create_headers = {
+            **headers,
+            "Upload-Length": str(size),
+            "Upload-Metadata": _tus_metadata(bucketName=bucket, objectName=path, contentType=content_type),
+            "x-upsert": "true",
+        }
+        async with session.post(endpoint, headers=create_headers) as resp:
+            if resp.status != 201:
+                raise RuntimeError(f"TUS create failed: HTTP {resp.status}: {await resp.text()}")
+            location = urljoin(endpoint + "/", resp.headers["Location"])
+
+        offset: int | None = 0
+        failures = 0
+        async with aiofiles.open(file_path, "rb") as fh:
+            while offset is None or offset < size:
+                try:
+                    if offset is None:
+                        offset = await _tus_current_offset(session, location, headers)
+                        continue
+                    await fh.seek(offset)
+                    chunk = await fh.read(chunk_size)
+                    if not chunk:
+                        # The file shrank after Upload-Length was declared: retrying would PATCH nothing forever
+                        raise OSError(f"{file_path} shrank during upload: end of file at {offset} of {size} bytes")
+                    patch_headers = {
+                        **headers,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                    }
+                    async with session.patch(location, data=chunk, headers=patch_headers) as resp:
+                        if resp.status not in (200, 204):
+                            raise RuntimeError(f"TUS PATCH failed: HTTP {resp.status}")
+                        offset = int(resp.headers["Upload-Offset"])
+                    failures = 0
+                except (aiohttp.ClientError, RuntimeError, TimeoutError) as exc:
+                    failures += 1
+                    if failures > retries:
+                        raise
+                    logger.warning(f"Resumable upload interrupted at offset {offset} ({failures}/{retries}): {exc}")
+                    await asyncio.sleep(backoff * failures)
+                    # Resume from whatever the server has acknowledged
+                    offset = None
+
+    return {"Key": f"{bucket}/{path}", "size": size, "location": location}
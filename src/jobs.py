@@ -0,0 +1,129 @@
+"""Очередь пакетов ELT в etl.jobs: постановка, захват через FOR UPDATE SKIP LOCKED, аренда и завершение."""
+
+import logging
+from dataclasses import dataclass
+
+from .db import acquire, execute, fetch
+from .querystats import rows_from_status
+
+logger = logging.getLogger(__name__)
+
+# Serializes enqueuers of one source so two of them never put the same raw id into two open jobs
+_ENQUEUE_LOCK_SQL = "SELECT pg_advisory_xact_lock(hashtext('etl.jobs:' || $1 || ':' || $2))"
+
+# Changed raw rows (the raw-vs-staging payload_hash anti-join of get_changed_raw_records), minus ids
+# already held by a pending/running job (the NOT EXISTS on etl.jobs), cut into jobs of $3 ids
+_ENQUEUE_SQL = """
+    WITH changed AS (
+        SELECT r.id, row_number() OVER (ORDER BY r.extracted_at, r.id) - 1 AS n
+        FROM raw.data r
+        LEFT JOIN staging.records s ON r.payload_hash = s.payload_hash
+        WHERE r.source = $1 AND s.payload_hash IS NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM etl.jobs j
+              WHERE j.status IN ('pending', 'running') AND j.source = $1 AND j.source_type = $2
+                AND j.raw_ids @> ARRAY[r.id]
+          )
+    )
+    INSERT INTO etl.jobs (source, source_type, raw_ids)
+    SELECT $1, $2, array_agg(id ORDER BY n) FROM changed GROUP BY n / $3 ORDER BY n / $3
+    RETURNING id
+"""
+
+# Oldest claimable job: pending, or running with an expired lease (its worker crashed or hung)
+_CLAIM_SQL = """
+    UPDATE etl.jobs SET
+        status = 'running',
+        leased_by = $1,
+        lease_expires_at = now() + make_interval(secs => $2),
+        attempts = attempts + 1,
+        started_at = now()
+    WHERE id = (
+        SELECT id FROM etl.jobs
+        WHERE (status = 'pending' OR (status = 'running' AND lease_expires_at < now()))
+          AND attempts < $3
+          AND ($4::text IS NULL OR source = $4)
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, source, source_type, raw_ids, attempts
+"""
+
+
+@dataclass(frozen=True)
+class Job:
+    """Пакет raw id одного источника, захваченный воркером."""
+
+    id: int
+    source: str
+    source_type: str
+    raw_ids: list[str]
+    attempts: int
+
+
+async def enqueue_changed(source: str, source_type: str, batch_size: int) -> int:
+    """Ставит в очередь измененные raw-записи источника пакетами по batch_size; возвращает число заданий."""
+    async with acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(_ENQUEUE_LOCK_SQL, source, source_type)
+            rows = await conn.fetch(_ENQUEUE_SQL, source, source_type, batch_size)
+    return len(rows)
+
+
+async def claim_job(worker_id: str, lease_seconds: float, max_attempts: int, source: str | None = None) -> Job | None:
+    """Захватывает одно задание; параллельные воркеры пропускают строки, заблокированные другими."""
+    rows = await fetch(_CLAIM_SQL, worker_id, float(lease_seconds), max_attempts, source)
+    if not rows:
+        return None
+    row = rows[0]
+    return Job(row["id"], row["source"], row["source_type"], list(row["raw_ids"]), row["attempts"])
+
+
+async def extend_lease(job: Job, worker_id: str, lease_seconds: float) -> bool:
+    """Продлевает аренду; False, если задание уже перехвачено другим воркером."""
+    status = await execute(
+        "UPDATE etl.jobs SET lease_expires_at = now() + make_interval(secs => $3) "
+        "WHERE id = $1 AND leased_by = $2 AND status = 'running'",
+        job.id,
+        worker_id,
+        float(lease_seconds),
+    )
+    return rows_from_status(status) == 1
+
+
+async def complete_job(job: Job, worker_id: str, upserted: int, rejected: int) -> bool:
+    """Отмечает задание выполненным; False, если аренду уже перехватил другой воркер."""
+    status = await execute(
+        "UPDATE etl.jobs SET status = 'done', finished_at = now(), lease_expires_at = NULL, "
+        "rows_upserted = $3, rows_rejected = $4, error = NULL "
+        "WHERE id = $1 AND leased_by = $2",
+        job.id,
+        worker_id,
+        upserted,
+        rejected,
+    )
+    return rows_from_status(status) == 1
+
+
+async def fail_job(job: Job, worker_id: str, error: BaseException, max_attempts: int) -> None:
+    """Возвращает задание в очередь или, после max_attempts попыток, помечает failed."""
+    await execute(
+        "UPDATE etl.jobs SET status = CASE WHEN attempts >= $4 THEN 'failed' ELSE 'pending' END, "
+        "lease_expires_at = NULL, error = $3 "
+        "WHERE id = $1 AND leased_by = $2",
+        job.id,
+        worker_id,
+        f"{type(error).__name__}: {error}"[:2000],
+        max_attempts,
+    )
+
+
+async def fail_expired(max_attempts: int) -> int:
+    """Помечает failed задания с истекшей арендой, у которых кончились попытки."""
+    status = await execute(
+        "UPDATE etl.jobs SET status = 'failed', error = 'lease expired', lease_expires_at = NULL "
+        "WHERE status = 'running' AND lease_expires_at < now() AND attempts >= $1",
+        max_attempts,
+    )
+    return rows_from_status(status)
@@ -5,6 +5,18 @@ from .db import execute, fetch
 
 logger = logging.getLogger(__name__)
 
+# Read API (src/read_api.py) drops its cached aggregates on every notification of this channel
+CHANGED_CHANNEL = "marts_changed"
+
+
+async def notify_marts_changed(source_type: str) -> None:
+    """Сообщает читателям витрин, что staging.records изменилась (сбой уведомления не роняет ELT)."""
+    try:
+        await execute("SELECT pg_notify($1, $2)", CHANGED_CHANNEL, source_type)
+    except Exception as e:
+        # Readers still expire cached aggregates after READ_API_CACHE_TTL
+        logger.warning(f"⚠️ Не удалось отправить {CHANGED_CHANNEL}: {e}")
+
 
 async def build_campaigns_summary() -> None:
     rows = await fetch("SELECT payload FROM staging.records")
@@ -0,0 +1,234 @@
+"""Метрики ELT (счетчики и гистограммы) с экспортом в формате OpenMetrics."""
+
+import logging
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers sub-second DB batches up to multi-minute stages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счетчик с метками."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}_total{_format_labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class Gauge(_Metric):
+    """Мгновенное значение с метками (например, строк в секунду)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+    def reset(self) -> None:
+        self._values.clear()
+
+
+class Histogram(_Metric):
+    """Гистограмма с кумулятивными бакетами, суммой и количеством."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[LabelKey, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * len(self.buckets), [0.0, 0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(_label_key(labels))
+        return int(series[1][1]) if series else 0
+
+    def sum(self, **labels: str) -> float:
+        series = self._series.get(_label_key(labels))
+        return series[1][0] if series else 0.0
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, totals) in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, counts, strict=True):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_value(bound)),))} {count}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {int(totals[1])}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(totals[0])}")
+        return lines
+
+    def reset(self) -> None:
+        self._series.clear()
+
+
+class Registry:
+    """Набор метрик процесса и их сериализация в OpenMetrics."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))  # type: ignore[return-value]
+
+    def histogram(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))  # type: ignore[return-value]
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self) -> str:
+        """Возвращает все метрики в текстовом формате OpenMetrics."""
+        lines = []
+        for metric in self._metrics.values():
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.extend(samples)
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ROWS_READ = REGISTRY.counter("etl_rows_read", "Raw rows read for processing")
+ROWS_NORMALIZED = REGISTRY.counter("etl_rows_normalized", "Rows successfully normalized")
+ROWS_FAILED = REGISTRY.counter("etl_rows_failed", "Rows that failed normalization or upsert")
+ROWS_UPSERTED = REGISTRY.counter("etl_rows_upserted", "Rows upserted into staging.records")
+ROWS_LOADED = REGISTRY.counter("etl_rows_loaded", "Rows loaded into raw.data")
+STAGE_DURATION = REGISTRY.histogram("etl_stage_duration_seconds", "Duration of ELT stages")
+BATCH_LATENCY = REGISTRY.histogram("etl_batch_latency_seconds", "Latency of a single upsert batch")
+ROWS_PER_SECOND = REGISTRY.gauge("etl_rows_per_second", "Throughput of the last run per stage")
+RAW_TO_STAGING_LAG = REGISTRY.histogram(
+    "etl_raw_to_staging_lag_seconds", "Delay from raw.data insert to staging upsert in serve mode"
+)
+RUN_TIMESTAMP = REGISTRY.gauge("etl_last_run_timestamp_seconds", "Unix time when the last run finished")
+
+
+def write_textfile(path: str | Path, registry: Registry = REGISTRY) -> Path:
+    """Атомарно пишет метрики в textfile (для node_exporter textfile collector)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(registry.render(), encoding="utf-8")
+    tmp_path.replace(path)
+    return path
+
+
+async def push_to_gateway(url: str, job: str, registry: Registry = REGISTRY) -> None:
+    """Отправляет метрики в Pushgateway (PUT /metrics/job/<job>)."""
+    import aiohttp
+
+    target = f"{url.rstrip('/')}/metrics/job/{job}"
+    headers = {"Content-Type": "application/openmetrics-text; version=1.0.0; charset=utf-8"}
+    async with aiohttp.ClientSession() as session:
+        async with session.put(target, data=registry.render().encode("utf-8"), headers=headers) as resp:
+            if resp.status >= 400:
+                raise RuntimeError(f"Pushgateway HTTP {resp.status}: {await resp.text()}")
+
+
+async def export_metrics(job: str, textfile: str | None, pushgateway_url: str | None) -> None:
+    """Экспортирует метрики запуска в textfile и/или Pushgateway; ошибки только логируются."""
+    RUN_TIMESTAMP.set(time.time(), job=job)
+    if textfile:
+        try:
+            written = write_textfile(textfile)
+            logger.info(f"📈 Метрики записаны: {written}")
+        except OSError as exc:
+            logger.warning(f"⚠️ Не удалось записать метрики: {exc}")
+    if pushgateway_url:
+        try:
+            await push_to_gateway(pushgateway_url, job)
+            logger.info(f"📈 Метрики отправлены в Pushgateway: {pushgateway_url}")
+        except Exception as exc:
+            logger.warning(f"⚠️ Не удалось отправить метрики в Pushgateway: {exc}")
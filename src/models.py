@@ -1,8 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Any, Optional
+from typing import Any, NamedTuple, Optional
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, field_validator
 
 
 class StagingRecord(BaseModel):
@@ -52,7 +52,7 @@ class StagingRecord(BaseModel):
     total_in_currency: Optional[Decimal] = None
     rub_summa: Optional[Decimal] = None
     usd_summa: Optional[Decimal] = None
-    payload_hash: str
+    payload_hash: bytes
     raw_payload: dict[str, Any]
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
@@ -64,3 +64,203 @@ class StagingRecord(BaseModel):
         if v == "":
             return None
         return v
+
+
+# --- Loader row ---
+
+class StagingRow(NamedTuple):
+    """Нормализованная запись кортежем в порядке колонок staging.records; типы полей — как в StagingRecord."""
+
+    # executemany binds it as-is, no per-row dict/copy
+    raw_id: str | int
+    sheet_row_number: int | None
+    received_at: datetime
+    source_type: str
+    date: datetime | None
+    payment_date: datetime | None
+    task: str | None
+    type: str | None
+    year: int | None
+    hours: Decimal | None
+    month: int | None
+    client: str | None
+    fx_rub: Decimal | None
+    fx_usd: Decimal | None
+    vendor: str | None
+    cashier: str | None
+    cat_new: str | None
+    quarter: int | None
+    service: str | None
+    approver: str | None
+    category: str | None
+    currency: str | None
+    cat_final: str | None
+    total_rub: Decimal | None
+    total_usd: Decimal | None
+    subcat_new: str | None
+    paket: str | None
+    description: str | None
+    subcategory: str | None
+    payment_date_orig: datetime | None
+    subcat_final: str | None
+    count_vendor: int | None
+    statya: str | None
+    sum_total_rub: Decimal | None
+    usd_summa: Decimal | None
+    direct_indirect: str | None
+    package_secondary: str | None
+    total_in_currency: Decimal | None
+    rub_summa: Decimal | None
+    kategoriya: str | None
+    podstatya: str | None
+    vidy_raskhodov: str | None
+    payload_hash: bytes
+    raw_payload: dict[str, Any]
+    created_at: datetime | None
+    updated_at: datetime | None
+    updated_by: str | None
+
+
+# Column order of staging.records used by the loader
+STAGING_FIELDS = list(StagingRow._fields)
+
+
+# --- Validation modes ---
+
+STAGING_VALIDATION_MODES = ("strict", "fast")
+
+# Filled by the typed normalizer helpers (_to_timestamptz/_to_decimal/_to_int), so already the declared type
+NORMALIZED_TYPED_FIELDS = frozenset(
+    {
+        "date",
+        "payment_date",
+        "payment_date_orig",
+        "created_at",
+        "updated_at",
+        "year",
+        "month",
+        "quarter",
+        "count_vendor",
+        "hours",
+        "fx_rub",
+        "fx_usd",
+        "total_rub",
+        "total_usd",
+        "sum_total_rub",
+        "total_in_currency",
+        "rub_summa",
+        "usd_summa",
+    }
+)
+STAGING_FIELD_DEFAULTS = {
+    name: None if field.is_required() else field.get_default() for name, field in StagingRecord.model_fields.items()
+}
+# Free-form strings from the payload plus caller-supplied identity fields keep full validation.
+# raw_payload is excluded too: a decoded JSON object is already dict[str, Any], only non-dicts are validated.
+CHECKED_FIELDS = tuple(
+    name for name in StagingRecord.model_fields if name not in NORMALIZED_TYPED_FIELDS and name != "raw_payload"
+)
+# Types of CHECKED_FIELDS in order, spelled out so the adapters are typed (test_validation keeps them in sync)
+_CheckedRow = tuple[
+    str | int,  # raw_id
+    int | None,  # sheet_row_number
+    datetime,  # received_at
+    str,  # source_type
+    # task ... package_secondary: free-form strings from the payload
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    str | None,
+    bytes,  # payload_hash
+    str | None,  # updated_by
+]
+_ROW_ADAPTER: TypeAdapter[_CheckedRow] = TypeAdapter(_CheckedRow)
+_BATCH_ADAPTER: TypeAdapter[list[_CheckedRow]] = TypeAdapter(list[_CheckedRow])
+_PAYLOAD_ADAPTER: TypeAdapter[dict[str, Any]] = TypeAdapter(dict[str, Any])
+
+
+def _checked_values(data: dict[str, Any]) -> tuple[Any, ...]:
+    return tuple(data.get(name, STAGING_FIELD_DEFAULTS[name]) for name in CHECKED_FIELDS)
+
+
+def _merge(data: dict[str, Any], checked: tuple[Any, ...]) -> dict[str, Any]:
+    # Defaults first keeps model field order; keys the model doesn't declare are dropped like model_dump does
+    result = {**STAGING_FIELD_DEFAULTS, **data}
+    if len(result) != len(STAGING_FIELD_DEFAULTS):
+        result = {name: result[name] for name in STAGING_FIELD_DEFAULTS}
+    result.update(zip(CHECKED_FIELDS, checked, strict=True))
+    payload = result["raw_payload"]
+    if type(payload) is not dict:
+        result["raw_payload"] = _PAYLOAD_ADAPTER.validate_python(payload)
+    return result
+
+
+# Where each loader column comes from in fast mode: index into the validated tuple, or -1 for data
+_ROW_SOURCES = tuple((name, CHECKED_FIELDS.index(name) if name in CHECKED_FIELDS else -1) for name in STAGING_FIELDS)
+
+
+def _build_row(data: dict[str, Any], checked: tuple[Any, ...]) -> StagingRow:
+    row = StagingRow._make(
+        checked[i] if i >= 0 else data.get(name, STAGING_FIELD_DEFAULTS[name]) for name, i in _ROW_SOURCES
+    )
+    if type(row.raw_payload) is not dict:
+        row = row._replace(raw_payload=_PAYLOAD_ADAPTER.validate_python(row.raw_payload))
+    return row
+
+
+def validate_staging_record(data: dict[str, Any], mode: str = "strict") -> dict[str, Any]:
+    """Валидирует запись: strict — через StagingRecord, fast — только непроверенные поля через TypeAdapter."""
+    if mode == "strict":
+        return StagingRecord(**data).model_dump()
+    if mode != "fast":
+        raise ValueError(f"Unknown validation mode: {mode}")
+    return _merge(data, _ROW_ADAPTER.validate_python(_checked_values(data)))
+
+
+def validate_staging_batch(
+    records: list[dict[str, Any]], mode: str = "strict", as_rows: bool = False
+) -> tuple[list[Any], list[tuple[int, Exception]]]:
+    """Валидирует пачку записей; возвращает валидные записи (dict или StagingRow) и (индекс, ошибка) для отклоненных."""
+    if mode not in STAGING_VALIDATION_MODES:
+        raise ValueError(f"Unknown validation mode: {mode}")
+    rows: list[tuple[Any, ...]] = []
+    checked: list[tuple[Any, ...]] | None = None
+    if mode == "fast":
+        rows = [_checked_values(data) for data in records]
+        try:
+            checked = _BATCH_ADAPTER.validate_python(rows)
+        except ValidationError:
+            # The list error doesn't return the valid items, so bad batches are re-validated row by row
+            checked = None
+
+    valid: list[Any] = []
+    failed: list[tuple[int, Exception]] = []
+    for i, data in enumerate(records):
+        try:
+            if mode == "strict":
+                result = StagingRecord(**data).model_dump()
+                valid.append(StagingRow._make(result[name] for name in STAGING_FIELDS) if as_rows else result)
+            else:
+                values = checked[i] if checked is not None else _ROW_ADAPTER.validate_python(rows[i])
+                valid.append(_build_row(data, values) if as_rows else _merge(data, values))
+        except ValidationError as exc:
+            failed.append((i, exc))
+    return valid, failed
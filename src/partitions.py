@@ -0,0 +1,90 @@
+"""Партиции raw.data (источник/месяц) и staging.records (source_type/год), онлайн-перенос raw.data_legacy."""
+
+import asyncio
+import datetime
+import logging
+from collections.abc import Callable
+
+import asyncpg
+
+from .db import acquire, fetch
+
+logger = logging.getLogger(__name__)
+
+# (source, "YYYYMM") already ensured by this process; raw.ensure_data_partitions also creates next month,
+# so a load that crosses midnight of the 1st still finds its partition
+_ensured: set[tuple[str, str]] = set()
+
+
+async def ensure_raw_partitions(conn: asyncpg.Connection, source: str) -> None:
+    """Создает партицию источника и партиции текущего/следующего месяца (один раз на процесс и месяц)."""
+    key = (source, datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m"))
+    if key in _ensured:
+        return
+    await conn.execute("SELECT raw.ensure_data_partitions($1)", source)
+    _ensured.add(key)
+
+
+# (source_type, year) whose staging.records partition exists; rows of other years still land in the
+# source_type's default partition, this only keeps new years from piling up there
+_ensured_staging: set[tuple[str, int]] = set()
+
+
+async def ensure_staging_partitions(conn: asyncpg.Connection, keys: set[tuple[str, int]]) -> None:
+    """Создает недостающие партиции staging.records для пар (source_type, год) перед upsert."""
+    for source_type, year in sorted(keys - _ensured_staging):
+        try:
+            await conn.execute("SELECT staging.ensure_records_partitions($1, $2)", source_type, year)
+        except asyncpg.PostgresError as e:
+            # Not fatal: the rows go to the default partition and the next batch tries again
+            logger.warning(f"⚠️ Не удалось создать партицию staging.records {source_type}/{year}: {e}")
+            continue
+        _ensured_staging.add((source_type, year))
+
+
+async def legacy_raw_rows() -> int | None:
+    """Оценка числа строк, еще не перенесенных из raw.data_legacy; None, если таблицы уже нет."""
+    rows = await fetch(
+        "SELECT c.reltuples::bigint AS estimate FROM pg_class c WHERE c.oid = to_regclass('raw.data_legacy')"
+    )
+    return max(int(rows[0]["estimate"]), 0) if rows else None
+
+
+async def move_legacy_raw(
+    batch_size: int,
+    pause: float = 0.0,
+    drop_legacy: bool = False,
+    on_batch: Callable[[int, int], None] | None = None,
+) -> int:
+    """Переносит raw.data_legacy в партиционированный raw.data пачками по batch_size, каждая в своей транзакции."""
+    async with acquire() as conn:
+        if await conn.fetchval("SELECT to_regclass('raw.data_legacy')") is None:
+            return 0
+        # NULL extracted_at lands in the current month, which may be newer than the migration
+        await conn.execute(
+            "SELECT raw.ensure_data_partitions(source) FROM (SELECT DISTINCT source FROM raw.data_legacy) t"
+        )
+
+    total = 0
+    while True:
+        # Short transactions keep row locks brief, so loaders and readers keep running meanwhile
+        async with acquire() as conn:
+            moved = await conn.fetchval("SELECT raw.move_legacy_data($1)", batch_size)
+        if not moved:
+            break
+        total += moved
+        if on_batch is not None:
+            on_batch(moved, total)
+        if pause:
+            await asyncio.sleep(pause)
+
+    if drop_legacy:
+        async with acquire() as conn:
+            async with conn.transaction():
+                # Rows locked by a concurrent mover are skipped above; only drop a table that is really empty
+                if await conn.fetchval("SELECT NOT EXISTS (SELECT 1 FROM raw.data_legacy)"):
+                    await conn.execute("DROP TABLE raw.data_legacy")
+                    logger.info("🗑️ raw.data_legacy удалена")
+                else:
+                    logger.warning("⚠️ raw.data_legacy не пуста (параллельный перенос?), таблица не удалена")
+    return total
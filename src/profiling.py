@@ -0,0 +1,131 @@
+"""Профилирование CLI-команд: cProfile, семплирующий профилировщик и tracemalloc по этапам ELT."""
+
+import cProfile
+import datetime
+import io
+import logging
+import pstats
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cpu", "sampling", "memory")
+MEMORY_TOP_SITES = 10
+# tracemalloc frames kept per allocation; deeper stacks cost more memory
+MEMORY_TRACE_FRAMES = 10
+# Spans that only group the stages of one source; their children are reported as stages instead
+STAGE_CONTAINERS = frozenset({"elt.source"})
+
+
+def _profile_path(out_dir: Path, command: str, suffix: str) -> Path:
+    stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return out_dir / f"{command}_{stamp}.{suffix}"
+
+
+@contextmanager
+def _cpu_profile(path: Path) -> Iterator[None]:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(15)
+        logger.info(f"🔬 CPU-профиль сохранен: {path} (snakeviz/pstats)\n{buf.getvalue()}")
+
+
+@contextmanager
+def _sampling_profile(path: Path) -> Iterator[None]:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    profiler = Profiler(async_mode="enabled")
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        path.write_text(profiler.output(renderer=SpeedscopeRenderer()), encoding="utf-8")
+        logger.info(f"🔬 Семплирующий профиль сохранен: {path} (https://www.speedscope.app)")
+
+
+class MemoryStageProfiler:
+    """
+    Снимает tracemalloc-снимки на границах этапов и копит топ мест аллокаций.
+
+    Этап — спан первого уровня под корнем команды или дочерний спан контейнера из containers.
+    """
+
+    def __init__(self, top: int = MEMORY_TOP_SITES, containers: frozenset[str] = STAGE_CONTAINERS):
+        self.top = top
+        self.containers = containers
+        self._starts: dict[str, tracemalloc.Snapshot] = {}
+        self._container_ids: set[str] = set()
+        self.reports: list[str] = []
+
+    def on_start(self, span: tracing.Span) -> None:
+        if span.name in self.containers:
+            self._container_ids.add(span.span_id)
+        elif span.depth == 1 or span.parent_id in self._container_ids:
+            self._starts[span.span_id] = tracemalloc.take_snapshot()
+
+    def on_end(self, span: tracing.Span) -> None:
+        self._container_ids.discard(span.span_id)
+        start = self._starts.pop(span.span_id, None)
+        if start is None:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        stats = tracemalloc.take_snapshot().compare_to(start, "lineno")
+        lines = [f"== {span.name} ({span.duration:.2f}s, текущая {current / 2**20:.1f} МБ, пик {peak / 2**20:.1f} МБ)"]
+        for stat in stats[: self.top]:
+            lines.append(f"  {stat}")
+        self.reports.append("\n".join(lines))
+
+    @contextmanager
+    def active(self, path: Path) -> Iterator[None]:
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+        tracing.add_span_listener(self.on_start, self.on_end)
+        try:
+            yield
+        finally:
+            tracing.remove_span_listener(self.on_start, self.on_end)
+            tracemalloc.stop()
+            report = "\n\n".join(self.reports) or "Этапы не зафиксированы"
+            path.write_text(report + "\n", encoding="utf-8")
+            logger.info(f"🔬 Профиль памяти по этапам сохранен: {path}\n{report}")
+
+
+@contextmanager
+def profile_command(mode: str | None, command: str, archive_path: str | Path) -> Iterator[None]:
+    """Запускает команду под выбранным профилировщиком и пишет результат в ARCHIVE_PATH/profiles."""
+    if not mode:
+        yield
+        return
+
+    out_dir = Path(archive_path) / "profiles"
+    if mode == "sampling":
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️ pyinstrument не установлен (pip install pyinstrument), используется cProfile")
+            mode = "cpu"
+
+    if mode == "cpu":
+        with _cpu_profile(_profile_path(out_dir, command, "prof")):
+            yield
+    elif mode == "sampling":
+        with _sampling_profile(_profile_path(out_dir, command, "speedscope.json")):
+            yield
+    elif mode == "memory":
+        with MemoryStageProfiler().active(_profile_path(out_dir, command, "memory.txt")):
+            yield
+    else:
+        raise ValueError(f"Unknown profile mode: {mode}")
@@ -0,0 +1,107 @@
+"""Push-прием изменений строк из Apps Script: POST /v1/rows с Bearer-токеном, пакетная запись в raw.data."""
+
+import hmac
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiohttp import web
+
+from .utils import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+# Apps Script UrlFetch bodies are small; this caps a single request well above a realistic edit burst
+MAX_BODY_BYTES = 10 * 2**20
+
+# Returns the ids it could not write (their pk is owned by another source)
+LoadRows = Callable[[str, list[dict[str, Any]]], Awaitable[list[str]]]
+RowsLoaded = Callable[[str, list[str]], Any]
+
+
+class PayloadError(ValueError):
+    """Тело запроса не соответствует формату {source, headers?, rows: [{pk, values}]}."""
+
+
+def _cell(value: Any) -> str:
+    # The pull path stores formatted strings; the same shape keeps payload hashes identical for unchanged rows
+    return "" if value is None else str(value)
+
+
+def _parse_values(values: Any, headers: list[str] | None, i: int) -> dict[str, str]:
+    if isinstance(values, list):
+        # Compact form: values aligned with the shared headers, short rows padded like the Sheets API pull
+        if headers is None:
+            raise PayloadError(f"rows[{i}].values is a list but headers are missing")
+        if len(values) > len(headers):
+            raise PayloadError(f"rows[{i}] has more values than headers")
+        return {h: _cell(v) for h, v in zip(headers, values + [""] * (len(headers) - len(values)), strict=True)}
+    if isinstance(values, dict):
+        return {str(k): _cell(v) for k, v in values.items()}
+    raise PayloadError(f"rows[{i}].values must be an object or a list")
+
+
+def parse_rows(body: Any, allowed_sources: set[str], max_rows: int) -> tuple[str, list[dict[str, Any]]]:
+    """Проверяет тело запроса и возвращает (source, строки для load_raw)."""
+    if not isinstance(body, dict):
+        raise PayloadError("body must be a JSON object")
+    source = body.get("source")
+    if source not in allowed_sources:
+        raise PayloadError(f"unknown source {source!r}")
+    rows = body.get("rows")
+    if not isinstance(rows, list) or not rows:
+        raise PayloadError("rows must be a non-empty list")
+    if len(rows) > max_rows:
+        raise PayloadError(f"too many rows: {len(rows)} > {max_rows}")
+    headers = body.get("headers")
+    if headers is not None and (not isinstance(headers, list) or not all(isinstance(h, str) for h in headers)):
+        raise PayloadError("headers must be a list of strings")
+
+    records = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise PayloadError(f"rows[{i}] must be an object")
+        pk = _cell(row.get("pk")).strip()
+        if not pk:
+            raise PayloadError(f"rows[{i}].pk is empty")
+        payload = _parse_values(row.get("values"), headers, i)
+        records.append({"id": pk, "payload": payload})
+
+    # The last edit of a row within one request wins
+    return source, list({r["id"]: r for r in records}.values())
+
+
+def create_app(
+    token: str,
+    allowed_sources: set[str],
+    load_rows: LoadRows,
+    on_loaded: RowsLoaded | None = None,
+    max_rows: int = 5000,
+) -> web.Application:
+    """Собирает aiohttp-приложение; load_rows пишет в raw.data, on_loaded запускает нормализацию."""
+    expected = f"Bearer {token}".encode()
+
+    async def post_rows(request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        try:
+            source, records = parse_rows(await request.json(loads=json_loads), allowed_sources, max_rows)
+        except ValueError as e:  # PayloadError or malformed JSON
+            return web.json_response({"error": str(e)}, status=400)
+
+        rejected = set(await load_rows(source, records))
+        ids = [r["id"] for r in records if r["id"] not in rejected]
+        if rejected:
+            # Retrying will not help: the pk is taken until the other source's row is removed
+            logger.warning(f"⚠️ Отклонено строк: {len(rejected)} (source={source}), pk занят другим источником")
+        if on_loaded is not None and ids:
+            on_loaded(source, ids)
+        logger.info(f"📨 Принято строк: {len(ids)} (source={source})")
+        return web.json_response({"accepted": len(ids), "rejected": sorted(rejected)}, dumps=json_dumps)
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    app = web.Application(client_max_size=MAX_BODY_BYTES)
+    app.add_routes([web.post("/v1/rows", post_rows), web.get("/healthz", healthz)])
+    return app
@@ -0,0 +1,168 @@
+"""Инструментация запросов asyncpg: латентность по отпечатку запроса, строки, slow-query log."""
+
+import hashlib
+import logging
+import re
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from .config import settings
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_DURATION = REGISTRY.histogram(
+    "etl_db_statement_duration_seconds",
+    "Latency of DB statements by normalized fingerprint",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+# Keeps label values readable in dashboards without exploding series length
+FINGERPRINT_LABEL_CHARS = 120
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*(?:\?|\$\d+)\s*,?)+\)", re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(query: str) -> str:
+    """Нормализует SQL: убирает литералы, комментарии и лишние пробелы."""
+    text = _COMMENT_RE.sub(" ", query)
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (...)", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def fingerprint_id(fp: str) -> str:
+    return hashlib.md5(fp.encode("utf-8")).hexdigest()[:12]
+
+
+def _value_shape(value: Any) -> str:
+    name = type(value).__name__
+    if isinstance(value, (str, bytes, list, tuple, dict)):
+        return f"{name}[{len(value)}]"
+    return name
+
+
+def params_shape(args: Any, many: bool = False) -> str:
+    """Описывает форму параметров (типы и длины) без самих значений."""
+    if not args:
+        return "()"
+    if many:
+        rows = args if isinstance(args, Sequence) else list(args)
+        first = rows[0] if rows else ()
+        return f"{len(rows)}x({', '.join(_value_shape(v) for v in first)})"
+    return "(" + ", ".join(_value_shape(v) for v in args) + ")"
+
+
+@dataclass
+class StatementStats:
+    """Накопленная статистика одного отпечатка запроса."""
+
+    fingerprint: str
+    calls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    errors: int = 0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class QueryStats:
+    """Собирает статистику запросов со всех соединений (callback для Connection.add_query_logger)."""
+
+    def __init__(self, slow_threshold_ms: float | None = None):
+        self.slow_threshold_ms = slow_threshold_ms
+        self._stats: dict[str, StatementStats] = {}
+        self._fingerprints: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, query: str) -> str:
+        fp = self._fingerprints.get(query)
+        if fp is None:
+            fp = fingerprint(query)
+            # Queries are mostly repeated verbatim, so cache the regex work per text
+            if len(self._fingerprints) < 10_000:
+                self._fingerprints[query] = fp
+        return fp
+
+    def record(self, query: str, elapsed: float, args: Any = None, error: BaseException | None = None) -> None:
+        fp = self._fingerprint(query)
+        # executemany passes a list of row tuples; execute/fetch pass the flat argument tuple
+        many = isinstance(args, list)
+        with self._lock:
+            stats = self._stats.get(fp)
+            if stats is None:
+                stats = self._stats[fp] = StatementStats(fp)
+            stats.calls += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, elapsed)
+            if many:
+                stats.rows += len(args)
+            if error is not None:
+                stats.errors += 1
+        STATEMENT_DURATION.observe(elapsed, statement=fp[:FINGERPRINT_LABEL_CHARS])
+
+        threshold = self.slow_threshold_ms
+        if threshold is not None and elapsed * 1000 >= threshold:
+            logger.warning(
+                f"🐢 Медленный запрос {elapsed * 1000:.0f} мс [{fingerprint_id(fp)}] "
+                f"params={params_shape(args, many)}: {fp[:300]}"
+            )
+
+    def on_query(self, record: Any) -> None:
+        """Callback asyncpg LoggedQuery."""
+        self.record(record.query, record.elapsed, record.args, record.exception)
+
+    def add_rows(self, query: str, rows: int) -> None:
+        """Добавляет число строк, известное только после выполнения (fetch/execute)."""
+        fp = self._fingerprint(query)
+        with self._lock:
+            # asyncpg runs query loggers via loop.call_soon, so this may arrive before record() for the call
+            stats = self._stats.get(fp)
+            if stats is None:
+                stats = self._stats[fp] = StatementStats(fp)
+            stats.rows += rows
+
+    def top(self, limit: int = 10) -> list[StatementStats]:
+        return sorted(self._stats.values(), key=lambda s: s.total, reverse=True)[:limit]
+
+    def report(self, limit: int = 10) -> str:
+        """Текстовый отчет: топ запросов по суммарному времени."""
+        lines = [f"{'total,s':>9} {'calls':>7} {'mean,ms':>9} {'max,ms':>9} {'rows':>9} {'err':>4}  statement"]
+        for s in self.top(limit):
+            lines.append(
+                f"{s.total:>9.3f} {s.calls:>7} {s.mean * 1000:>9.1f} {s.max * 1000:>9.1f} {s.rows:>9} "
+                f"{s.errors:>4}  [{fingerprint_id(s.fingerprint)}] {s.fingerprint[:100]}"
+            )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def __bool__(self) -> bool:
+        return bool(self._stats)
+
+
+QUERY_STATS = QueryStats(settings.SLOW_QUERY_MS)
+
+
+def instrument_connection(conn: Any, stats: QueryStats = QUERY_STATS) -> None:
+    """Подключает сбор статистики к соединению asyncpg (логгеры переживают возврат в пул)."""
+    conn.add_query_logger(stats.on_query)
+
+
+def rows_from_status(status: str) -> int:
+    """Извлекает число строк из статуса команды ('INSERT 0 5' -> 5)."""
+    parts = status.split() if isinstance(status, str) else []
+    if parts and parts[-1].isdigit():
+        return int(parts[-1])
+    return 0
@@ -0,0 +1,264 @@
+"""Read API витрин: транзакции с keyset-пагинацией по (date, raw_id), агрегаты из TTL/LRU-кэша, ETag и gzip."""
+
+import asyncio
+import base64
+import datetime
+import gzip
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+from aiohttp import web
+
+from .daemon import listen
+from .marts import CHANGED_CHANNEL
+from .utils import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+# Smaller bodies fit in a packet anyway; gzip framing would only add bytes and CPU
+GZIP_MIN_BYTES = 1024
+
+# URL name -> view; anything else is a 404, so the name never reaches SQL unchecked
+AGGREGATES = {
+    "financials": "marts.financials_v",
+    "expenses_by_category": "marts.expenses_by_category_v",
+    "clients": "marts.dim_clients_v",
+    "categories": "marts.dim_categories_v",
+    "vendors": "marts.dim_vendors_v",
+}
+
+# Same columns as marts.web_transactions_v, read from the table so the keyset predicate and
+# ORDER BY ... LIMIT walk idx_staging_date_raw_id (undated rows: idx_staging_undated_raw_id)
+# instead of sorting the whole view
+TRANSACTION_COLUMNS = (
+    "raw_id, date, payment_date, type, client, vendor, category, total_rub, currency, description, source_type"
+)
+
+FetchRows = Callable[..., Awaitable[list[Any]]]
+
+
+class CursorError(ValueError):
+    """Курсор пагинации поврежден или выдан не этим API."""
+
+
+class TTLCache:
+    """LRU-кэш на maxsize ключей, запись живет ttl секунд; clear() сбрасывает все при изменении витрин."""
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        # Bumped by clear(); a value computed before an invalidation must not be stored after it
+        self.generation = 0
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any | None:
+        item = self._data.get(key)
+        if item is None or item[0] <= self.clock():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (self.clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.generation += 1
+
+
+@dataclass(frozen=True)
+class Body:
+    """Готовый ответ: JSON, его gzip-версия (если есть смысл сжимать) и ETag."""
+
+    data: bytes
+    gzipped: bytes | None
+    etag: str
+
+
+def encode_body(value: Any) -> Body:
+    """Сериализует ответ один раз; кэш хранит результат вместе со сжатой версией."""
+    data = json_dumps(value).encode("utf-8")
+    gzipped = gzip.compress(data, compresslevel=6) if len(data) >= GZIP_MIN_BYTES else None
+    return Body(data, gzipped, f'"{hashlib.blake2b(data, digest_size=16).hexdigest()}"')
+
+
+def encode_cursor(date: datetime.datetime | None, raw_id: str) -> str:
+    """Непрозрачный курсор: позиция последней отданной строки; date=None — уже идут строки без даты."""
+    data = json_dumps([date.isoformat() if date is not None else None, raw_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime | None, str]:
+    try:
+        date, raw_id = json_loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw_id, str):
+            raise TypeError("raw_id must be a string")
+        return (datetime.datetime.fromisoformat(date) if date is not None else None), raw_id
+    except (ValueError, TypeError) as e:  # binascii.Error and JSON decode errors are ValueErrors
+        raise CursorError(f"invalid cursor: {e}") from None
+
+
+def transactions_query(source_type: bool, cursor: bool, dated: bool = True) -> str:
+    """
+    SQL страницы транзакций.
+
+    dated=True: строки с датой по (date DESC, raw_id DESC), параметры [$source_type] [$date, $raw_id] $limit.
+    dated=False: строки без даты по raw_id DESC, параметры [$source_type] [$raw_id] $limit.
+    """
+    where = ["date IS NOT NULL" if dated else "date IS NULL"]
+    n = 0
+    if source_type:
+        n += 1
+        where.append(f"source_type = ${n}")
+    if cursor and dated:
+        where.append(f"(date, raw_id) < (${n + 1}, ${n + 2})")
+        n += 2
+    elif cursor:
+        n += 1
+        where.append(f"raw_id < ${n}")
+    order = "date DESC, raw_id DESC" if dated else "raw_id DESC"
+    return (
+        f"SELECT {TRANSACTION_COLUMNS} FROM staging.records WHERE {' AND '.join(where)} "
+        f"ORDER BY {order} LIMIT ${n + 1}"
+    )
+
+
+async def _fetch_transactions(
+    fetch_rows: FetchRows, source_type: str | None, cursor: tuple[datetime.datetime | None, str] | None, count: int
+) -> list[dict]:
+    """До count строк после cursor: сначала с датой, затем (NULLS LAST) без даты."""
+    base: list[Any] = [source_type] if source_type else []
+    rows: list[dict] = []
+    if cursor is None or cursor[0] is not None:
+        sql = transactions_query(bool(source_type), cursor is not None)
+        args = base + list(cursor) if cursor is not None else base
+        rows = [dict(r) for r in await fetch_rows(sql, *args, count)]
+    if len(rows) < count:
+        # Dated rows are exhausted: undated ones follow, paged by raw_id alone
+        after = cursor[1] if cursor is not None and cursor[0] is None else None
+        sql = transactions_query(bool(source_type), after is not None, dated=False)
+        args = base + [after] if after is not None else base
+        rows += [dict(r) for r in await fetch_rows(sql, *args, count - len(rows))]
+    return rows
+
+
+def _accepts_gzip(request: web.Request) -> bool:
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, *params = item.split(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        return q > 0
+    return False
+
+
+def _etag_matches(request: web.Request, etag: str) -> bool:
+    # The gzip representation carries its own strong tag; either one revalidates the same content
+    for tag in request.headers.get("If-None-Match", "").split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*" or tag == etag or tag == etag[:-1] + '-gzip"':
+            return True
+    return False
+
+
+def _respond(request: web.Request, body: Body) -> web.Response:
+    use_gzip = body.gzipped is not None and _accepts_gzip(request)
+    etag = body.etag[:-1] + '-gzip"' if use_gzip else body.etag
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if _etag_matches(request, body.etag):
+        return web.Response(status=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return web.Response(body=body.gzipped, content_type="application/json", headers=headers)
+    return web.Response(body=body.data, content_type="application/json", headers=headers)
+
+
+def create_app(
+    fetch_rows: FetchRows,
+    cache: TTLCache,
+    page_size: int = 100,
+    max_page_size: int = 1000,
+) -> web.Application:
+    """Собирает aiohttp-приложение; fetch_rows(sql, *args) читает из БД, cache хранит агрегаты."""
+
+    async def transactions(request: web.Request) -> web.Response:
+        try:
+            limit = int(request.query.get("limit", page_size))
+            if not 1 <= limit <= max_page_size:
+                raise ValueError(f"limit must be between 1 and {max_page_size}")
+            cursor = decode_cursor(request.query["cursor"]) if "cursor" in request.query else None
+        except ValueError as e:  # CursorError or a bad limit
+            return web.json_response({"error": str(e)}, status=400)
+
+        # One extra row tells whether another page exists without a COUNT(*)
+        rows = await _fetch_transactions(fetch_rows, request.query.get("source_type"), cursor, limit + 1)
+        next_cursor = encode_cursor(rows[limit - 1]["date"], rows[limit - 1]["raw_id"]) if len(rows) > limit else None
+        return _respond(request, encode_body({"items": rows[:limit], "next_cursor": next_cursor}))
+
+    async def aggregate(request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        view = AGGREGATES.get(name)
+        if view is None:
+            return web.json_response({"error": f"unknown aggregate {name!r}"}, status=404)
+        body = cache.get(name)
+        if body is None:
+            generation = cache.generation
+            body = encode_body({"items": [dict(r) for r in await fetch_rows(f"SELECT * FROM {view}")]})
+            if cache.generation == generation:
+                cache.set(name, body)
+        return _respond(request, body)
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"status": "ok", "cache": {"size": len(cache), "hits": cache.hits, "misses": cache.misses}}
+        )
+
+    app = web.Application()
+    app.add_routes([
+        web.get("/v1/transactions", transactions),
+        web.get("/v1/aggregates/{name}", aggregate),
+        web.get("/healthz", healthz),
+    ])
+    return app
+
+
+async def listen_for_changes(cache: TTLCache, stop: asyncio.Event) -> None:
+    """
+    Сбрасывает кэш по каждому уведомлению CHANGED_CHANNEL, пока не выставлен stop.
+
+    Соединение LISTEN переподключается с backoff; после каждого (пере)подключения кэш тоже
+    сбрасывается, так как уведомления, пришедшие без LISTEN, потеряны.
+    """
+
+    def on_notify(conn: Any, pid: int, channel: str, payload: str) -> None:
+        cache.clear()
+
+    async def on_connect() -> None:
+        cache.clear()
+
+    await listen(CHANGED_CHANNEL, on_notify, stop, on_connect=on_connect)
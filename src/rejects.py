@@ -0,0 +1,104 @@
+"""Карантин отклоненных записей: буфер ошибок по этапам и пакетная запись в etl.rejected_records."""
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from .db import execute, executemany, fetch
+
+logger = logging.getLogger(__name__)
+
+# Keeps pathological messages (full SQL, huge payload reprs) out of the table
+MAX_ERROR_MESSAGE = 2000
+
+_INSERT_SQL = """
+    INSERT INTO etl.rejected_records
+        (raw_id, source, source_type, stage, error_class, error_message, payload_hash)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+    ON CONFLICT (raw_id, stage) WHERE resolved_at IS NULL DO UPDATE SET
+        error_class = EXCLUDED.error_class,
+        error_message = EXCLUDED.error_message,
+        payload_hash = EXCLUDED.payload_hash,
+        attempts = etl.rejected_records.attempts + 1,
+        rejected_at = timezone('utc'::text, now())
+"""
+
+
+@dataclass
+class RejectedRecord:
+    """Отклоненная запись: где и почему она не прошла."""
+
+    raw_id: str
+    stage: str
+    error_class: str
+    error_message: str
+    payload_hash: bytes | None = None
+
+
+class RejectSink:
+    """Копит отклоненные записи и пишет их пачкой через flush() в конце каждого батча."""
+
+    def __init__(self, source: str | None = None, source_type: str | None = None):
+        self.source = source
+        self.source_type = source_type
+        self._pending: list[RejectedRecord] = []
+        self.rejected_ids: set[str] = set()
+        self.total = 0
+
+    def add(self, raw_id: Any, stage: str, error: BaseException, payload_hash: bytes | None = None) -> None:
+        message = str(error)[:MAX_ERROR_MESSAGE]
+        self._pending.append(RejectedRecord(str(raw_id), stage, type(error).__name__, message, payload_hash))
+        self.rejected_ids.add(str(raw_id))
+        self.total += 1
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Записывает накопленные отклонения одним executemany; ошибки записи не прерывают ELT."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        try:
+            await executemany(
+                _INSERT_SQL,
+                [
+                    (r.raw_id, self.source, self.source_type, r.stage, r.error_class, r.error_message, r.payload_hash)
+                    for r in pending
+                ],
+            )
+        except Exception as e:
+            logger.error(f"❌ Не удалось записать {len(pending)} отклоненных записей в etl.rejected_records: {e}")
+            return 0
+        return len(pending)
+
+
+async def fetch_open_rejections(source: str | None = None, stage: str | None = None) -> list[Any]:
+    """Возвращает открытые отклонения (raw_id, source, source_type, stage)."""
+    return await fetch(
+        """
+        SELECT raw_id, source, source_type, stage
+        FROM etl.rejected_records
+        WHERE resolved_at IS NULL
+          AND ($1::text IS NULL OR source = $1)
+          AND ($2::text IS NULL OR stage = $2)
+        ORDER BY rejected_at
+        """,
+        source,
+        stage,
+    )
+
+
+async def resolve_rejections(raw_ids: list[str], source: str | None, stage: str | None = None) -> None:
+    """Закрывает отклонения источника source (и этапа stage, если задан) для записей, успешно обработанных повторно."""
+    if not raw_ids:
+        return
+    # The same raw_id may be open under another source; only the group that was retried is closed
+    await execute(
+        "UPDATE etl.rejected_records SET resolved_at = timezone('utc'::text, now()) "
+        "WHERE raw_id = ANY($1::text[]) AND source IS NOT DISTINCT FROM $2 "
+        "AND ($3::text IS NULL OR stage = $3) AND resolved_at IS NULL",
+        raw_ids,
+        source,
+        stage,
+    )
@@ -1,21 +1,60 @@
+import asyncio
+import itertools
 import logging
-from pathlib import Path
+import re
+import time
+from collections.abc import Iterator
 from typing import Any
+from urllib.parse import quote
 
 import aiohttp
 import pandas as pd
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from .config import settings
-from .db import get_google_access_token, upload_to_supabase_storage
+from .db import get_google_access_token
+from .tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+_A1_COLUMNS = re.compile(r"^([A-Z]+)\d*(?::([A-Z]+)\d*)?$")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index
+
+
+def _column_letters(index: int) -> str:
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def range_column_count(range_name: str) -> int | None:
+    """Число колонок в A1-диапазоне ("Sheet1!A:AF" -> 32); None, если колонки не заданы (весь лист)."""
+    if "!" not in range_name and ":" not in range_name:
+        return None  # "Sheet1" names a whole sheet, not cell A..SHEET row 1
+    cells = range_name.rsplit("!", 1)[-1]
+    match = _A1_COLUMNS.match(cells.upper().replace("$", ""))
+    if not match:
+        return None
+    first, last = match.group(1), match.group(2) or match.group(1)
+    return _column_index(last) - _column_index(first) + 1
+
+
 @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def fetch_google_sheets(spreadsheet_id: str, range_name: str = "Sheet1!A:AF") -> list[dict[str, Any]]:
+@traced("sheets.fetch")
+async def fetch_google_sheets(
+    spreadsheet_id: str, range_name: str = "Sheet1!A:AF", column_count: int | None = None
+) -> list[dict[str, Any]]:
     token = get_google_access_token()
-    url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{range_name}"
+    url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{quote(range_name, safe='!:$')}"
 
     headers = None
     params = None
@@ -37,9 +76,9 @@ async def fetch_google_sheets(spreadsheet_id: str, range_name: str = "Sheet1!A:A
     if not values:
         return []
 
-    # Ensure we have headers for all 32 columns (A-AF)
+    # Headers cover every column of the range (A:AF -> 32); a bare sheet name keeps the header row as is
     raw_headers = values[0]
-    expected_col_count = 32
+    expected_col_count = column_count or range_column_count(range_name) or len(raw_headers)
 
     if len(raw_headers) < expected_col_count:
         raw_headers += [f"Column_{i + 1}" for i in range(len(raw_headers), expected_col_count)]
@@ -49,37 +88,161 @@ async def fetch_google_sheets(spreadsheet_id: str, range_name: str = "Sheet1!A:A
     headers_row = raw_headers
     rows = values[1:]
 
-    records = [dict(zip(headers_row, r + [""] * (len(headers_row) - len(r)), strict=True)) for r in rows]
+    records = [
+        dict(zip(headers_row, r[: len(headers_row)] + [""] * (len(headers_row) - len(r)), strict=True)) for r in rows
+    ]
+
+    return records
+
+
+# --- Write-back ---
 
-    df = pd.DataFrame(records)
-    date_str = pd.Timestamp.now().strftime("%Y-%m-%d")
-    out_dir = Path(settings.ARCHIVE_PATH) / "csv" / date_str
-    out_dir.mkdir(parents=True, exist_ok=True)
-    csv_path = out_dir / f"google_sheets_{spreadsheet_id}.csv"
-    df.to_csv(csv_path, index=False)
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+# Sheets recommends request bodies under ~2 MB; keep a margin for JSON overhead
+WRITE_MAX_REQUEST_BYTES = 1_500_000
+WRITE_MAX_ROWS = 5000
+WRITE_CONCURRENCY = 4
+# Default per-user write quota is 60 requests per minute
+WRITE_REQUESTS_PER_MINUTE = 60
+
+
+class _RateLimiter:
+    """Ограничивает частоту запусков запросов (не более N в минуту)."""
+
+    def __init__(self, per_minute: int):
+        self._interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _cell_to_str(value: Any) -> str:
+    if value is None:
+        return ""
     try:
-        with open(csv_path, "rb") as fh:
-            await upload_to_supabase_storage(
-                "archives", f"{date_str}/google_sheets_{spreadsheet_id}.csv", fh.read(), "text/csv"
-            )
-    except Exception as exc:
-        logger.warning("⚠️ Загрузка в Supabase не удалась: %s", exc)
+        if pd.isna(value):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    return str(value)
+
+
+def _estimate_row_bytes(row: list[str]) -> int:
+    # aiohttp serializes JSON with ensure_ascii, so non-ASCII chars cost up to 6 bytes (\uXXXX)
+    return sum((len(c) if c.isascii() else len(c) * 6) + 3 for c in row) + 2
+
+
+def iter_row_chunks(
+    df: pd.DataFrame,
+    include_header: bool = True,
+    max_rows: int = WRITE_MAX_ROWS,
+    max_bytes: int = WRITE_MAX_REQUEST_BYTES,
+) -> Iterator[tuple[int, list[list[str]]]]:
+    """Построчно конвертирует DataFrame в строки и режет на порции (смещение, строки) под лимиты API."""
+    rows_iter: Iterator[list[str]] = ([_cell_to_str(v) for v in row] for row in df.itertuples(index=False, name=None))
+    if include_header:
+        rows_iter = itertools.chain([[str(c) for c in df.columns]], rows_iter)
+
+    offset = 0
+    chunk: list[list[str]] = []
+    chunk_bytes = 0
+    for row in rows_iter:
+        row_bytes = _estimate_row_bytes(row)
+        if chunk and (len(chunk) >= max_rows or chunk_bytes + row_bytes > max_bytes):
+            yield offset, chunk
+            offset += len(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if chunk:
+        yield offset, chunk
 
-    return records
+
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10))
+async def _post_values_chunk(
+    session: aiohttp.ClientSession, url: str, headers: dict[str, str], range_a1: str, rows: list[list[str]]
+) -> int:
+    body = {"valueInputOption": "RAW", "data": [{"range": range_a1, "values": rows}]}
+    async with session.post(url, headers=headers, json=body) as resp:
+        if resp.status >= 400:
+            text = await resp.text()
+            raise RuntimeError(f"Sheets batchUpdate HTTP {resp.status}: {text[:200]}")
+        data = await resp.json()
+        return int(data.get("totalUpdatedRows", len(rows)))
 
 
-async def push_df_to_sheet(spreadsheet_id: str, sheet_name: str, df: pd.DataFrame) -> dict:
+@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=4, max=10))
+async def _clear_values_range(session: aiohttp.ClientSession, url: str, headers: dict[str, str], range_a1: str) -> None:
+    async with session.post(url, headers=headers, json={"ranges": [range_a1]}) as resp:
+        if resp.status >= 400:
+            text = await resp.text()
+            raise RuntimeError(f"Sheets batchClear HTTP {resp.status}: {text[:200]}")
+
+
+async def push_df_to_sheet(
+    spreadsheet_id: str,
+    sheet_name: str,
+    df: pd.DataFrame,
+    start_row: int = 1,
+    max_rows: int = WRITE_MAX_ROWS,
+    concurrency: int = WRITE_CONCURRENCY,
+    requests_per_minute: int = WRITE_REQUESTS_PER_MINUTE,
+    clear_below: bool = True,
+) -> dict[str, Any]:
+    """
+    Записывает DataFrame в лист порциями через values:batchUpdate с ограничением параллелизма и частоты.
+
+    clear_below: очистить колонки таблицы ниже записанных строк, чтобы от прошлой, более длинной
+    выгрузки не оставался хвост (False — дозапись с start_row без очистки).
+    """
     token = get_google_access_token()
     if not token:
         raise RuntimeError("❌ Отсутствует токен доступа Google")
-    url = f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values/{sheet_name}!A1:append?valueInputOption=RAW"
-    values = [list(df.columns)] + df.fillna("").astype(str).values.tolist()
-    body = {"values": values}
+    url = f"{SHEETS_API_URL}/{spreadsheet_id}/values:batchUpdate"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+    limiter = _RateLimiter(requests_per_minute)
+    start = time.monotonic()
+    chunks = iter_row_chunks(df, max_rows=max_rows)
+    rows_written = requests = 0
+
+    async def send_chunks(session: aiohttp.ClientSession) -> int:
+        nonlocal rows_written, requests
+        # Workers pull from one lazy iterator, so at most `concurrency` converted chunks are held in memory
+        updated = 0
+        for offset, rows in chunks:
+            rows_written = max(rows_written, offset + len(rows))
+            requests += 1
+            await limiter.wait()
+            updated += await _post_values_chunk(session, url, headers, f"'{sheet_name}'!A{start_row + offset}", rows)
+        return updated
+
     async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=body) as resp:
-            try:
-                return await resp.json()
-            except Exception:
-                text = await resp.text()
-                return {"status": resp.status, "text": text}
+        workers = [asyncio.create_task(send_chunks(session)) for _ in range(max(concurrency, 1))]
+        try:
+            updated = sum(await asyncio.gather(*workers))
+        except BaseException:
+            # One failed batchUpdate fails the push: stop the workers so no further chunks are sent
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            raise
+        if clear_below:
+            tail = f"'{sheet_name}'!A{start_row + rows_written}:{_column_letters(max(len(df.columns), 1))}"
+            await limiter.wait()
+            await _clear_values_range(session, f"{SHEETS_API_URL}/{spreadsheet_id}/values:batchClear", headers, tail)
+
+    duration = time.monotonic() - start
+    rows_per_second = updated / duration if duration > 0 else float(updated)
+    logger.info(
+        f"📤 Записано в {sheet_name}: {updated} строк за {duration:.1f}с "
+        f"({rows_per_second:.0f} строк/с, запросов: {requests})"
+    )
+    return {"updatedRows": updated, "requests": requests, "duration": duration, "rowsPerSecond": rows_per_second}
@@ -0,0 +1,140 @@
+"""Источники: пары source/source_type для run и манифест таблиц Google Sheets для ingest."""
+
+import tomllib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .db import execute, fetch
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    """Источник raw-данных, его метка source_type и лимит параллельных батчей."""
+
+    source: str
+    source_type: str = "live"
+    concurrency: int = 1
+
+    @property
+    def name(self) -> str:
+        return f"{self.source}/{self.source_type}"
+
+
+def parse_source_pair(value: str) -> SourceSpec:
+    """Разбирает SOURCE[:SOURCE_TYPE[:CONCURRENCY]] из аргумента --pair."""
+    parts = value.split(":")
+    if not parts[0] or len(parts) > 3:
+        raise ValueError(f"Expected SOURCE[:SOURCE_TYPE[:CONCURRENCY]], got {value!r}")
+    source_type = parts[1] if len(parts) > 1 and parts[1] else "live"
+    concurrency = int(parts[2]) if len(parts) > 2 else 1
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be >= 1, got {concurrency}")
+    return SourceSpec(parts[0], source_type, concurrency)
+
+
+def check_unique(specs: list[SourceSpec]) -> None:
+    """Одна пара source/source_type не должна обрабатываться дважды за запуск."""
+    names = [s.name for s in specs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate sources: {duplicates}")
+
+
+def load_sources(path: str | Path) -> tuple[list[SourceSpec], int | None]:
+    """Читает [[sources]] и необязательный max_concurrency из TOML-файла."""
+    with open(path, "rb") as f:
+        data: dict[str, Any] = tomllib.load(f)
+
+    specs = []
+    for i, entry in enumerate(data.get("sources", [])):
+        if "source" not in entry:
+            raise ValueError(f"{path}: sources[{i}] has no 'source'")
+        concurrency = int(entry.get("concurrency", 1))
+        if concurrency < 1:
+            raise ValueError(f"{path}: sources[{i}].concurrency must be >= 1")
+        specs.append(SourceSpec(entry["source"], entry.get("source_type", "live"), concurrency))
+    if not specs:
+        raise ValueError(f"{path}: no [[sources]] entries")
+
+    check_unique(specs)
+    max_concurrency = data.get("max_concurrency")
+    return specs, int(max_concurrency) if max_concurrency is not None else None
+
+
+# --- Ingest manifest ---
+
+
+@dataclass(frozen=True)
+class SheetEntry:
+    """Диапазон таблицы Google Sheets и куда его загружать."""
+
+    spreadsheet_id: str
+    range: str = "Sheet1!A:AF"
+    source: str = "google_sheets"
+    source_type: str = "live"
+    # Columns whose values form raw.data.id; empty -> auto-detect pk/id/row_id/uuid, else content hash
+    id_columns: tuple[str, ...] = ()
+    # Header width when the range has no column letters (whole sheet)
+    columns: int | None = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.source} ({self.spreadsheet_id} {self.range})"
+
+
+def load_manifest(path: str | Path) -> tuple[list[SheetEntry], int | None]:
+    """Читает [[sheets]] и необязательный max_parallel из TOML-манифеста."""
+    with open(path, "rb") as f:
+        data: dict[str, Any] = tomllib.load(f)
+
+    entries = []
+    for i, entry in enumerate(data.get("sheets", [])):
+        if "spreadsheet_id" not in entry:
+            raise ValueError(f"{path}: sheets[{i}] has no 'spreadsheet_id'")
+        unknown = set(entry) - set(SheetEntry.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"{path}: sheets[{i}] has unknown keys {sorted(unknown)}")
+        id_columns = entry.get("id_columns", ())
+        if isinstance(id_columns, str):
+            id_columns = (id_columns,)
+        entries.append(SheetEntry(**{**entry, "id_columns": tuple(id_columns)}))
+    if not entries:
+        raise ValueError(f"{path}: no [[sheets]] entries")
+
+    keys = [(e.spreadsheet_id, e.range, e.source) for e in entries]
+    duplicates = sorted({k for k in keys if keys.count(k) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: duplicate sheets {duplicates}")
+    max_parallel = data.get("max_parallel")
+    return entries, int(max_parallel) if max_parallel is not None else None
+
+
+async def get_ingest_hash(entry: SheetEntry) -> bytes | None:
+    """Хеш содержимого диапазона при последней успешной загрузке."""
+    rows = await fetch(
+        "SELECT content_hash FROM etl.ingest_state WHERE spreadsheet_id = $1 AND range = $2 AND source = $3",
+        entry.spreadsheet_id,
+        entry.range,
+        entry.source,
+    )
+    return rows[0]["content_hash"] if rows else None
+
+
+async def save_ingest_hash(entry: SheetEntry, content_hash: bytes, row_count: int) -> None:
+    """Запоминает хеш загруженного содержимого, чтобы следующий ingest пропустил неизмененный диапазон."""
+    await execute(
+        """
+        INSERT INTO etl.ingest_state (spreadsheet_id, range, source, content_hash, row_count)
+        VALUES ($1, $2, $3, $4, $5)
+        ON CONFLICT (spreadsheet_id, range, source) DO UPDATE SET
+            content_hash = EXCLUDED.content_hash,
+            row_count = EXCLUDED.row_count,
+            loaded_at = timezone('utc'::text, now())
+        """,
+        entry.spreadsheet_id,
+        entry.range,
+        entry.source,
+        content_hash,
+        row_count,
+    )
@@ -0,0 +1,214 @@
+"""Трассировка этапов ELT: спаны, совместимые с OpenTelemetry (OTLP JSON), и текстовый waterfall."""
+
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import secrets
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, TypeVar
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "chilekids-etl"
+# Guard against unbounded growth in long-lived traces
+MAX_SPANS_PER_TRACE = 10_000
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    """Завершенный или активный спан."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+    depth: int = 0
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+_finished: dict[str, list[Span]] = {}
+_listeners: list[tuple[Callable[[Span], None], Callable[[Span], None]]] = []
+_exporter: str = "none"
+_trace_file: Path | None = None
+
+
+def configure(exporter: str = "none", trace_file: str | Path | None = None) -> None:
+    """Выбирает экспортер трасс: none, console или file."""
+    global _exporter, _trace_file
+    if exporter not in ("none", "console", "file"):
+        raise ValueError(f"Unknown trace exporter: {exporter}")
+    _exporter = exporter
+    _trace_file = Path(trace_file) if trace_file else None
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def add_span_listener(on_start: Callable[[Span], None], on_end: Callable[[Span], None]) -> None:
+    """Регистрирует обработчики начала/конца спана (например, для профилировщика памяти)."""
+    _listeners.append((on_start, on_end))
+
+
+def remove_span_listener(on_start: Callable[[Span], None], on_end: Callable[[Span], None]) -> None:
+    _listeners.remove((on_start, on_end))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Открывает спан; корневой спан при закрытии экспортирует всю трассу."""
+    parent = _current_span.get()
+    sp = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=dict(attributes),
+        depth=parent.depth + 1 if parent else 0,
+    )
+    token = _current_span.set(sp)
+    for on_start, _ in _listeners:
+        on_start(sp)
+    try:
+        yield sp
+    except BaseException as exc:
+        sp.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        sp.end_ns = time.time_ns()
+        _current_span.reset(token)
+        for _, on_end in _listeners:
+            on_end(sp)
+        spans = _finished.setdefault(sp.trace_id, [])
+        if len(spans) < MAX_SPANS_PER_TRACE:
+            spans.append(sp)
+        if parent is None:
+            _export(_finished.pop(sp.trace_id, []))
+
+
+def traced(name: str | None = None, **attributes: Any) -> Callable[[F], F]:
+    """Декоратор: оборачивает sync/async функцию в спан."""
+
+    def decorator(func: F) -> F:
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(span_name, **attributes):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(span_name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+# --- Exporters ---
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: list[Span]) -> dict[str, Any]:
+    """Сериализует спаны трассы в OTLP/JSON (ExportTraceServiceRequest)."""
+    otlp_spans = []
+    for sp in spans:
+        item: dict[str, Any] = {
+            "traceId": sp.trace_id,
+            "spanId": sp.span_id,
+            "name": sp.name,
+            "kind": 1,
+            "startTimeUnixNano": str(sp.start_ns),
+            "endTimeUnixNano": str(sp.end_ns or sp.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in sp.attributes.items()],
+            "status": {"code": 2, "message": sp.error} if sp.error else {"code": 1},
+        }
+        if sp.parent_id:
+            item["parentSpanId"] = sp.parent_id
+        otlp_spans.append(item)
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+            }
+        ]
+    }
+
+
+def render_waterfall(spans: list[Span], width: int = 40) -> str:
+    """Строит текстовый waterfall трассы (отступ = вложенность, полоса = время)."""
+    if not spans:
+        return ""
+    root_start = min(sp.start_ns for sp in spans)
+    total_ns = max((sp.end_ns or sp.start_ns) for sp in spans) - root_start or 1
+    children: dict[str | None, list[Span]] = {}
+    for sp in spans:
+        children.setdefault(sp.parent_id, []).append(sp)
+    known_ids = {sp.span_id for sp in spans}
+    roots = [sp for sp in spans if sp.parent_id is None or sp.parent_id not in known_ids]
+
+    lines = [f"trace {spans[0].trace_id} ({total_ns / 1e9:.3f}s)"]
+
+    def walk(sp: Span, depth: int) -> None:
+        offset = (sp.start_ns - root_start) / total_ns
+        length = ((sp.end_ns or sp.start_ns) - sp.start_ns) / total_ns
+        bar = " " * int(offset * width) + "█" * max(1, round(length * width))
+        marker = " ❌" if sp.error else ""
+        label = ("  " * depth + sp.name)[:48]
+        lines.append(f"{label:<48} {sp.duration:>9.3f}s |{bar:<{width}}|{marker}")
+        for child in sorted(children.get(sp.span_id, []), key=lambda c: c.start_ns):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda r: r.start_ns):
+        walk(root, 0)
+    return "\n".join(lines)
+
+
+def _export(spans: list[Span]) -> None:
+    if not spans or _exporter == "none":
+        return
+    try:
+        if _exporter == "console":
+            logger.info("🧭 Трасса запуска:\n" + render_waterfall(spans))
+        elif _exporter == "file" and _trace_file is not None:
+            _trace_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(_trace_file, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(to_otlp(spans), ensure_ascii=False) + "\n")
+    except Exception as exc:
+        logger.warning(f"⚠️ Не удалось экспортировать трассу: {exc}")
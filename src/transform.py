@@ -1,14 +1,23 @@
+import asyncio
 import datetime
-import json
 import logging
+import time
+import typing
+from collections.abc import Awaitable, Callable
 from decimal import Decimal, InvalidOperation
 from typing import Any
 
+import asyncpg
 from dateutil import parser as dateutil_parser
 
-from .db import fetch_one_off, get_db_pool
-from .models import StagingRecord
-from .utils import payload_hash
+from .config import settings
+from .db import fetch, fetch_one_off, get_db_pool
+from .metrics import BATCH_LATENCY
+from .models import STAGING_FIELDS, StagingRecord, StagingRow, validate_staging_batch, validate_staging_record
+from .partitions import ensure_staging_partitions
+from .rejects import RejectSink
+from .tracing import span, traced
+from .utils import encode_json_param, json_dumps, json_loads, payload_hash
 
 logger = logging.getLogger(__name__)
 
@@ -120,15 +129,19 @@ def _get(payload: dict[str, Any], key_variants: list[str]) -> Any:
 # --- Normalizer Core ---
 
 
-def normalize_record(
+def _staging_data(
     raw_id: int,
-    sheet_row_number: int,
+    sheet_row_number: int | None,
     received_at: datetime.datetime,
     payload: dict[str, Any],
     source_type: str = "live",
+    hash_value: bytes | None = None,
 ) -> dict[str, Any]:
-    hash_value = payload_hash(payload)
-    data = {
+    """Строит невалидированный словарь полей staging.records из payload."""
+    # raw.data already stores the hash of the same payload; recomputing it would re-serialize every row
+    if hash_value is None:
+        hash_value = payload_hash(payload)
+    return {
         "raw_id": raw_id,
         "sheet_row_number": sheet_row_number,
         "received_at": received_at,
@@ -182,165 +195,409 @@ def normalize_record(
         "raw_payload": payload,
     }
 
-    # Validate with Pydantic
-    validated = StagingRecord(**data)
-    result = validated.model_dump()
 
+def _check_financial(result: dict[str, Any] | StagingRow) -> None:
     # Financial check (legacy warning compatibility)
-    if result.get("type") in ["Доход", "Расход", "Income", "Expense"]:
-        if result.get("total_rub") is None:
+    raw_id: object
+    row_number: object
+    if isinstance(result, StagingRow):
+        record_type, total_rub = result.type, result.total_rub
+        raw_id, row_number = result.raw_id, result.sheet_row_number
+    else:
+        record_type, total_rub = result.get("type"), result.get("total_rub")
+        raw_id, row_number = result.get("raw_id"), result.get("sheet_row_number")
+    if record_type in ["Доход", "Расход", "Income", "Expense"]:
+        if total_rub is None:
             logger.warning(
-                f"⚠️ Validation Warning: ID={raw_id} (row={sheet_row_number}) "
-                f"is '{result.get('type')}' but 'Total RUB' is missing/invalid."
+                f"⚠️ Validation Warning: ID={raw_id} (row={row_number}) "
+                f"is '{record_type}' but 'Total RUB' is missing/invalid."
             )
 
+
+def normalize_record(
+    raw_id: int,
+    sheet_row_number: int,
+    received_at: datetime.datetime,
+    payload: dict[str, Any],
+    source_type: str = "live",
+    hash_value: bytes | None = None,
+    validation: str | None = None,
+) -> dict[str, Any]:
+    data = _staging_data(raw_id, sheet_row_number, received_at, payload, source_type, hash_value)
+    # Validate with Pydantic (strict: full model, fast: only fields the helpers didn't type)
+    result = validate_staging_record(data, validation or settings.STAGING_VALIDATION)
+    _check_financial(result)
     return result
 
 
+def normalize_records(
+    raw_records: list[dict[str, Any]],
+    source_type: str = "live",
+    validation: str | None = None,
+    as_rows: bool = False,
+) -> tuple[list[Any], list[tuple[dict[str, Any], Exception]]]:
+    """Нормализует пачку raw-записей с пакетной валидацией; as_rows — StagingRow в порядке колонок загрузчика."""
+    built: list[dict[str, Any]] = []
+    sources: list[dict[str, Any]] = []
+    failed: list[tuple[dict[str, Any], Exception]] = []
+    for raw in raw_records:
+        try:
+            built.append(
+                _staging_data(
+                    raw["raw_id"],
+                    raw.get("sheet_row_number"),
+                    raw["received_at"],
+                    raw["raw_payload"],
+                    source_type,
+                    raw.get("payload_hash"),
+                )
+            )
+            sources.append(raw)
+        except Exception as exc:
+            failed.append((raw, exc))
+
+    valid, rejected = validate_staging_batch(built, validation or settings.STAGING_VALIDATION, as_rows)
+    failed.extend((sources[i], exc) for i, exc in rejected)
+    for result in valid:
+        _check_financial(result)
+    return valid, failed
+
+
+@traced("db.get_changed_raw_records")
 async def get_changed_raw_records(
     source: str = "google_sheets", limit: int | None = None, batch_size: int = 500
 ) -> list[dict[str, Any]]:
-    sql = f"""
+    # A bound source keeps the plan on that source's partitions only (runtime pruning for generic plans)
+    sql = """
         SELECT r.id as raw_id, r.extracted_at as received_at, r.payload, r.payload_hash
         FROM raw.data r
         LEFT JOIN staging.records s ON r.payload_hash = s.payload_hash
-        WHERE r.source = '{source}' AND s.payload_hash IS NULL
+        WHERE r.source = $1 AND s.payload_hash IS NULL
         ORDER BY r.extracted_at, r.id
+        LIMIT $2
     """
-    if limit is not None:
-        sql += f" LIMIT {limit}"
 
     try:
-        rows = await fetch_one_off(sql)
-        result = []
-        for row in rows:
-            try:
-                payload_dict = json.loads(row["payload"])
-                hash_val = row.get("payload_hash") or payload_hash(payload_dict)
-                result.append(
-                    {
-                        "raw_id": row["raw_id"],
-                        "sheet_row_number": None,
-                        "received_at": row["received_at"],
-                        "raw_payload": payload_dict,
-                        "payload_hash": hash_val,
-                    }
-                )
-            except Exception:
-                continue
-        return result
+        rows = await fetch_one_off(sql, source, limit)
+        return _raw_rows_to_records(rows)
     except Exception as e:
         logger.error(f"Ошибка запроса записей из raw.data: {e}", exc_info=True)
         return []
 
 
+def _raw_rows_to_records(rows: list[Any]) -> list[dict[str, Any]]:
+    result = []
+    for row in rows:
+        try:
+            payload_dict = row["payload"]
+            if isinstance(payload_dict, (str, bytes)):
+                # Connections without the jsonb codec return the raw text
+                payload_dict = json_loads(payload_dict)
+            hash_val = row.get("payload_hash") or payload_hash(payload_dict)
+            result.append(
+                {
+                    "raw_id": row["raw_id"],
+                    "sheet_row_number": None,
+                    "received_at": row["received_at"],
+                    "raw_payload": payload_dict,
+                    "payload_hash": hash_val,
+                }
+            )
+        except Exception:
+            continue
+    return result
+
+
+@traced("db.get_raw_records_by_ids")
+async def get_raw_records_by_ids(raw_ids: list[str], source: str | None = None) -> list[dict[str, Any]]:
+    """Читает конкретные raw-записи; с source запрос идет только по партициям этого источника."""
+    if not raw_ids:
+        return []
+    sql = """
+        SELECT r.id as raw_id, r.extracted_at as received_at, r.payload, r.payload_hash
+        FROM raw.data r
+        WHERE r.id = ANY($1::text[])
+    """
+    # A plain equality (not "$2 IS NULL OR ...") so generic plans can still prune partitions
+    if source is None:
+        rows = await fetch(sql + " ORDER BY r.extracted_at, r.id", raw_ids)
+    else:
+        rows = await fetch(sql + " AND r.source = $2 ORDER BY r.extracted_at, r.id", raw_ids, source)
+    return _raw_rows_to_records(rows)
+
+
 # --- Loader ---
 
 
-async def upsert_staging_records(records: list[dict[str, Any]]) -> int:
-    if not records:
-        return 0
-    fields = [
-        "raw_id",
-        "sheet_row_number",
-        "received_at",
-        "source_type",
-        "date",
-        "payment_date",
-        "task",
-        "type",
-        "year",
-        "hours",
-        "month",
-        "client",
-        "fx_rub",
-        "fx_usd",
-        "vendor",
-        "cashier",
-        "cat_new",
-        "quarter",
-        "service",
-        "approver",
-        "category",
-        "currency",
-        "cat_final",
-        "total_rub",
-        "total_usd",
-        "subcat_new",
-        "paket",
-        "description",
-        "subcategory",
-        "payment_date_orig",
-        "subcat_final",
-        "count_vendor",
-        "statya",
-        "sum_total_rub",
-        "usd_summa",
-        "direct_indirect",
-        "package_secondary",
-        "total_in_currency",
-        "rub_summa",
-        "kategoriya",
-        "podstatya",
-        "vidy_raskhodov",
-        "payload_hash",
-        "raw_payload",
-        "created_at",
-        "updated_at",
-        "updated_by",
-    ]
-    placeholders = ", ".join(f"${i + 1}" for i in range(len(fields)))
+def _prepare_staging_rows(records: list[dict[str, Any] | StagingRow]) -> list[tuple[Any, ...]]:
+    """Готовит кортежи значений в порядке STAGING_FIELDS для executemany."""
+    prepared_records: list[tuple[Any, ...]] = []
+    for record in records:
+        if isinstance(record, StagingRow):
+            # Already in column order; raw_payload dicts are encoded by the jsonb codec at bind time
+            prepared_records.append(record)
+            continue
+        try:
+            record_copy = record.copy()
+            if "raw_payload" in record_copy and isinstance(record_copy["raw_payload"], dict):
+                record_copy["raw_payload"] = json_dumps(record_copy["raw_payload"])
+            prepared_records.append(tuple(record_copy.get(f) for f in STAGING_FIELDS))
+        except Exception:
+            pass
+    return prepared_records
+
+
+_RAW_ID_IDX = STAGING_FIELDS.index("raw_id")
+_HASH_IDX = STAGING_FIELDS.index("payload_hash")
+_SOURCE_TYPE_IDX = STAGING_FIELDS.index("source_type")
+_DATE_IDX = STAGING_FIELDS.index("date")
+
+
+def _staging_upsert_sql(table: str = "staging.records") -> str:
+    fields = STAGING_FIELDS
+    params = {f: f"${i + 1}" for i, f in enumerate(fields)}
     field_list = ", ".join(fields)
     update_fields = [f for f in fields if f != "raw_id"]
     update_clause = ", ".join(f"{f} = EXCLUDED.{f}" for f in update_fields)
+    move_clause = ", ".join(f"{f} = {params[f]}" for f in update_fields)
+
+    # staging.records is partitioned by (source_type, date), so the conflict key includes them. A row
+    # whose source_type or date changed lives under another key: it is updated in place (Postgres moves
+    # it to the new partition) and the insert is skipped, so raw_id stays unique.
+    return (
+        f"WITH moved AS ("
+        f"UPDATE {table} SET {move_clause} "
+        f"WHERE raw_id = $1 AND (source_type, date) IS DISTINCT FROM "
+        f"({params['source_type']}, {params['date']}) RETURNING raw_id) "
+        f"INSERT INTO {table} ({field_list}) "
+        f"SELECT {', '.join(params.values())} WHERE NOT EXISTS (SELECT 1 FROM moved) "
+        f"ON CONFLICT (raw_id, source_type, date) DO UPDATE SET {update_clause}"
+    )
+
+
+_PG_TYPES = {str: "text", int: "int8", Decimal: "numeric", datetime.datetime: "timestamptz", bytes: "bytea"}
+
 
-    sql = (
-        f"INSERT INTO staging.records ({field_list}) VALUES ({placeholders}) "
-        f"ON CONFLICT (raw_id) DO UPDATE SET {update_clause}"
+def _pg_type(annotation: Any) -> str:
+    if typing.get_origin(annotation) is dict:
+        return "text"  # jsonb, cast per element
+    # Optional[X] -> X; raw_id is str | int and is sent as text like the column
+    args = [a for a in typing.get_args(annotation) if a is not type(None)] or [annotation]
+    return _PG_TYPES.get(args[0], "text")
+
+
+# Array element type per loader column; raw_payload travels as text[] and is cast to jsonb,
+# the same way load_raw sends raw payloads
+STAGING_ARRAY_TYPES = {f: _pg_type(StagingRecord.model_fields[f].annotation) for f in STAGING_FIELDS}
+
+
+def _staging_unnest_sql(table: str = "staging.records") -> str:
+    """Upsert всей пачки одним запросом: по массиву на колонку, без поштучного bind/prepare (режим пулера)."""
+    fields = STAGING_FIELDS
+    arrays = ", ".join(f"${i + 1}::{STAGING_ARRAY_TYPES[f]}[]" for i, f in enumerate(fields))
+    values = {f: f"v.{f}::jsonb" if f == "raw_payload" else f"v.{f}" for f in fields}
+    update_fields = [f for f in fields if f != "raw_id"]
+    update_clause = ", ".join(f"{f} = EXCLUDED.{f}" for f in update_fields)
+    move_clause = ", ".join(f"{f} = {values[f]}" for f in update_fields)
+
+    # Same semantics as _staging_upsert_sql for a batch with unique raw_ids (see _staging_columns)
+    return (
+        f"WITH v AS (SELECT * FROM unnest({arrays}) AS v({', '.join(fields)})), "
+        f"moved AS (UPDATE {table} r SET {move_clause} FROM v "
+        f"WHERE r.raw_id = v.raw_id AND (r.source_type, r.date) IS DISTINCT FROM (v.source_type, v.date) "
+        f"RETURNING r.raw_id) "
+        f"INSERT INTO {table} ({', '.join(fields)}) "
+        f"SELECT {', '.join(values.values())} FROM v "
+        f"WHERE NOT EXISTS (SELECT 1 FROM moved m WHERE m.raw_id = v.raw_id) "
+        f"ON CONFLICT (raw_id, source_type, date) DO UPDATE SET {update_clause}"
     )
 
+
+_PAYLOAD_IDX = STAGING_FIELDS.index("raw_payload")
+
+
+def _staging_columns(rows: list[tuple[Any, ...]]) -> list[list[Any]]:
+    """Транспонирует строки в массивы колонок для _staging_unnest_sql; повтор raw_id — побеждает последний."""
+    # One statement cannot touch a row twice (ON CONFLICT would fail), and the last version is
+    # what executemany would have left behind
+    unique = list({str(r[_RAW_ID_IDX]): r for r in rows}.values())
+    columns = [list(column) for column in zip(*unique, strict=True)]
+    columns[_RAW_ID_IDX] = [str(v) for v in columns[_RAW_ID_IDX]]
+    columns[_PAYLOAD_IDX] = [None if v is None else encode_json_param(v) for v in columns[_PAYLOAD_IDX]]
+    return columns
+
+
+def _partition_keys(rows: list[tuple[Any, ...]]) -> set[tuple[str, int]]:
+    """Пары (source_type, год даты в UTC) для партиций staging.records; строки без даты не нужны."""
+    keys = set()
+    for row in rows:
+        value = row[_DATE_IDX]
+        if not isinstance(value, datetime.date) or row[_SOURCE_TYPE_IDX] is None:
+            continue
+        if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        keys.add((row[_SOURCE_TYPE_IDX], value.year))
+    return keys
+
+
+# The unique key has to include the partition columns, so it no longer stops two writers (worker, serve,
+# push-server) from inserting one raw_id under different dates. A per-raw_id lock taken in its own
+# statement before the upsert serializes them, and the upsert's fresh snapshot then sees the other
+# writer's row and moves it. Keys are deduplicated and sorted so concurrent batches cannot deadlock.
+_RAW_ID_LOCK_SQL = (
+    "SELECT pg_advisory_xact_lock(hashtext('staging.records'), key) FROM unnest("
+    "ARRAY(SELECT DISTINCT hashtext(id) FROM unnest($1::text[]) AS id ORDER BY 1)) AS key"
+)
+
+
+async def _lock_raw_ids(conn: asyncpg.Connection, rows: list[tuple[Any, ...]]) -> None:
+    """Блокирует raw_id пачки до конца транзакции; без нее raw_id не был бы уникален при параллельной записи."""
+    await conn.execute(_RAW_ID_LOCK_SQL, [str(r[_RAW_ID_IDX]) for r in rows])
+
+
+# Connection-level failures abort the whole batch; bisecting them would only repeat the error
+_CONNECTION_ERRORS = (asyncpg.InterfaceError, OSError)
+
+
+WriteRows = Callable[[list[tuple[Any, ...]]], Awaitable[Any]]
+
+
+def _staging_writer(conn: asyncpg.Connection) -> WriteRows:
+    """Запись пачки в staging.records: executemany или, за пулером транзакций, один unnest-запрос."""
+    if settings.DB_POOLER_MODE == "transaction":
+        # Without a statement cache executemany would parse the 47-parameter statement on every call
+        # and bind it row by row; one array statement is parsed once per batch and needs no named statement
+        unnest_sql = _staging_unnest_sql()
+
+        async def write_columns(rows: list[tuple[Any, ...]]) -> None:
+            await conn.execute(unnest_sql, *_staging_columns(rows))
+
+        return write_columns
+
+    sql = _staging_upsert_sql()
+
+    async def write_rows(rows: list[tuple[Any, ...]]) -> None:
+        if len(rows) == 1:
+            await conn.execute(sql, *rows[0])
+        else:
+            await conn.executemany(sql, rows)
+
+    return write_rows
+
+
+async def _upsert_isolating(
+    conn: asyncpg.Connection,
+    write: WriteRows,
+    rows: list[tuple[Any, ...]],
+    reject_sink: RejectSink | None,
+    stats: dict[str, int],
+) -> int:
+    """Пишет rows под savepoint; при ошибке делит пачку пополам, пока не найдет плохие строки."""
+    stats["statements"] += 1
+    try:
+        # Nested transaction() is a SAVEPOINT: a failed half rolls back without aborting the outer transaction
+        async with conn.transaction():
+            await write(rows)
+        return len(rows)
+    except _CONNECTION_ERRORS:
+        raise
+    except Exception as e:
+        if len(rows) == 1:
+            values = rows[0]
+            logger.error(f"Failed to upsert record {values[_RAW_ID_IDX]}: {e}")
+            if reject_sink is not None:
+                reject_sink.add(values[_RAW_ID_IDX], "upsert", e, values[_HASH_IDX])
+            return 0
+    mid = len(rows) // 2
+    left = await _upsert_isolating(conn, write, rows[:mid], reject_sink, stats)
+    return left + await _upsert_isolating(conn, write, rows[mid:], reject_sink, stats)
+
+
+async def upsert_staging_records(
+    records: list[dict[str, Any] | StagingRow], reject_sink: RejectSink | None = None
+) -> int:
+    if not records:
+        return 0
+
     pool = get_db_pool()
     if pool is None:
         raise RuntimeError("Database pool not initialized")
     successful = 0
     async with pool.acquire() as conn:
-        prepared_records = []
-        for record in records:
-            try:
-                record_copy = record.copy()
-                if "raw_payload" in record_copy and isinstance(record_copy["raw_payload"], dict):
-                    record_copy["raw_payload"] = json.dumps(record_copy["raw_payload"])
-                prepared_records.append(tuple(record_copy.get(f) for f in fields))
-            except Exception:
-                pass
+        prepared_records = _prepare_staging_rows(records)
 
         if not prepared_records:
             return 0
+        await ensure_staging_partitions(conn, _partition_keys(prepared_records))
+        write = _staging_writer(conn)
         try:
             async with conn.transaction():
-                await conn.executemany(sql, prepared_records)
+                await _lock_raw_ids(conn, prepared_records)
+                await write(prepared_records)
                 successful = len(prepared_records)
+        except _CONNECTION_ERRORS:
+            raise
         except Exception:
-            # Batch failed, fallback to row-by-row
-            logger.warning("Batch insert failed, falling back to row-by-row insert.")
+            # Batch failed: bisect under savepoints, commit the good rows, hand the bad ones to reject_sink
+            logger.warning("Batch insert failed, isolating bad rows by bisection.")
+            stats = {"statements": 0}
             async with conn.transaction():
-                for values in prepared_records:
-                    try:
-                        await conn.execute(sql, *values)
-                        successful += 1
-                    except Exception as e:
-                        # Log specific error for the record
-                        logger.error(f"Failed to upsert record: {e}")
+                # Savepoint rollbacks release locks taken inside them, so the batch is locked out here
+                await _lock_raw_ids(conn, prepared_records)
+                if len(prepared_records) == 1:
+                    successful = await _upsert_isolating(conn, write, prepared_records, reject_sink, stats)
+                else:
+                    mid = len(prepared_records) // 2
+                    successful = await _upsert_isolating(conn, write, prepared_records[:mid], reject_sink, stats)
+                    successful += await _upsert_isolating(conn, write, prepared_records[mid:], reject_sink, stats)
+            logger.info(
+                f"🔎 Изоляция ошибок: {len(prepared_records) - successful} плохих из {len(prepared_records)} "
+                f"за {stats['statements']} запросов"
+            )
     return successful
 
 
-async def upsert_staging_records_batch(records: list[dict[str, Any]], batch_size: int = 100) -> int:
+async def upsert_staging_records_batch(
+    records: list[dict[str, Any] | StagingRow],
+    batch_size: int = 100,
+    metric_labels: dict[str, str] | None = None,
+    reject_sink: RejectSink | None = None,
+    concurrency: int = 1,
+) -> int:
     if not records:
         return 0
-    total_upserted = 0
-    for i in range(0, len(records), batch_size):
-        try:
-            total_upserted += await upsert_staging_records(records[i : i + batch_size])
-        except Exception:
-            continue
-    return total_upserted
+
+    async def upsert_batch(i: int) -> int:
+        batch_start = time.perf_counter()
+        batch = records[i : i + batch_size]
+        with span("db.upsert_batch", offset=i, rows=len(batch)) as sp:
+            try:
+                upserted = await upsert_staging_records(batch, reject_sink)
+                sp.set_attribute("upserted", upserted)
+                return upserted
+            except Exception as e:
+                sp.error = f"{type(e).__name__}: {e}"
+                if reject_sink is not None:
+                    for values in _prepare_staging_rows(batch):
+                        reject_sink.add(values[_RAW_ID_IDX], "upsert", e, values[_HASH_IDX])
+                return 0
+            finally:
+                BATCH_LATENCY.observe(time.perf_counter() - batch_start, **(metric_labels or {}))
+                if reject_sink is not None:
+                    await reject_sink.flush()
+
+    offsets = range(0, len(records), batch_size)
+    if concurrency <= 1:
+        total_upserted = 0
+        for i in offsets:
+            total_upserted += await upsert_batch(i)
+        return total_upserted
+
+    # Each batch holds its own pool connection; the semaphore caps how many this caller takes at once
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(i: int) -> int:
+        async with semaphore:
+            return await upsert_batch(i)
+
+    return sum(await asyncio.gather(*(limited(i) for i in offsets)))
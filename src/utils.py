@@ -4,25 +4,90 @@ import json
 import logging
 from typing import Any
 
-import aiohttp
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback keeps identical output for sheet payloads
+    orjson = None
+
+from .config import settings
 
 logger = logging.getLogger(__name__)
 
+# --- JSON Utils ---
+
+
+def _json_default(value: Any) -> Any:
+    # Decimal/datetime values from normalized rows are stored as their string form
+    return str(value)
+
+
+def canonical_json(payload: Any) -> bytes:
+    """Каноническая сериализация: UTF-8, сортированные ключи, без пробелов (основа для хеша и вставки)."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_json_default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=_json_default
+    ).encode("utf-8")
+
+
+def json_dumps(value: Any) -> str:
+    """Компактная сериализация в str (порядок ключей сохраняется)."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def json_loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_json_param(value: Any) -> str:
+    """Энкодер json/jsonb для asyncpg: готовый текст передается как есть, остальное сериализуется."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8")
+    return json_dumps(value)
+
+
 # --- Hash Utils ---
 
+# payload_hash columns are BYTEA holding a 16-byte digest (half the size of the old hex TEXT)
+HASH_DIGEST_SIZE = 16
+
+
+def _md5_digest(data: bytes) -> bytes:
+    return hashlib.md5(data).digest()
+
+
+def _blake2b_digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=HASH_DIGEST_SIZE).digest()
+
 
-def payload_hash(payload: dict[str, Any]) -> str:
+# md5 keeps digests identical to hashes stored before the BYTEA migration (decode(hex))
+HASH_FUNCTIONS = {"md5": _md5_digest, "blake2b": _blake2b_digest}
+
+
+def hash_bytes(data: bytes, algorithm: str | None = None) -> bytes:
+    """16-байтовый дайджест алгоритмом из PAYLOAD_HASH_ALGORITHM."""
+    return HASH_FUNCTIONS[algorithm or settings.PAYLOAD_HASH_ALGORITHM](data)
+
+
+def payload_hash(payload: dict[str, Any], algorithm: str | None = None) -> bytes:
     """
-    Вычисляет детерминированный MD5 хеш словаря payload.
+    Вычисляет детерминированный 16-байтовый хеш словаря payload.
     """
-    serialized = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
-    return hashlib.md5(serialized.encode("utf-8")).hexdigest()
+    return hash_bytes(canonical_json(payload), algorithm)
 
 
 # --- HTTP Utils ---
 
 
 async def request_with_retries(method: str, url: str, retries: int = 3, backoff: float = 1.0, **kwargs):
+    import aiohttp
+
     last_exc = None
     for attempt in range(1, retries + 1):
         try:
@@ -36,7 +36,7 @@ async def setup_db(postgres_container):
                 id TEXT PRIMARY KEY,
                 source TEXT NOT NULL,
                 payload JSONB NOT NULL,
-                payload_hash TEXT NOT NULL,
+                payload_hash BYTEA NOT NULL,
                 extracted_at TIMESTAMPTZ DEFAULT NOW()
             )
         """)
@@ -51,7 +51,7 @@ async def setup_db(postgres_container):
                 client TEXT,
                 total_rub DECIMAL,
                 category TEXT,
-                payload_hash TEXT NOT NULL,
+                payload_hash BYTEA NOT NULL,
                 raw_payload JSONB,
                 created_at TIMESTAMPTZ,
                 updated_at TIMESTAMPTZ,
@@ -92,6 +92,10 @@ async def setup_db(postgres_container):
                 usd_summa DECIMAL
             )
         """)
+        # Staging as the migrations leave it: partitioned, with the audit trigger and marts views
+        await conn.execute("CREATE SCHEMA IF NOT EXISTS marts")
+        for revision in ("e7f1a2b3c4d5", "7a8b9c0d1e2f", "e25d6e7f8091", "f36e7f8091a2", "a47f8091a2b3"):
+            await _apply_migration(conn, revision)
     finally:
         await conn.close()
 
@@ -107,7 +111,7 @@ async def test_full_elt_flow(setup_db):
     # 1. Insert into raw.data
     conn = await asyncpg.connect(setup_db)
     payload = {"Date": "25.12.2023", "Client": "Integration Test Client", "Total RUB": "1000.50", "Type": "Income"}
-    payload_hash_val = "test_hash_123"
+    payload_hash_val = b"test_hash_123456"
     await conn.execute(
         "INSERT INTO raw.data (id, source, payload, payload_hash) VALUES ($1, $2, $3, $4)",
         "test_id_1", "test_source", json.dumps(payload), payload_hash_val
@@ -142,3 +146,272 @@ async def test_full_elt_flow(setup_db):
     finally:
         await close_db_pool()
         await conn.close()
+
+
+async def _apply_migration(conn, module_name):
+    """Выполняет SQL из upgrade() миграции alembic на тестовой базе."""
+    import importlib.util
+    from pathlib import Path
+    from unittest.mock import patch
+
+    from alembic import op
+
+    path = next((Path(__file__).parents[2] / "alembic" / "versions").glob(f"{module_name}_*.py"))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    statements = []
+    with patch.object(op, "execute", statements.append, create=True):
+        module.upgrade()
+    for sql in statements:
+        await conn.execute(sql)
+
+
+@pytest.mark.asyncio
+async def test_job_queue_skip_locked(setup_db):
+    """Параллельные воркеры захватывают разные задания; задание с истекшей арендой захватывается снова."""
+    from src import jobs
+
+    conn = await asyncpg.connect(setup_db)
+    await _apply_migration(conn, "bf2a3b4c5d6e")
+    for i in range(5):
+        await conn.execute(
+            "INSERT INTO raw.data (id, source, payload, payload_hash) VALUES ($1, 'queue_src', '{}', $2)",
+            f"q{i}", f"queue_hash_{i:05d}".encode(),
+        )
+
+    await init_db_pool()
+    try:
+        assert await jobs.enqueue_changed("queue_src", "live", 2) == 3
+        # Rows already held by open jobs are not enqueued twice
+        assert await jobs.enqueue_changed("queue_src", "live", 2) == 0
+
+        claimed = await asyncio.gather(*(jobs.claim_job(f"w{i}", 300, 3) for i in range(4)))
+        held = [job for job in claimed if job is not None]
+        assert len(held) == 3
+        assert sorted(rid for job in held for rid in job.raw_ids) == [f"q{i}" for i in range(5)]
+
+        # Simulate a crashed worker: its lease expires and another worker takes the job
+        await conn.execute(
+            "UPDATE etl.jobs SET lease_expires_at = now() - interval '1 second' WHERE id = $1", held[0].id
+        )
+        reclaimed = await jobs.claim_job("w9", 300, 3)
+        assert reclaimed.id == held[0].id and reclaimed.attempts == 2
+        assert not await jobs.extend_lease(held[0], "w0", 300)
+
+        await jobs.complete_job(reclaimed, "w9", 2, 0)
+        status = await conn.fetchval("SELECT status FROM etl.jobs WHERE id = $1", reclaimed.id)
+        assert status == "done"
+    finally:
+        await close_db_pool()
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_raw_data_notify_trigger(setup_db):
+    """Вставка в raw.data шлет raw_data_changed с id; обновление без смены payload_hash — нет."""
+    conn = await asyncpg.connect(setup_db)
+    listener = await asyncpg.connect(setup_db)
+    await _apply_migration(conn, "c03b4c5d6e7f")
+    received = asyncio.Queue()
+    await listener.add_listener("raw_data_changed", lambda *args: received.put_nowait(json.loads(args[-1])))
+    try:
+        await conn.executemany(
+            "INSERT INTO raw.data (id, source, payload, payload_hash) VALUES ($1, 'notify_src', '{}', $2)",
+            [(f"n{i}", f"notify_hash_{i:04d}".encode()) for i in range(120)],
+        )
+        ids = []
+        while len(ids) < 120:
+            message = await asyncio.wait_for(received.get(), 5)
+            assert message["source"] == "notify_src"
+            ids += message["ids"]
+        assert sorted(ids) == sorted(f"n{i}" for i in range(120))
+
+        await conn.execute("UPDATE raw.data SET extracted_at = now() WHERE source = 'notify_src'")
+        await conn.execute("UPDATE raw.data SET payload_hash = 'changed_hash_0001' WHERE id = 'n1'")
+        message = await asyncio.wait_for(received.get(), 5)
+        assert message == {"source": "notify_src", "ids": ["n1"]}
+    finally:
+        await listener.close()
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_raw_data_partition_migration(setup_db):
+    """Строки переносятся из raw.data_legacy пачками; перезагруженный до переноса id берет новую версию."""
+    import main
+    from src.partitions import move_legacy_raw
+
+    conn = await asyncpg.connect(setup_db)
+    for i in range(3):
+        await conn.execute(
+            "INSERT INTO raw.data (id, source, payload, payload_hash) VALUES ($1, 'part_src', '{\"v\": 1}', $2)",
+            f"p{i}", f"part_hash_{i:06d}".encode(),
+        )
+    await _apply_migration(conn, "d14c5d6e7f80")
+
+    await init_db_pool()
+    try:
+        await main.load_raw("part_src", [{"id": "p0", "payload": {"v": 2}}, {"id": "p9", "payload": {"v": 2}}])
+        # A second plain load keeps the first version
+        await main.load_raw("part_src", [{"id": "p9", "payload": {"v": 3}}])
+        moved = await move_legacy_raw(2, drop_legacy=True)
+
+        assert moved >= 3
+        assert await conn.fetchval("SELECT to_regclass('raw.data_legacy')") is None
+        rows = await conn.fetch("SELECT id, payload->>'v' AS v FROM raw.data WHERE source = 'part_src' ORDER BY id")
+        assert [(r["id"], r["v"]) for r in rows] == [("p0", "2"), ("p1", "1"), ("p2", "1"), ("p9", "2")]
+
+        plan = "\n".join(r[0] for r in await conn.fetch("EXPLAIN SELECT id FROM raw.data WHERE source = 'part_src'"))
+        assert "data_part_src_" in plan
+        assert "data_notify_src_" not in plan
+    finally:
+        await close_db_pool()
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_staging_partitioned_upsert(setup_db):
+    """Смена даты переносит строку в другую партицию без дубля raw_id и попадает в аудит."""
+    conn = await asyncpg.connect(setup_db)
+    payload = {"Date": "10.03.2022", "Client": "Partition Client", "Total RUB": "10", "Type": "Income"}
+    received = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    await init_db_pool()
+    try:
+        first = normalize_record("part_1", 1, received, payload, source_type="live")
+        assert await upsert_staging_records_batch([first]) == 1
+        # Same key again: plain ON CONFLICT update
+        assert await upsert_staging_records_batch([first]) == 1
+
+        moved = normalize_record("part_1", 1, received, {**payload, "Date": "10.03.2024"}, source_type="live")
+        moved["payload_hash"] = b"part_hash_moved1"
+        assert await upsert_staging_records_batch([moved]) == 1
+
+        rows = await conn.fetch(
+            "SELECT tableoid::regclass::text AS partition, date FROM staging.records WHERE raw_id = 'part_1'"
+        )
+        assert len(rows) == 1
+        assert rows[0]["partition"].endswith("_2024")
+        assert await conn.fetchval("SELECT count(*) FROM audit.logs WHERE record_id = 'part_1'") == 1
+
+        plan = "\n".join(
+            r[0] for r in await conn.fetch(
+                "EXPLAIN SELECT * FROM marts.web_transactions_v WHERE source_type = 'live' AND date >= '2024-01-01'"
+            )
+        )
+        assert "_2024" in plan and "_2022" not in plan
+    finally:
+        await close_db_pool()
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_staging_concurrent_date_change(setup_db):
+    """Два писателя с разной датой одного raw_id: второй ждет первого и переносит его строку, а не вставляет дубль."""
+    from src.partitions import ensure_staging_partitions
+    from src.transform import _lock_raw_ids, _prepare_staging_rows, _staging_writer
+
+    conn = await asyncpg.connect(setup_db)
+    received = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    payload = {"Date": "01.04.2022", "Client": "Race Client", "Total RUB": "3", "Type": "Income"}
+    first = _prepare_staging_rows([normalize_record("race_1", 1, received, payload, source_type="live")])
+    second = normalize_record("race_1", 1, received, {**payload, "Date": "01.04.2023"}, source_type="live")
+    second["payload_hash"] = b"race_hash_second"
+
+    await init_db_pool()
+    try:
+        await ensure_staging_partitions(conn, {("live", 2022), ("live", 2023)})
+        tx = conn.transaction()
+        await tx.start()
+        await _lock_raw_ids(conn, first)
+        await _staging_writer(conn)(first)
+
+        # The other writer cannot see the uncommitted row yet; without the lock it would insert a second one
+        other = asyncio.create_task(upsert_staging_records_batch([second]))
+        await asyncio.sleep(0.5)
+        assert not other.done()
+        await tx.commit()
+        assert await asyncio.wait_for(other, 10) == 1
+
+        rows = await conn.fetch("SELECT date FROM staging.records WHERE raw_id = 'race_1'")
+        assert [r["date"].year for r in rows] == [2023]
+    finally:
+        await close_db_pool()
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_read_api_keyset_pages(setup_db):
+    """Страницы /v1/transactions по (date, raw_id) не теряют и не повторяют строки с одинаковой датой."""
+    from src.read_api import transactions_query
+
+    conn = await asyncpg.connect(setup_db)
+    received = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    records = [
+        normalize_record(
+            f"keyset_{i}", i, received, {"Date": "01.02.2023", "Client": "K", "Total RUB": "1"}, source_type="keyset"
+        )
+        for i in range(5)
+    ]
+    await init_db_pool()
+    try:
+        assert await upsert_staging_records_batch(records) == 5
+        seen = []
+        page = await conn.fetch(transactions_query(True, False), "keyset", 2)
+        while page:
+            seen += [r["raw_id"] for r in page]
+            last = page[-1]
+            page = await conn.fetch(transactions_query(True, True), "keyset", last["date"], last["raw_id"], 2)
+        assert seen == [f"keyset_{i}" for i in range(4, -1, -1)]
+    finally:
+        await close_db_pool()
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_read_api_undated_page_uses_index(setup_db):
+    """Страница строк без даты читается по idx_staging_undated_raw_id, без сортировки всех таких строк."""
+    from src.read_api import transactions_query
+
+    conn = await asyncpg.connect(setup_db)
+    try:
+        # The test table is tiny, so steer the planner away from a sequential scan + sort
+        await conn.execute("SET enable_seqscan = off")
+        await conn.execute("SET enable_sort = off")
+        plan = await conn.fetch("EXPLAIN (COSTS OFF) " + transactions_query(True, True, dated=False), "live", "z", 50)
+        nodes = [r[0].strip().removeprefix("->").strip() for r in plan]
+        assert "Sort" not in nodes, nodes
+        # Partitions name their copy of the index <partition>_raw_id_idx; the unique key is *_date_key
+        assert any("_raw_id_idx on" in node and "date_raw_id" not in node for node in nodes), nodes
+    finally:
+        await conn.close()
+
+
+@pytest.mark.asyncio
+async def test_pooler_mode_unnest_upsert(setup_db, monkeypatch):
+    """DB_POOLER_MODE=transaction: пачка пишется одним unnest-запросом с теми же правилами переноса даты."""
+    monkeypatch.setattr(settings, "DB_POOLER_MODE", "transaction")
+    conn = await asyncpg.connect(setup_db)
+    received = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    payload = {"Date": "05.06.2022", "Client": "Pooler Client", "Total RUB": "7", "Type": "Income"}
+
+    await init_db_pool()
+    try:
+        first = normalize_record("pool_1", 1, received, payload, source_type="live")
+        second = normalize_record("pool_2", 2, received, payload, source_type="live")
+        assert await upsert_staging_records_batch([first, second]) == 2
+
+        moved = normalize_record("pool_1", 1, received, {**payload, "Date": "05.06.2024"}, source_type="live")
+        moved["payload_hash"] = b"pool_hash_moved1"
+        assert await upsert_staging_records_batch([moved, second]) == 2
+
+        rows = await conn.fetch(
+            "SELECT raw_id, date, raw_payload FROM staging.records WHERE raw_id LIKE 'pool_%' ORDER BY raw_id"
+        )
+        assert [r["raw_id"] for r in rows] == ["pool_1", "pool_2"]
+        assert rows[0]["date"].year == 2024
+        assert json.loads(rows[1]["raw_payload"])["Client"] == "Pooler Client"
+    finally:
+        await close_db_pool()
+        await conn.close()
@@ -0,0 +1,127 @@
+"""Tests for the Parquet archive stage."""
+
+import asyncio
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pyarrow.parquet as pq
+import pytest
+
+from src.archive import (
+    archive_records,
+    cancel_archive_task,
+    start_archive_task,
+    wait_archive_task,
+    write_parquet_archive,
+)
+
+RECORDS = [
+    {"Дата": "16.07.2023", "Клиент": 'АО "Первая компания"', "РУБ Сумма": "195103,50"},
+    {"Дата": "01.08.2023", "Клиент": "ИП Иванов", "РУБ Сумма": "50000,00"},
+    {"Дата": "02.08.2023", "Клиент": None, "РУБ Сумма": 10},
+]
+
+
+class TestWriteParquetArchive:
+    """Test streaming Parquet writer."""
+
+    def test_roundtrip(self, tmp_path):
+        """Records are written batch by batch and read back unchanged (as strings)."""
+        path = tmp_path / "out" / "archive.parquet"
+        size = write_parquet_archive(RECORDS, path, metadata={"spreadsheet_id": "abc"}, batch_rows=2)
+
+        assert size == path.stat().st_size
+        table = pq.read_table(path)
+        assert table.column_names == ["Дата", "Клиент", "РУБ Сумма"]
+        rows = table.to_pylist()
+        assert rows[0] == RECORDS[0]
+        assert rows[2]["Клиент"] is None
+        assert rows[2]["РУБ Сумма"] == "10"
+        assert table.schema.metadata[b"spreadsheet_id"] == b"abc"
+
+    def test_zstd_compression(self, tmp_path):
+        """Archive columns are compressed with zstd."""
+        path = tmp_path / "archive.parquet"
+        write_parquet_archive(RECORDS, path)
+
+        meta = pq.ParquetFile(path).metadata
+        assert meta.row_group(0).column(0).compression == "ZSTD"
+        assert not path.with_suffix(".parquet.tmp").exists()
+
+
+@pytest.mark.asyncio
+async def test_archive_records_uploads_file_path(tmp_path):
+    """Upload receives the file path so it can stream from disk."""
+    with patch("src.archive.upload_to_supabase_storage", new_callable=AsyncMock) as mock_upload:
+        out_path = await archive_records(RECORDS, "sheet_id", tmp_path, "Sheet1!A:AF")
+
+    assert out_path is not None and out_path.exists()
+    assert out_path.parent.name.startswith("dt=")
+    args = mock_upload.call_args[0]
+    assert args[0] == "archives"
+    assert isinstance(args[2], Path)
+
+
+@pytest.mark.asyncio
+class TestBackgroundArchive:
+    """Test supervised background archiving."""
+
+    @pytest.fixture(autouse=True)
+    def _storage(self):
+        with patch("src.archive.storage_configured", return_value=True):
+            yield
+
+    async def test_upload_failure_is_reported(self, tmp_path):
+        """Storage errors are captured in the outcome instead of raising."""
+        with patch("src.archive.upload_to_supabase_storage", side_effect=RuntimeError("boom")):
+            task = start_archive_task(RECORDS, "sheet_id", tmp_path)
+            outcome = await wait_archive_task(task, timeout=5)
+
+        assert not outcome.ok
+        assert "RuntimeError: boom" in outcome.error
+
+    async def test_timeout_cancels_task(self, tmp_path):
+        """A hung upload is cancelled after the timeout and reported."""
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        with patch("src.archive.upload_to_supabase_storage", side_effect=hang):
+            task = start_archive_task(RECORDS, "sheet_id", tmp_path)
+            outcome = await wait_archive_task(task, timeout=0.2)
+
+        assert not outcome.ok
+        assert "timeout" in outcome.error
+        assert task.cancelled()
+
+    async def test_success(self, tmp_path):
+        """Successful archive reports the written path."""
+        with patch("src.archive.upload_to_supabase_storage", new_callable=AsyncMock):
+            outcome = await wait_archive_task(start_archive_task(RECORDS, "sheet_id", tmp_path), timeout=5)
+
+        assert outcome.ok
+        assert outcome.path is not None and outcome.path.exists()
+        assert outcome.uploaded
+
+    async def test_no_storage_is_skipped(self, tmp_path):
+        """Without storage settings the file stays local and the outcome is not an error."""
+        with (
+            patch("src.archive.storage_configured", return_value=False),
+            patch("src.archive.upload_to_supabase_storage", new_callable=AsyncMock) as upload,
+        ):
+            outcome = await wait_archive_task(start_archive_task(RECORDS, "sheet_id", tmp_path), timeout=5)
+
+        upload.assert_not_awaited()
+        assert outcome.ok and not outcome.uploaded
+        assert outcome.path is not None and outcome.path.exists()
+
+    async def test_cancel(self, tmp_path):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        with patch("src.archive.upload_to_supabase_storage", side_effect=hang):
+            task = start_archive_task(RECORDS, "sheet_id", tmp_path)
+            await asyncio.sleep(0.1)
+            await asyncio.wait_for(cancel_archive_task(task), 1)
+
+        assert task.cancelled()
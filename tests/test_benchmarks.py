@@ -0,0 +1,61 @@
+"""Sanity tests for the benchmark payload generator and report comparison."""
+
+from datetime import datetime
+
+from benchmarks.payloads import generate_payloads
+from benchmarks.runner import Case, compare, run_cases
+from src.transform import normalize_record
+
+
+def test_generated_payloads_normalize():
+    """Synthetic rows exercise the real aliases and parsers."""
+    payloads = generate_payloads(50)
+
+    assert payloads == generate_payloads(50)  # deterministic
+    assert any("Клиент" in p for p in payloads)
+    assert any("Client" in p for p in payloads)
+    for i, payload in enumerate(payloads):
+        record = normalize_record(i, i, datetime(2024, 1, 1), payload)
+        assert record["date"] is not None
+        assert record["year"] == record["date"].year
+
+
+def test_compare_flags_regressions():
+    report = run_cases([Case("noop", lambda: sum(range(1000)), 1)], repeat=1)
+    baseline = {"results": {"noop": {"ns_per_op_min": report["results"]["noop"]["ns_per_op_min"] / 10}}}
+
+    assert compare(report, baseline, max_ratio=1.2)
+    assert not compare(report, {"results": {}}, max_ratio=1.2)
+
+
+def test_hash_cases_cover_all_algorithms():
+    from benchmarks.bench_hash import build_cases
+    from src.utils import HASH_FUNCTIONS
+
+    report = run_cases(build_cases(10), repeat=1)
+    assert {f"digest_{name}" for name in HASH_FUNCTIONS} <= set(report["results"])
+
+
+def test_partition_plan_counts_only_executed_scans():
+    from benchmarks.bench_raw_partitions import _scanned_relations
+
+    plan = {
+        "Node Type": "Append",
+        "Subplans Removed": 40,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Relation Name": "bench_raw_part_s1_m0", "Actual Loops": 1},
+            {"Node Type": "Index Scan", "Relation Name": "bench_raw_part_s1_m1", "Actual Loops": 0},
+        ],
+    }
+    assert _scanned_relations(plan) == {"bench_raw_part_s1_m0"}
+
+
+def test_pooler_rows_fit_both_writers():
+    from benchmarks.bench_pooler import _build_rows
+    from src.models import STAGING_FIELDS
+    from src.transform import _staging_columns
+
+    rows = _build_rows(20)
+    assert len(rows) == 20
+    columns = _staging_columns(rows)
+    assert len(columns) == len(STAGING_FIELDS) and all(len(c) == 20 for c in columns)
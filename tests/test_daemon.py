@@ -0,0 +1,162 @@
+"""Tests for serve mode: notification batching and the LISTEN loop."""
+
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.daemon import CHANNEL, ChangeBatcher, parse_notification, serve
+
+
+def _payload(source, ids):
+    return json.dumps({"source": source, "ids": ids})
+
+
+def test_parse_notification():
+    assert parse_notification(_payload("google_sheets", ["a", 1])) == ("google_sheets", ["a", "1"])
+    with pytest.raises(KeyError):
+        parse_notification('{"ids": []}')
+
+
+class TestChangeBatcher:
+    """Notifications are coalesced into micro-batches."""
+
+    async def test_debounce_merges_and_dedupes(self):
+        batcher = ChangeBatcher(debounce=0.05, max_wait=1.0, max_batch=100)
+
+        async def feed():
+            batcher.add("s", ["a", "b"])
+            await asyncio.sleep(0.02)
+            batcher.add("s", ["b", "c"])
+            batcher.add("t", ["x"])
+
+        start = time.monotonic()
+        _, batch = await asyncio.gather(feed(), batcher.next_batch())
+        assert batch == {"s": ["a", "b", "c"], "t": ["x"]}
+        assert time.monotonic() - start >= 0.06  # waited for silence after the last notification
+        assert len(batcher) == 0
+
+    async def test_max_batch_flushes_immediately(self):
+        batcher = ChangeBatcher(debounce=10, max_wait=10, max_batch=3)
+        batcher.add("s", ["a", "b", "c"])
+        batch = await asyncio.wait_for(batcher.next_batch(), 0.1)
+        assert batch == {"s": ["a", "b", "c"]}
+
+    async def test_max_wait_under_steady_stream(self):
+        batcher = ChangeBatcher(debounce=0.05, max_wait=0.1, max_batch=10_000)
+
+        async def stream():
+            for i in range(30):
+                batcher.add("s", [str(i)])
+                await asyncio.sleep(0.01)
+
+        feeder = asyncio.create_task(stream())
+        start = time.monotonic()
+        batch = await batcher.next_batch()
+        assert time.monotonic() - start < 0.2
+        assert 0 < len(batch["s"]) < 30
+        await feeder
+
+
+class _FakeListener:
+    def __init__(self):
+        self.closed = False
+        self.on_terminate = None
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class TestServe:
+    """serve feeds LISTEN payloads to process(), catches up after each connect and drains on stop."""
+
+    async def test_notifications_processed_and_drained_on_stop(self):
+        processed = []
+        listeners = []
+        callbacks = []
+
+        async def connect(channel, callback):
+            assert channel == CHANNEL
+            callbacks.append(callback)
+            listeners.append(_FakeListener())
+            return listeners[-1]
+
+        async def process(source, ids):
+            processed.append((source, ids))
+
+        stop = asyncio.Event()
+        catch_up = AsyncMock()
+        batcher = ChangeBatcher(debounce=0.01, max_wait=1.0, max_batch=100)
+
+        with patch("src.daemon.connect_listener", side_effect=connect):
+            task = asyncio.create_task(serve(process, stop, batcher, catch_up))
+            await asyncio.sleep(0.01)
+            callbacks[-1](None, 1, CHANNEL, _payload("s", ["a", "b"]))
+            callbacks[-1](None, 1, CHANNEL, "not json")
+            await asyncio.sleep(0.05)
+            # Arrives right before stop: processed during shutdown without waiting for debounce
+            batcher.debounce = 10
+            callbacks[-1](None, 1, CHANNEL, _payload("s", ["c"]))
+            stop.set()
+            await asyncio.wait_for(task, 1)
+
+        assert processed == [("s", ["a", "b"]), ("s", ["c"])]
+        catch_up.assert_awaited_once()
+        assert listeners[-1].closed
+
+    async def test_reconnects_and_catches_up_again(self):
+        listeners = []
+
+        async def connect(channel, callback):
+            if len(listeners) == 1:
+                listeners.append(None)
+                raise ConnectionRefusedError("db restarting")
+            listeners.append(_FakeListener())
+            return listeners[-1]
+
+        stop = asyncio.Event()
+        catch_up = AsyncMock()
+        batcher = ChangeBatcher(debounce=0.01, max_wait=1.0, max_batch=100)
+
+        with (
+            patch("src.daemon.connect_listener", side_effect=connect),
+            patch("src.daemon.RECONNECT_MIN_SECONDS", 0.01),
+        ):
+            task = asyncio.create_task(serve(AsyncMock(), stop, batcher, catch_up))
+            await asyncio.sleep(0.01)
+            listeners[0].on_terminate(listeners[0])
+            await asyncio.sleep(0.05)
+            stop.set()
+            await asyncio.wait_for(task, 1)
+
+        assert len(listeners) == 3
+        assert catch_up.await_count == 2
+
+
+async def test_run_serve_routes_by_source():
+    import main
+    from src.sources import SourceSpec
+
+    async def fake_serve(process, stop, batcher, catch_up):
+        await process("google_sheets", ["r1"])
+        await process("unknown", ["x"])
+        assert catch_up is None
+
+    with (
+        patch("main.init_db_pool", AsyncMock()),
+        patch("main.close_db_pool", AsyncMock()),
+        patch("main._export_metrics", AsyncMock()),
+        patch("src.daemon.serve", side_effect=fake_serve),
+        patch("main._process_changed_ids", AsyncMock(return_value=1)) as process_ids,
+    ):
+        await main.run_serve([SourceSpec("google_sheets", "live")], catch_up=False)
+
+    process_ids.assert_awaited_once_with(SourceSpec("google_sheets", "live"), ["r1"])
@@ -23,3 +23,13 @@ async def test_connection():
 
 if __name__ == "__main__":
     asyncio.run(test_connection())
+
+
+def test_pooler_mode_disables_statement_cache():
+    from unittest.mock import patch
+
+    from src.db import _connect_kwargs
+
+    assert _connect_kwargs() == {}
+    with patch.object(settings, "DB_POOLER_MODE", "transaction"):
+        assert _connect_kwargs() == {"statement_cache_size": 0}
@@ -0,0 +1,199 @@
+"""Tests for the ingestion manifest and the ingest command."""
+
+import asyncio
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.sheets import fetch_google_sheets, range_column_count
+from src.sources import SheetEntry, SourceSpec, load_manifest
+
+MANIFEST = Path(__file__).resolve().parent.parent / "configs" / "ingest.toml"
+
+
+@pytest.mark.parametrize(
+    "range_name, expected",
+    [
+        ("Sheet1!A:AF", 32),
+        ("'My tab'!B2:H100", 7),
+        ("Data!$A$1:$Z", 26),
+        ("A1:C", 3),
+        ("Sheet1", None),
+        ("Tab!1:5", None),
+    ],
+)
+def test_range_column_count(range_name, expected):
+    assert range_column_count(range_name) == expected
+
+
+@pytest.mark.parametrize(
+    "range_name, expected_keys",
+    [
+        ("Tab!A:C", ["a", "b", "c"]),  # narrower than A:AF, long rows are cut to the range
+        ("Tab", ["a", "b", "c", "d"]),  # whole sheet: header row defines the width
+    ],
+)
+async def test_fetch_width_follows_range(range_name, expected_keys):
+    response = MagicMock()
+    response.json = AsyncMock(return_value={"values": [["a", "b", "c", "d"], ["1", "2", "3", "4", "5"]]})
+    with (
+        patch("aiohttp.ClientSession.get") as get,
+        patch("src.sheets.get_google_access_token", return_value="token"),
+    ):
+        get.return_value.__aenter__.return_value = response
+        records = await fetch_google_sheets.retry_with(stop=lambda _: True)("sid", range_name)
+
+    assert list(records[0]) == expected_keys
+
+
+class TestManifest:
+    """[[sheets]] entries in configs/*.toml."""
+
+    def test_shipped_manifest_parses(self):
+        entries, max_parallel = load_manifest(MANIFEST)
+        assert entries[0].id_columns == ("id",)
+        assert {e.source_type for e in entries} == {"live", "static", "ref"}
+        assert max_parallel == 3
+
+    def test_defaults_and_single_id_column(self, tmp_path):
+        path = tmp_path / "m.toml"
+        path.write_text('[[sheets]]\nspreadsheet_id = "s1"\nid_columns = "Row"\n')
+        entries, max_parallel = load_manifest(path)
+        assert entries == [SheetEntry("s1", "Sheet1!A:AF", "google_sheets", "live", ("Row",))]
+        assert max_parallel is None
+
+    @pytest.mark.parametrize(
+        "text",
+        [
+            "",
+            '[[sheets]]\nrange = "A:B"\n',
+            '[[sheets]]\nspreadsheet_id = "s"\nsheet = "typo"\n',
+            '[[sheets]]\nspreadsheet_id = "s"\n[[sheets]]\nspreadsheet_id = "s"\n',
+        ],
+    )
+    def test_invalid(self, tmp_path, text):
+        path = tmp_path / "m.toml"
+        path.write_text(text)
+        with pytest.raises(ValueError):
+            load_manifest(path)
+
+
+class TestRawIds:
+    """raw.data ids from configured id_columns."""
+
+    def test_composite_id(self):
+        from main import _prepare_raw_rows
+
+        rows = _prepare_raw_rows(
+            [{"Year": "2023", "No": "7", "x": "a"}, {"Year": "2023", "No": "", "x": "b"}], ("Year", "No")
+        )
+        assert rows[0]["id"] == "2023:7"
+        assert rows[1]["id"].startswith("gsheet_auto_")  # empty id part falls back to the content hash
+
+    def test_missing_column(self):
+        from main import _prepare_raw_rows
+
+        with pytest.raises(ValueError, match="Nope"):
+            _prepare_raw_rows([{"id": "1"}], ("Nope",))
+
+
+class TestRunIngest:
+    """ingest loads changed ranges in parallel, skips unchanged ones and can chain ELT."""
+
+    def _manifest(self, tmp_path, count):
+        text = "max_parallel = 2\n" + "".join(
+            f'[[sheets]]\nspreadsheet_id = "s{i}"\nsource = "src{i}"\nsource_type = "static"\n' for i in range(count)
+        )
+        path = tmp_path / "ingest.toml"
+        path.write_text(text)
+        return path
+
+    async def test_skip_unchanged_and_run_elt(self, tmp_path):
+        import main
+        from src.utils import hash_bytes
+
+        sheets = {"s0": [{"id": "a", "v": "1"}], "s1": [{"id": "b", "v": "2"}], "s2": [{"id": "c", "v": "3"}]}
+        running = peak = 0
+
+        async def fetch(spreadsheet_id, range_name, columns=None):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return sheets[spreadsheet_id]
+
+        unchanged = main._prepare_raw_rows(sheets["s0"])
+        stored = {"s0": hash_bytes(unchanged[0]["payload_hash"])}
+
+        with (
+            patch("main.init_db_pool", AsyncMock()),
+            patch("main.close_db_pool", AsyncMock()),
+            patch("main._export_metrics", AsyncMock()),
+            patch("src.sheets.fetch_google_sheets", side_effect=fetch),
+            patch("src.archive.start_archive_task", return_value=None),
+            patch("main.get_ingest_hash", AsyncMock(side_effect=lambda e: stored.get(e.spreadsheet_id))),
+            patch("main.save_ingest_hash", AsyncMock()) as save,
+            patch("main.load_raw", AsyncMock()) as load_raw,
+            patch("main._process_sources", AsyncMock(return_value=[])) as elt,
+        ):
+            results = await main.run_ingest(str(self._manifest(tmp_path, 3)), run_elt=True)
+
+        assert [r["status"] for r in results] == ["unchanged", "ok", "ok"]
+        assert sorted(c.args[0] for c in load_raw.await_args_list) == ["src1", "src2"]
+        assert save.await_count == 2
+        assert peak == 2
+        elt.assert_awaited_once_with([SourceSpec("src1", "static"), SourceSpec("src2", "static")])
+
+    async def test_failed_range_does_not_stop_others(self, tmp_path):
+        import main
+
+        async def fetch(spreadsheet_id, range_name, columns=None):
+            if spreadsheet_id == "s0":
+                raise RuntimeError("quota")
+            return [{"id": "x"}]
+
+        with (
+            patch("main.init_db_pool", AsyncMock()),
+            patch("main.close_db_pool", AsyncMock()),
+            patch("main._export_metrics", AsyncMock()),
+            patch("src.sheets.fetch_google_sheets", side_effect=fetch),
+            patch("src.archive.start_archive_task", return_value=None),
+            patch("main.get_ingest_hash", AsyncMock(return_value=None)),
+            patch("main.save_ingest_hash", AsyncMock()),
+            patch("main.load_raw", AsyncMock()) as load_raw,
+            pytest.raises(RuntimeError, match="s0"),
+        ):
+            await main.run_ingest(str(self._manifest(tmp_path, 2)), force=True)
+
+        load_raw.assert_awaited_once()
+
+
+async def test_failed_load_cancels_archive():
+    """A raw load error is raised at once instead of after waiting ARCHIVE_TIMEOUT for the archive."""
+    import main
+
+    archive = asyncio.Event()
+
+    async def hang():
+        await archive.wait()
+
+    task = None
+
+    def start(*args, **kwargs):
+        nonlocal task
+        task = asyncio.create_task(hang())
+        return task
+
+    entry = SheetEntry(spreadsheet_id="s0", source="src0")
+    with (
+        patch("src.sheets.fetch_google_sheets", AsyncMock(return_value=[{"id": "x"}])),
+        patch("src.archive.start_archive_task", side_effect=start),
+        patch("main.load_raw", AsyncMock(side_effect=RuntimeError("db down"))),
+        patch.object(main.settings, "ARCHIVE_TIMEOUT", 30),
+        pytest.raises(RuntimeError, match="db down"),
+    ):
+        await asyncio.wait_for(main._load_sheet(entry), 5)
+
+    assert task.cancelled()
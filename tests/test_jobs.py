@@ -0,0 +1,184 @@
+"""Tests for the etl.jobs work queue and the worker loop."""
+
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import jobs
+from src.jobs import Job
+
+JOB = Job(7, "google_sheets", "live", ["r1", "r2"], 1)
+
+
+class TestQueueSql:
+    """Claims must never block on or double-claim rows held by other workers."""
+
+    def test_claim_skips_locked(self):
+        assert "FOR UPDATE SKIP LOCKED" in jobs._CLAIM_SQL
+        assert "lease_expires_at < now()" in jobs._CLAIM_SQL
+
+    async def test_claim_maps_row(self):
+        row = {"id": 7, "source": "google_sheets", "source_type": "live", "raw_ids": ["r1", "r2"], "attempts": 1}
+        with patch("src.jobs.fetch", AsyncMock(return_value=[row])) as fetch:
+            assert await jobs.claim_job("host:1:0", 300, 3) == JOB
+        assert fetch.call_args.args[1:] == ("host:1:0", 300.0, 3, None)
+
+    async def test_claim_empty_queue(self):
+        with patch("src.jobs.fetch", AsyncMock(return_value=[])):
+            assert await jobs.claim_job("w", 300, 3) is None
+
+    @pytest.mark.parametrize("status, expected", [("UPDATE 1", True), ("UPDATE 0", False)])
+    async def test_extend_lease(self, status, expected):
+        with patch("src.jobs.execute", AsyncMock(return_value=status)):
+            assert await jobs.extend_lease(JOB, "w", 300) is expected
+
+
+class TestProcessJob:
+    """A claimed job is normalized, upserted and completed; errors hand it back to the queue."""
+
+    def _raw(self):
+        return [
+            {"raw_id": rid, "received_at": datetime(2024, 1, 1), "raw_payload": {"Client": "c"}, "payload_hash": None}
+            for rid in JOB.raw_ids
+        ]
+
+    async def test_completes(self):
+        import main
+
+        with (
+            patch("main.get_raw_records_by_ids", AsyncMock(return_value=self._raw())) as get_raw,
+            patch("main.upsert_staging_records_batch", AsyncMock(return_value=2)),
+            patch("main.complete_job", AsyncMock()) as complete,
+            patch("main.fail_job", AsyncMock()) as fail,
+            patch("main.extend_lease", AsyncMock(return_value=True)),
+        ):
+            result = await main._process_job(JOB, "w")
+
+        get_raw.assert_awaited_once_with(["r1", "r2"], "google_sheets")
+        complete.assert_awaited_once_with(JOB, "w", 2, 0)
+        fail.assert_not_awaited()
+        assert result["upserted"] == 2
+
+    async def test_failure_returns_job(self):
+        import main
+
+        with (
+            patch("main.get_raw_records_by_ids", AsyncMock(side_effect=ConnectionError("down"))),
+            patch("main.complete_job", AsyncMock()) as complete,
+            patch("main.fail_job", AsyncMock()) as fail,
+            patch("main.extend_lease", AsyncMock(return_value=True)),
+        ):
+            result = await main._process_job(JOB, "w")
+
+        complete.assert_not_awaited()
+        assert fail.call_args.args[:2] == (JOB, "w")
+        assert result["failed"] == 1
+
+    async def test_lease_renewed_while_running(self):
+        import main
+
+        async def slow_upsert(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return 2
+
+        with (
+            patch.object(main.settings, "JOB_LEASE_SECONDS", 0.03),
+            patch("main.get_raw_records_by_ids", AsyncMock(return_value=self._raw())),
+            patch("main.upsert_staging_records_batch", side_effect=slow_upsert),
+            patch("main.complete_job", AsyncMock()),
+            patch("main.extend_lease", AsyncMock(return_value=True)) as extend,
+        ):
+            await main._process_job(JOB, "w")
+
+        assert extend.await_count >= 2
+
+    async def test_lost_lease_cancels_job(self):
+        import main
+
+        async def slow_upsert(*args, **kwargs):
+            await asyncio.sleep(1)
+            return 2
+
+        with (
+            patch.object(main.settings, "JOB_LEASE_SECONDS", 0.03),
+            patch("main.get_raw_records_by_ids", AsyncMock(return_value=self._raw())),
+            patch("main.upsert_staging_records_batch", side_effect=slow_upsert),
+            patch("main.complete_job", AsyncMock()) as complete,
+            patch("main.fail_job", AsyncMock()) as fail,
+            patch("main.extend_lease", AsyncMock(return_value=False)),
+        ):
+            result = await asyncio.wait_for(main._process_job(JOB, "w"), 0.5)
+
+        complete.assert_not_awaited()
+        fail.assert_not_awaited()
+        assert result["superseded"] == 1 and result["upserted"] == 0
+
+    async def test_completion_after_takeover_not_counted(self):
+        import main
+
+        with (
+            patch("main.get_raw_records_by_ids", AsyncMock(return_value=self._raw())),
+            patch("main.upsert_staging_records_batch", AsyncMock(return_value=2)),
+            patch("main.complete_job", AsyncMock(return_value=False)),
+            patch("main.extend_lease", AsyncMock(return_value=True)),
+        ):
+            result = await main._process_job(JOB, "w")
+
+        assert result["superseded"] == 1 and result["upserted"] == 0
+
+
+async def test_worker_drains_queue():
+    import main
+
+    queue = [Job(i, "s", "live", [f"r{i}"], 1) for i in range(5)]
+    claimed = []
+
+    async def claim(worker_id, lease, attempts, source):
+        if not queue:
+            return None
+        job = queue.pop(0)
+        claimed.append((worker_id, job.id))
+        return job
+
+    async def process(job, worker_id):
+        await asyncio.sleep(0.01)
+        return {"jobs": 1, "failed": 0, "superseded": 0, "upserted": 1, "rejected": 0}
+
+    with (
+        patch("main.init_db_pool", AsyncMock()),
+        patch("main.close_db_pool", AsyncMock()),
+        patch("main._export_metrics", AsyncMock()),
+        patch("main.claim_job", side_effect=claim),
+        patch("main._process_job", side_effect=process),
+    ):
+        totals = await main.run_worker(concurrency=2, drain=True)
+
+    assert totals == {"jobs": 5, "failed": 0, "superseded": 0, "upserted": 5, "rejected": 0}
+    assert sorted(job_id for _, job_id in claimed) == [0, 1, 2, 3, 4]
+    assert len({worker_id for worker_id, _ in claimed}) == 2
+
+
+async def test_worker_survives_db_errors():
+    import main
+
+    calls = []
+
+    async def claim(worker_id, lease, attempts, source):
+        calls.append(worker_id)
+        if len(calls) == 1:
+            raise ConnectionResetError("db restarting")
+        return None
+
+    with (
+        patch.object(main.settings, "WORKER_POLL_SECONDS", 0.01),
+        patch("main.init_db_pool", AsyncMock()),
+        patch("main.close_db_pool", AsyncMock()),
+        patch("main._export_metrics", AsyncMock()),
+        patch("main.claim_job", side_effect=claim),
+    ):
+        totals = await main.run_worker(concurrency=1, drain=True)
+
+    assert len(calls) == 2
+    assert totals["jobs"] == 0
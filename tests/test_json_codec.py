@@ -0,0 +1,91 @@
+"""Tests for the shared JSON codec and single-pass payload serialization."""
+
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src import utils
+from src.db import _init_connection
+from src.transform import get_changed_raw_records, normalize_record
+from src.utils import canonical_json, encode_json_param, json_dumps, json_loads, payload_hash
+
+PAYLOAD = {"Дата": "16.07.2023", "Client": "Test", "Total RUB": "1 000,50", "n": 3, "x": None, "list": [1.5, True]}
+
+
+class TestCanonicalJson:
+    """Canonical bytes are the basis for both the hash and the insert."""
+
+    def test_matches_stdlib_canonical_form(self):
+        expected = json.dumps(PAYLOAD, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        assert canonical_json(PAYLOAD) == expected.encode("utf-8")
+
+    def test_stdlib_fallback_is_identical(self, monkeypatch):
+        fast = canonical_json(PAYLOAD)
+        monkeypatch.setattr(utils, "orjson", None)
+        assert canonical_json(PAYLOAD) == fast
+        assert json_loads(fast) == PAYLOAD
+
+    def test_non_json_values_are_stringified(self):
+        assert json_loads(json_dumps({"a": Decimal("1.10")})) == {"a": "1.10"}
+
+    def test_encoder_passes_text_through(self):
+        text = '{"b":1,"a":2}'
+        assert encode_json_param(text) is text
+        assert encode_json_param(text.encode()) == text
+        assert json_loads(encode_json_param({"a": [1, 2]})) == {"a": [1, 2]}
+
+
+@pytest.mark.asyncio
+async def test_pool_connections_register_json_codecs():
+    conn = MagicMock()
+    conn.set_type_codec = AsyncMock()
+
+    await _init_connection(conn)
+
+    registered = {c.args[0]: c.kwargs for c in conn.set_type_codec.call_args_list}
+    assert set(registered) == {"json", "jsonb"}
+    assert registered["jsonb"]["encoder"] is encode_json_param
+    conn.add_query_logger.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_load_raw_hash_matches_staging_hash():
+    """raw.data.payload_hash must equal the staging hash, otherwise the anti-join never matches."""
+    import main
+
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.transaction.return_value = AsyncMock()
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+
+    with (
+        patch("main.init_db_pool", AsyncMock(return_value=pool)),
+        patch("main.ensure_raw_partitions", AsyncMock()),
+    ):
+        await main.load_raw("google_sheets", [{"id": "r1", "payload": PAYLOAD}])
+
+    _, source, ids, payloads, hashes = conn.execute.call_args.args
+    assert (source, ids) == ("google_sheets", ["r1"])
+    assert json_loads(payloads[0]) == PAYLOAD
+    assert hashes == [payload_hash(PAYLOAD)]
+
+
+@pytest.mark.asyncio
+async def test_changed_records_accept_decoded_payload():
+    rows = [{"raw_id": "r1", "received_at": datetime(2024, 1, 1), "payload": PAYLOAD, "payload_hash": b"h1"}]
+    with patch("src.transform.fetch_one_off", AsyncMock(return_value=rows)):
+        (record,) = await get_changed_raw_records()
+    assert record["raw_payload"] == PAYLOAD
+    assert record["payload_hash"] == b"h1"
+
+
+def test_normalize_reuses_raw_hash():
+    with patch("src.transform.payload_hash") as hash_func:
+        record = normalize_record("r1", None, datetime(2024, 1, 1), PAYLOAD, hash_value=b"h1")
+    hash_func.assert_not_called()
+    assert record["payload_hash"] == b"h1"
@@ -167,3 +167,270 @@ class TestUpsertWithJSONB:
         assert isinstance(raw_payload_arg, str)
         parsed = json.loads(raw_payload_arg)
         assert parsed == {"Date": "16.07.2023", "Client": "Test Client"}
+
+
+class TestStagingRows:
+    """StagingRow tuples reach executemany without per-row copies."""
+
+    def _raw(self):
+        from benchmarks.payloads import generate_payloads
+
+        return [
+            {"raw_id": i, "received_at": datetime(2024, 1, 1), "raw_payload": p}
+            for i, p in enumerate(generate_payloads(10))
+        ]
+
+    @pytest.mark.parametrize("mode", ["strict", "fast"])
+    def test_rows_match_dict_records(self, mode):
+        from src.transform import STAGING_FIELDS, _prepare_staging_rows, normalize_records
+
+        rows, _ = normalize_records(self._raw(), validation=mode, as_rows=True)
+        dicts, _ = normalize_records(self._raw(), validation=mode)
+
+        assert rows[0]._fields == tuple(STAGING_FIELDS)
+        payload_idx = STAGING_FIELDS.index("raw_payload")
+        for row, prepared in zip(rows, _prepare_staging_rows(dicts), strict=True):
+            assert row[:payload_idx] + row[payload_idx + 1 :] == prepared[:payload_idx] + prepared[payload_idx + 1 :]
+            assert json.loads(prepared[payload_idx]) == row.raw_payload
+
+    def test_rows_are_passed_through(self):
+        from src.transform import _prepare_staging_rows, normalize_records
+
+        rows, _ = normalize_records(self._raw(), as_rows=True)
+        prepared = _prepare_staging_rows(rows)
+        assert all(a is b for a, b in zip(prepared, rows, strict=True))
+
+
+class _FakeConn:
+    """Postgres-like connection: a failed statement aborts its (sub)transaction and rolls back its writes."""
+
+    def __init__(self, bad_ids, fail_with=ValueError):
+        self.bad_ids = set(bad_ids)
+        self.fail_with = fail_with
+        self.committed = []
+        self.statements = 0
+        self.locked = []
+        self._stack = []
+
+    def transaction(self):
+        conn = self
+
+        class _Tx:
+            async def __aenter__(self):
+                conn._stack.append([])
+
+            async def __aexit__(self, exc_type, exc, tb):
+                written = conn._stack.pop()
+                if exc_type is None:
+                    (conn._stack[-1] if conn._stack else conn.committed).extend(written)
+                return False
+
+        return _Tx()
+
+    async def executemany(self, sql, rows):
+        self.statements += 1
+        if any(r.raw_id in self.bad_ids for r in rows):
+            raise self.fail_with("invalid input syntax")
+        self._stack[-1].extend(r.raw_id for r in rows)
+
+    def _lock(self, sql, args):
+        from src.transform import _RAW_ID_LOCK_SQL
+
+        if sql != _RAW_ID_LOCK_SQL:
+            return False
+        assert not self._stack[-1], "raw_ids must be locked before anything is written"
+        self.locked.append(args[0])
+        return True
+
+    async def execute(self, sql, *values):
+        from src.transform import StagingRow
+
+        if not self._lock(sql, values):
+            await self.executemany(sql, [StagingRow(*values)])
+
+
+class TestBisectingRetry:
+    """A failing batch is bisected under savepoints; good rows commit, bad rows go to the sink."""
+
+    def _rows(self, count):
+        from src.transform import normalize_records
+
+        raw = [
+            {"raw_id": f"r{i}", "received_at": datetime(2024, 1, 1), "raw_payload": {"Client": "c"}}
+            for i in range(count)
+        ]
+        rows, _ = normalize_records(raw, as_rows=True)
+        return rows
+
+    def _pool(self, conn):
+        pool = MagicMock()
+        ctx = AsyncMock()
+        ctx.__aenter__.return_value = conn
+        pool.acquire.return_value = ctx
+        return pool
+
+    async def test_bad_rows_isolated(self):
+        from src.rejects import RejectSink
+
+        rows = self._rows(64)
+        conn = _FakeConn({"r5", "r40"})
+        sink = RejectSink()
+
+        with patch("src.transform.get_db_pool", return_value=self._pool(conn)):
+            result = await upsert_staging_records(rows, sink)
+
+        assert result == 62
+        assert sorted(conn.committed) == sorted(r.raw_id for r in rows if r.raw_id not in {"r5", "r40"})
+        assert sink.rejected_ids == {"r5", "r40"}
+        # 1 batch attempt + at most 2 statements per level per bad row (log2(64) = 6 levels)
+        assert conn.statements <= 1 + 2 * 2 * 6
+
+    async def test_all_good_single_statement(self):
+        conn = _FakeConn(set())
+        with patch("src.transform.get_db_pool", return_value=self._pool(conn)):
+            assert await upsert_staging_records(self._rows(10)) == 10
+        assert conn.statements == 1
+
+    async def test_connection_error_is_not_bisected(self):
+        conn = _FakeConn({"r1"}, fail_with=ConnectionResetError)
+        with patch("src.transform.get_db_pool", return_value=self._pool(conn)), pytest.raises(ConnectionResetError):
+            await upsert_staging_records(self._rows(8))
+        assert conn.statements == 1
+
+
+class TestPartitionedUpsert:
+    """staging.records is partitioned by (source_type, date): the conflict key and partition DDL follow."""
+
+    def test_conflict_key_includes_partition_columns(self):
+        from src.transform import _staging_upsert_sql
+
+        sql = _staging_upsert_sql()
+        assert "ON CONFLICT (raw_id, source_type, date) DO UPDATE" in sql
+        # A changed date/source_type updates the existing row instead of inserting a second one
+        assert "WITH moved AS (UPDATE staging.records" in sql
+        assert "WHERE NOT EXISTS (SELECT 1 FROM moved)" in sql
+
+    async def test_raw_ids_locked_before_write(self):
+        """A changed date is a different conflict key, so concurrent writers are serialized per raw_id."""
+        from src.transform import _RAW_ID_LOCK_SQL
+
+        rows = TestBisectingRetry()._rows(4)
+        conn = _FakeConn({"r2"})
+        with patch("src.transform.get_db_pool", return_value=TestBisectingRetry()._pool(conn)):
+            assert await upsert_staging_records(rows) == 3
+
+        # Once for the batch, once more for the bisecting transaction after the rollback
+        assert conn.locked == [["r0", "r1", "r2", "r3"]] * 2
+        assert "pg_advisory_xact_lock" in _RAW_ID_LOCK_SQL and "ORDER BY 1" in _RAW_ID_LOCK_SQL
+
+    def test_partition_keys_use_utc_year(self):
+        from datetime import timedelta, timezone
+
+        from src.models import STAGING_FIELDS
+        from src.transform import _partition_keys
+
+        def row(source_type, date):
+            values = dict.fromkeys(STAGING_FIELDS)
+            values.update(source_type=source_type, date=date)
+            return tuple(values[f] for f in STAGING_FIELDS)
+
+        new_year_moscow = datetime(2024, 1, 1, 1, 0, tzinfo=timezone(timedelta(hours=3)))
+        rows = [row("live", new_year_moscow), row("live", datetime(2022, 5, 1)), row("static", None)]
+
+        assert _partition_keys(rows) == {("live", 2023), ("live", 2022)}
+
+    async def test_partitions_ensured_before_upsert(self):
+        from src.transform import normalize_records
+
+        raw = [
+            {"raw_id": "r1", "received_at": datetime(2024, 1, 1), "raw_payload": {"Client": "c", "Date": "01.02.2023"}}
+        ]
+        rows, _ = normalize_records(raw, as_rows=True)
+        conn = _FakeConn(set())
+        pool = MagicMock()
+        pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+        pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+
+        with (
+            patch("src.transform.get_db_pool", return_value=pool),
+            patch("src.transform.ensure_staging_partitions", AsyncMock()) as ensure,
+        ):
+            assert await upsert_staging_records(rows) == 1
+
+        ensure.assert_awaited_once_with(conn, {("live", 2023)})
+
+
+class _FakeColumnarConn(_FakeConn):
+    """Receives the whole batch as one unnest statement: one array argument per column."""
+
+    async def execute(self, sql, *columns):
+        from src.transform import _RAW_ID_IDX
+
+        if self._lock(sql, columns):
+            return
+        assert "unnest(" in sql
+        self.statements += 1
+        ids = columns[_RAW_ID_IDX]
+        if self.bad_ids & set(ids):
+            raise self.fail_with("invalid input syntax")
+        self._stack[-1].extend(ids)
+
+    async def executemany(self, sql, rows):
+        raise AssertionError("pooler mode must not use executemany")
+
+
+class TestPoolerMode:
+    """DB_POOLER_MODE=transaction: one array statement per batch, no per-row prepared binds."""
+
+    def _rows(self, ids, payload=None):
+        from src.transform import normalize_records
+
+        raw = [
+            {"raw_id": i, "received_at": datetime(2024, 1, 1), "raw_payload": payload or {"Client": f"c{i}"}}
+            for i in ids
+        ]
+        rows, _ = normalize_records(raw, as_rows=True)
+        return rows
+
+    def test_unnest_sql_typed_arrays(self):
+        from src.models import STAGING_FIELDS
+        from src.transform import _staging_unnest_sql
+
+        sql = _staging_unnest_sql()
+        assert "unnest($1::text[], $2::int8[], $3::timestamptz[]" in sql
+        assert f"${len(STAGING_FIELDS)}::text[]" in sql and f"${len(STAGING_FIELDS) + 1}" not in sql
+        assert "v.raw_payload::jsonb" in sql
+        assert "ON CONFLICT (raw_id, source_type, date) DO UPDATE" in sql
+        assert "WHERE NOT EXISTS (SELECT 1 FROM moved m WHERE m.raw_id = v.raw_id)" in sql
+
+    def test_columns_last_duplicate_wins(self):
+        from src.models import STAGING_FIELDS
+        from src.transform import _staging_columns
+
+        rows = self._rows(["a", "b"]) + self._rows(["a"], {"Client": "new"})
+        columns = _staging_columns(rows)
+
+        assert len(columns) == len(STAGING_FIELDS)
+        assert columns[STAGING_FIELDS.index("raw_id")] == ["a", "b"]
+        assert columns[STAGING_FIELDS.index("client")] == ["new", "cb"]
+        assert json.loads(columns[STAGING_FIELDS.index("raw_payload")][0]) == {"Client": "new"}
+
+    async def test_batch_is_one_statement_and_bisects(self):
+        from src.config import settings
+        from src.rejects import RejectSink
+
+        rows = self._rows([f"r{i}" for i in range(16)])
+        pool = TestBisectingRetry()._pool
+        sink = RejectSink()
+
+        with patch.object(settings, "DB_POOLER_MODE", "transaction"):
+            good = _FakeColumnarConn(set())
+            with patch("src.transform.get_db_pool", return_value=pool(good)):
+                assert await upsert_staging_records(rows) == 16
+            assert good.statements == 1
+
+            bad = _FakeColumnarConn({"r3"})
+            with patch("src.transform.get_db_pool", return_value=pool(bad)):
+                assert await upsert_staging_records(rows, sink) == 15
+        assert sink.rejected_ids == {"r3"}
+        assert sorted(bad.committed) == sorted(r.raw_id for r in rows if r.raw_id != "r3")
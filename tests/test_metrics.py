@@ -0,0 +1,80 @@
+"""Tests for the OpenMetrics registry and exporters."""
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.metrics import Registry, push_to_gateway, write_textfile
+
+
+@pytest.fixture
+def registry():
+    reg = Registry()
+    rows = reg.counter("etl_rows_read", "Raw rows read")
+    rows.inc(10, source="google_sheets", source_type="live")
+    rows.inc(5, source="google_sheets", source_type="live")
+    latency = reg.histogram("etl_batch_latency_seconds", "Batch latency", buckets=(0.1, 1.0))
+    latency.observe(0.05, source="google_sheets")
+    latency.observe(0.5, source="google_sheets")
+    reg.gauge("etl_rows_per_second", "Throughput").set(1234.5, stage="upsert")
+    return reg
+
+
+class TestRender:
+    """Test OpenMetrics text rendering."""
+
+    def test_counter(self, registry):
+        text = registry.render()
+
+        assert "# TYPE etl_rows_read counter" in text
+        assert 'etl_rows_read_total{source="google_sheets",source_type="live"} 15' in text
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        text = registry.render()
+
+        assert 'etl_batch_latency_seconds_bucket{source="google_sheets",le="0.1"} 1' in text
+        assert 'etl_batch_latency_seconds_bucket{source="google_sheets",le="1"} 2' in text
+        assert 'etl_batch_latency_seconds_bucket{source="google_sheets",le="+Inf"} 2' in text
+        assert 'etl_batch_latency_seconds_count{source="google_sheets"} 2' in text
+        assert 'etl_batch_latency_seconds_sum{source="google_sheets"} 0.55' in text
+
+    def test_gauge_and_eof(self, registry):
+        text = registry.render()
+
+        assert 'etl_rows_per_second{stage="upsert"} 1234.5' in text
+        assert text.endswith("# EOF\n")
+
+    def test_label_escaping(self):
+        reg = Registry()
+        reg.counter("c", "doc").inc(source='a"b')
+
+        assert 'c_total{source="a\\"b"} 1' in reg.render()
+
+
+def test_write_textfile(tmp_path, registry):
+    path = write_textfile(tmp_path / "metrics" / "run.prom", registry)
+
+    assert path.read_text(encoding="utf-8") == registry.render()
+    assert list(path.parent.iterdir()) == [path]
+
+
+@pytest.mark.asyncio
+async def test_push_to_gateway(registry):
+    received = {}
+
+    async def handler(request: web.Request) -> web.Response:
+        received["path"] = request.path
+        received["body"] = await request.text()
+        return web.Response(status=200)
+
+    app = web.Application()
+    app.router.add_put("/metrics/job/{job}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        await push_to_gateway(str(server.make_url("")), "run_google_sheets_live", registry)
+    finally:
+        await server.close()
+
+    assert received["path"] == "/metrics/job/run_google_sheets_live"
+    assert received["body"] == registry.render()
@@ -0,0 +1,128 @@
+"""Tests for raw.data partition helpers and the online legacy mover."""
+
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src import partitions
+
+
+def _acquire(conn):
+    @asynccontextmanager
+    async def acquire():
+        yield conn
+
+    return acquire
+
+
+@pytest.fixture(autouse=True)
+def _clear_cache():
+    partitions._ensured.clear()
+    yield
+    partitions._ensured.clear()
+
+
+class TestEnsurePartitions:
+    """Partition DDL runs once per source and month in a process."""
+
+    async def test_called_once_per_source(self):
+        conn = MagicMock()
+        conn.execute = AsyncMock()
+
+        await partitions.ensure_raw_partitions(conn, "gs")
+        await partitions.ensure_raw_partitions(conn, "gs")
+        await partitions.ensure_raw_partitions(conn, "archive")
+
+        assert [c.args for c in conn.execute.await_args_list] == [
+            ("SELECT raw.ensure_data_partitions($1)", "gs"),
+            ("SELECT raw.ensure_data_partitions($1)", "archive"),
+        ]
+
+    async def test_failure_is_retried(self):
+        conn = MagicMock()
+        conn.execute = AsyncMock(side_effect=[RuntimeError("lock timeout"), None])
+
+        with pytest.raises(RuntimeError):
+            await partitions.ensure_raw_partitions(conn, "gs")
+        await partitions.ensure_raw_partitions(conn, "gs")
+
+        assert conn.execute.await_count == 2
+
+
+class TestMoveLegacy:
+    """Batches run until the legacy table is empty; it is dropped only when asked and really empty."""
+
+    def _conn(self, legacy="raw.data_legacy", batches=(3, 2, 0), empty=True):
+        conn = MagicMock()
+        conn.execute = AsyncMock()
+        conn.transaction.return_value = AsyncMock()
+        values = {"to_regclass": [legacy], "move_legacy_data": list(batches), "NOT EXISTS": [empty]}
+
+        async def fetchval(sql, *args):
+            key = next(k for k in values if k in sql)
+            return values[key].pop(0)
+
+        conn.fetchval = AsyncMock(side_effect=fetchval)
+        return conn
+
+    async def test_moves_until_empty(self):
+        conn = self._conn()
+        progress = []
+        with patch("src.partitions.acquire", _acquire(conn)):
+            total = await partitions.move_legacy_raw(100, on_batch=lambda moved, total: progress.append((moved, total)))
+
+        assert total == 5
+        assert progress == [(3, 3), (2, 5)]
+        assert not any("DROP TABLE" in c.args[0] for c in conn.execute.await_args_list)
+
+    async def test_drops_empty_legacy(self):
+        conn = self._conn()
+        with patch("src.partitions.acquire", _acquire(conn)):
+            await partitions.move_legacy_raw(100, drop_legacy=True)
+
+        conn.execute.assert_any_await("DROP TABLE raw.data_legacy")
+
+    async def test_keeps_legacy_with_rows_left(self):
+        conn = self._conn(empty=False)
+        with patch("src.partitions.acquire", _acquire(conn)):
+            await partitions.move_legacy_raw(100, drop_legacy=True)
+
+        assert not any("DROP TABLE" in c.args[0] for c in conn.execute.await_args_list)
+
+    async def test_noop_after_migration(self):
+        conn = self._conn(legacy=None)
+        with patch("src.partitions.acquire", _acquire(conn)):
+            assert await partitions.move_legacy_raw(100) == 0
+
+        conn.execute.assert_not_awaited()
+
+
+class TestEnsureStagingPartitions:
+    """Missing (source_type, year) partitions are created once; a DDL failure does not fail the upsert."""
+
+    @pytest.fixture(autouse=True)
+    def _clear_staging_cache(self):
+        partitions._ensured_staging.clear()
+        yield
+        partitions._ensured_staging.clear()
+
+    async def test_only_new_keys(self):
+        conn = MagicMock()
+        conn.execute = AsyncMock()
+
+        await partitions.ensure_staging_partitions(conn, {("live", 2024), ("static", 2015)})
+        await partitions.ensure_staging_partitions(conn, {("live", 2024), ("live", 2025)})
+
+        assert [c.args[1:] for c in conn.execute.await_args_list] == [("live", 2024), ("static", 2015), ("live", 2025)]
+
+    async def test_failure_is_logged_and_retried(self):
+        import asyncpg
+
+        conn = MagicMock()
+        conn.execute = AsyncMock(side_effect=[asyncpg.PostgresError("lock timeout"), None])
+
+        await partitions.ensure_staging_partitions(conn, {("live", 2024)})
+        await partitions.ensure_staging_partitions(conn, {("live", 2024)})
+
+        assert conn.execute.await_count == 2
@@ -0,0 +1,91 @@
+"""Tests for the CLI profiling modes."""
+
+import datetime
+import pstats
+import sys
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src import tracing
+from src.profiling import profile_command
+
+
+def _work():
+    with tracing.span("command.run"):
+        with tracing.span("elt.normalize"):
+            data = [{"i": str(i)} for i in range(20000)]
+        with tracing.span("elt.upsert"):
+            with tracing.span("db.upsert_batch"):
+                pass
+    return data
+
+
+def test_cpu_profile_written(tmp_path):
+    with profile_command("cpu", "run", tmp_path):
+        _work()
+
+    files = list((tmp_path / "profiles").glob("run_*.prof"))
+    assert len(files) == 1
+    assert pstats.Stats(str(files[0])).total_calls > 0
+
+
+def test_memory_profile_reports_top_level_stages(tmp_path):
+    with profile_command("memory", "run", tmp_path):
+        _work()
+
+    files = list((tmp_path / "profiles").glob("run_*.memory.txt"))
+    assert len(files) == 1
+    report = files[0].read_text(encoding="utf-8")
+    assert "== elt.normalize" in report
+    assert "== elt.upsert" in report
+    assert "db.upsert_batch" not in report  # only first-level stages are snapshotted
+    assert "test_profiling.py" in report
+
+
+async def test_memory_profile_reports_stages_of_run(tmp_path):
+    """`--profile memory run`: stages nested under elt.source are reported, not the wrapper itself."""
+    import main
+    from src.sources import SourceSpec
+
+    received = datetime.datetime(2025, 1, 1, tzinfo=datetime.UTC)
+    payload = {"Клиент": "X", "Дата": "01.01.2025"}
+    rows = [{"raw_id": f"r{i}", "received_at": received, "payload": payload, "payload_hash": b"h"} for i in range(50)]
+    with (
+        patch("main.init_db_pool", AsyncMock()),
+        patch("main.close_db_pool", AsyncMock()),
+        patch("main._export_metrics", AsyncMock()),
+        patch("src.transform.fetch_one_off", AsyncMock(return_value=rows)),
+        patch("main.upsert_staging_records_batch", AsyncMock(return_value=50)),
+        patch("main.notify_marts_changed", AsyncMock()),
+        patch("src.rejects.RejectSink.flush", AsyncMock()),
+        profile_command("memory", "run", tmp_path),
+        tracing.span("command.run"),
+    ):
+        await main.run_sources([SourceSpec("gs")])
+
+    report = next((tmp_path / "profiles").glob("run_*.memory.txt")).read_text(encoding="utf-8")
+    for stage in ("db.get_changed_raw_records", "elt.normalize", "elt.upsert"):
+        assert f"== {stage}" in report
+    assert "== elt.source" not in report
+
+
+def test_sampling_falls_back_to_cprofile_without_pyinstrument(tmp_path):
+    with patch.dict(sys.modules, {"pyinstrument": None}):
+        with profile_command("sampling", "run", tmp_path):
+            _work()
+
+    assert list((tmp_path / "profiles").glob("run_*.prof"))
+
+
+def test_disabled_profile_is_noop(tmp_path):
+    with profile_command(None, "run", tmp_path):
+        _work()
+
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        with profile_command("bogus", "run", tmp_path):
+            pass
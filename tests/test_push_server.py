@@ -0,0 +1,136 @@
+"""Tests for the Apps Script push ingestion endpoint."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.push_server import PayloadError, create_app, parse_rows
+
+TOKEN = "s3cret"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+
+
+class TestParseRows:
+    """Row-change payloads become load_raw records with the pull path's string cells."""
+
+    def test_compact_form_padded_to_headers(self):
+        body = {"source": "gs", "headers": ["PK", "Client", "Total"], "rows": [{"pk": "sa_1", "values": ["sa_1", "A"]}]}
+        payload = {"PK": "sa_1", "Client": "A", "Total": ""}
+        assert parse_rows(body, {"gs"}, 10) == ("gs", [{"id": "sa_1", "payload": payload}])
+
+    def test_object_form_and_last_edit_wins(self):
+        body = {
+            "source": "gs",
+            "rows": [{"pk": 1, "values": {"Client": "old"}}, {"pk": "1", "values": {"Client": "new", "Total": 5}}],
+        }
+        _, records = parse_rows(body, {"gs"}, 10)
+        assert records == [{"id": "1", "payload": {"Client": "new", "Total": "5"}}]
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            [],
+            {"source": "other", "rows": [{"pk": "1", "values": {}}]},
+            {"source": "gs", "rows": []},
+            {"source": "gs", "rows": [{"pk": "", "values": {}}]},
+            {"source": "gs", "rows": [{"pk": "1", "values": ["a"]}]},  # list values need headers
+            {"source": "gs", "headers": ["a"], "rows": [{"pk": "1", "values": ["a", "b"]}]},
+            {"source": "gs", "rows": [{"pk": str(i), "values": {}} for i in range(11)]},
+        ],
+    )
+    def test_invalid(self, body):
+        with pytest.raises(PayloadError):
+            parse_rows(body, {"gs"}, 10)
+
+
+class TestEndpoint:
+    """POST /v1/rows: bearer auth, bulk load, then normalization for just those ids."""
+
+    async def _client(self, load_rows, on_loaded=None):
+        client = TestClient(TestServer(create_app(TOKEN, {"gs"}, load_rows, on_loaded)))
+        await client.start_server()
+        return client
+
+    async def test_accepts_rows(self):
+        load_rows = AsyncMock(return_value=[])
+        on_loaded = MagicMock()
+        client = await self._client(load_rows, on_loaded)
+        try:
+            body = {"source": "gs", "headers": ["PK", "Client"], "rows": [{"pk": "a", "values": ["a", "X"]}]}
+            resp = await client.post("/v1/rows", json=body, headers=AUTH)
+            assert resp.status == 200
+            assert await resp.json() == {"accepted": 1, "rejected": []}
+        finally:
+            await client.close()
+
+        load_rows.assert_awaited_once_with("gs", [{"id": "a", "payload": {"PK": "a", "Client": "X"}}])
+        on_loaded.assert_called_once_with("gs", ["a"])
+
+    async def test_reports_rows_owned_by_another_source(self):
+        load_rows = AsyncMock(return_value=["b"])
+        on_loaded = MagicMock()
+        client = await self._client(load_rows, on_loaded)
+        try:
+            body = {"source": "gs", "rows": [{"pk": "a", "values": {}}, {"pk": "b", "values": {}}]}
+            resp = await client.post("/v1/rows", json=body, headers=AUTH)
+            assert await resp.json() == {"accepted": 1, "rejected": ["b"]}
+        finally:
+            await client.close()
+        on_loaded.assert_called_once_with("gs", ["a"])
+
+    @pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong"}, {"Authorization": TOKEN}])
+    async def test_rejects_bad_token(self, headers):
+        load_rows = AsyncMock()
+        client = await self._client(load_rows)
+        try:
+            resp = await client.post("/v1/rows", json={"source": "gs", "rows": []}, headers=headers)
+            assert resp.status == 401
+        finally:
+            await client.close()
+        load_rows.assert_not_awaited()
+
+    async def test_bad_payload(self):
+        client = await self._client(AsyncMock())
+        try:
+            resp = await client.post("/v1/rows", data=b"{not json", headers=AUTH)
+            assert resp.status == 400
+            body = {"source": "nope", "rows": [{"pk": "a", "values": {}}]}
+            resp = await client.post("/v1/rows", json=body, headers=AUTH)
+            assert resp.status == 400
+            assert "nope" in (await resp.json())["error"]
+        finally:
+            await client.close()
+
+
+async def test_load_raw_update_existing_skips_unchanged():
+    import main
+
+    conn = MagicMock()
+    conn.fetch = AsyncMock(return_value=[{"id": "a"}])
+    conn.transaction.return_value = AsyncMock()
+    pool = MagicMock()
+    pool.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    pool.acquire.return_value.__aexit__ = AsyncMock(return_value=None)
+
+    with (
+        patch("main.init_db_pool", AsyncMock(return_value=pool)),
+        patch("main.ensure_raw_partitions", AsyncMock()),
+    ):
+        records = [{"id": "a", "payload": {"Client": "X"}}, {"id": "a", "payload": {"Client": "Y"}}]
+        rejected = await main.load_raw("gs", records, update_existing=True)
+
+    assert rejected == ["a"]
+    sql, _, ids, payloads, _ = conn.fetch.call_args.args
+    assert "UPDATE raw.data" in sql
+    assert "IS DISTINCT FROM v.payload_hash" in sql
+    # The last edit of a row wins
+    assert ids == ["a"] and "Y" in payloads[0]
+
+
+async def test_push_server_requires_token():
+    import main
+    from src.sources import SourceSpec
+
+    with patch.object(main.settings, "INGEST_TOKEN", None), pytest.raises(RuntimeError, match="INGEST_TOKEN"):
+        await main.run_push_server([SourceSpec("gs")], "127.0.0.1", 0)
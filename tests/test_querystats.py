@@ -0,0 +1,107 @@
+"""Tests for DB query instrumentation (fingerprints, stats, slow-query log)."""
+
+import logging
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from src.querystats import (
+    STATEMENT_DURATION,
+    QueryStats,
+    fingerprint,
+    instrument_connection,
+    params_shape,
+    rows_from_status,
+)
+
+
+class TestFingerprint:
+    """Normalization groups statements that differ only in literals."""
+
+    def test_literals_and_whitespace(self):
+        a = fingerprint("SELECT * FROM raw.data\n  WHERE source = 'google_sheets' LIMIT 100")
+        b = fingerprint("select * from raw.data where source = 'other' limit 5")
+        assert a == "SELECT * FROM raw.data WHERE source = ? LIMIT ?"
+        assert a.lower() == b.lower()
+
+    def test_in_lists_and_comments_collapsed(self):
+        fp = fingerprint("DELETE FROM t WHERE id IN (1, 2, 3) -- cleanup\nAND x = $1")
+        assert fp == "DELETE FROM t WHERE id IN (...) AND x = $1"
+
+    def test_placeholders_and_identifiers_kept(self):
+        fp = fingerprint("INSERT INTO staging.records (col1, col2) VALUES ($1, $2)")
+        assert "$1, $2" in fp
+        assert "col1" in fp
+
+
+class TestQueryStats:
+    """Aggregation per fingerprint and the end-of-run report."""
+
+    def test_aggregates_by_fingerprint(self):
+        stats = QueryStats()
+        stats.record("SELECT 1 FROM t WHERE a = 'x'", 0.010)
+        stats.record("SELECT 1 FROM t WHERE a = 'y'", 0.030)
+        stats.record("INSERT INTO t VALUES ($1)", 0.5, args=[(1,), (2,), (3,)])
+
+        top = stats.top(5)
+        assert [s.calls for s in top] == [1, 2]
+        insert, select = top
+        assert insert.rows == 3
+        assert select.total == 0.04
+        assert select.max == 0.03
+
+        report = stats.report(5)
+        assert "INSERT INTO t VALUES ($1)" in report.splitlines()[1]
+        assert "SELECT ? FROM t WHERE a = ?" in report
+
+    def test_rows_and_errors(self):
+        stats = QueryStats()
+        sql = "UPDATE t SET a = $1"
+        stats.record(sql, 0.001, args=(1,), error=RuntimeError("boom"))
+        stats.add_rows(sql, rows_from_status("UPDATE 7"))
+        (s,) = stats.top()
+        assert (s.rows, s.errors) == (7, 1)
+
+    def test_rows_before_logger_callback(self):
+        # One-off helpers count rows before asyncpg's call_soon query logger has run
+        stats = QueryStats()
+        sql = "SELECT id FROM raw.data WHERE source = $1"
+        stats.add_rows(sql, 12)
+        stats.record(sql, 0.004, args=("gs",))
+        (s,) = stats.top()
+        assert (s.calls, s.rows) == (1, 12)
+
+    def test_feeds_statement_histogram(self):
+        stats = QueryStats()
+        before = STATEMENT_DURATION.count(statement="SELECT now()")
+        stats.record("SELECT now()", 0.002)
+        assert STATEMENT_DURATION.count(statement="SELECT now()") == before + 1
+
+
+class TestSlowQueryLog:
+    """Slow statements are logged with parameter shape, never values."""
+
+    def test_slow_query_logs_shape_only(self, caplog):
+        stats = QueryStats(slow_threshold_ms=100)
+        with caplog.at_level(logging.WARNING, logger="src.querystats"):
+            stats.record("SELECT * FROM t WHERE email = $1 AND n = $2", 0.05, args=("secret@x.com", 5))
+            stats.record("SELECT * FROM t WHERE email = $1 AND n = $2", 0.25, args=("secret@x.com", 5))
+
+        assert len(caplog.records) == 1
+        message = caplog.records[0].getMessage()
+        assert "250 мс" in message
+        assert "params=(str[12], int)" in message
+        assert "secret" not in message
+
+    def test_executemany_shape(self):
+        assert params_shape([("a", 1), ("bb", 2)], many=True) == "2x(str[1], int)"
+        assert params_shape(None) == "()"
+
+
+def test_instrument_connection_registers_logger():
+    stats = QueryStats()
+    conn = MagicMock()
+    instrument_connection(conn, stats)
+    callback = conn.add_query_logger.call_args.args[0]
+
+    callback(SimpleNamespace(query="SELECT 1", elapsed=0.01, args=(), exception=None))
+    assert stats.top()[0].calls == 1
@@ -0,0 +1,231 @@
+"""Tests for the marts read API: keyset pages, cached aggregates, ETag/gzip and invalidation."""
+
+import asyncio
+import datetime
+import gzip
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.marts import CHANGED_CHANNEL
+from src.read_api import (
+    GZIP_MIN_BYTES,
+    CursorError,
+    TTLCache,
+    create_app,
+    decode_cursor,
+    encode_cursor,
+    listen_for_changes,
+    transactions_query,
+)
+
+UTC = datetime.UTC
+
+
+def _tx(i):
+    return {"raw_id": f"r{i:03d}", "date": datetime.datetime(2026, 1, 1, tzinfo=UTC) - datetime.timedelta(days=i)}
+
+
+class TestTTLCache:
+    """Entries expire after ttl, the least recently used goes first, clear() bumps the generation."""
+
+    def test_expiry_and_lru(self):
+        now = [0.0]
+        cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)  # evicts "b", "a" was used more recently
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        now[0] = 10
+        assert cache.get("a") is None
+        assert (cache.hits, cache.misses, len(cache)) == (2, 2, 1)
+
+    def test_clear(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.clear()
+        assert cache.get("a") is None
+        assert cache.generation == 1
+
+
+class TestCursor:
+    def test_roundtrip(self):
+        date = datetime.datetime(2025, 3, 1, 12, 30, tzinfo=UTC)
+        assert decode_cursor(encode_cursor(date, "sa_1")) == (date, "sa_1")
+        assert decode_cursor(encode_cursor(None, "sa_2")) == (None, "sa_2")
+
+    @pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGpzb24", "WzEsMl0"])  # "not json", [1,2]
+    def test_invalid(self, cursor):
+        with pytest.raises(CursorError):
+            decode_cursor(cursor)
+
+    def test_query_placeholders(self):
+        assert transactions_query(False, False).endswith("ORDER BY date DESC, raw_id DESC LIMIT $1")
+        sql = transactions_query(True, True)
+        assert "source_type = $1" in sql and "(date, raw_id) < ($2, $3)" in sql and sql.endswith("LIMIT $4")
+        sql = transactions_query(True, True, dated=False)
+        assert "date IS NULL" in sql and "raw_id < $2" in sql and sql.endswith("ORDER BY raw_id DESC LIMIT $3")
+
+
+class TestEndpoints:
+    """GET /v1/transactions and /v1/aggregates/{name} over a stubbed fetch_rows."""
+
+    async def _client(self, fetch_rows, cache=None):
+        cache = TTLCache(8, 60) if cache is None else cache  # an empty cache is falsy (len 0)
+        client = TestClient(TestServer(create_app(fetch_rows, cache, page_size=2, max_page_size=5)))
+        await client.start_server()
+        return client
+
+    async def test_keyset_pages(self):
+        rows = [_tx(i) for i in range(5)]
+        undated = [{"raw_id": f"u{i}", "date": None} for i in (2, 1)]
+
+        async def fetch_rows(sql, *args):
+            limit = args[-1]
+            if "date IS NULL" in sql:
+                after = args[-2] if len(args) > 1 else None
+                return [r for r in undated if after is None or r["raw_id"] < after][:limit]
+            if len(args) > 1:
+                date, raw_id = args[-3], args[-2]
+                return [r for r in rows if (r["date"], r["raw_id"]) < (date, raw_id)][:limit]
+            return rows[:limit]
+
+        client = await self._client(fetch_rows)
+        seen, cursor = [], None
+        try:
+            for _ in range(5):
+                resp = await client.get("/v1/transactions", params={"cursor": cursor} if cursor else {})
+                assert resp.status == 200
+                page = await resp.json()
+                seen += [r["raw_id"] for r in page["items"]]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+        finally:
+            await client.close()
+        # Undated rows come last instead of being dropped
+        assert seen == ["r000", "r001", "r002", "r003", "r004", "u2", "u1"]
+
+    @pytest.mark.parametrize("params", [{"limit": "0"}, {"limit": "6"}, {"limit": "x"}, {"cursor": "!!!"}])
+    async def test_bad_params(self, params):
+        fetch_rows = AsyncMock()
+        client = await self._client(fetch_rows)
+        try:
+            resp = await client.get("/v1/transactions", params=params)
+            assert resp.status == 400
+        finally:
+            await client.close()
+        fetch_rows.assert_not_awaited()
+
+    async def test_aggregate_cached_with_etag_and_gzip(self):
+        items = [{"category": f"c{i}", "total_rub": i * 100} for i in range(GZIP_MIN_BYTES // 10)]
+        fetch_rows = AsyncMock(return_value=items)
+        cache = TTLCache(8, 60)
+        client = await self._client(fetch_rows, cache)
+        try:
+            resp = await client.get("/v1/aggregates/expenses_by_category", auto_decompress=False)
+            assert resp.status == 200
+            assert resp.headers["Content-Encoding"] == "gzip"
+            etag = resp.headers["ETag"]
+            body = gzip.decompress(await resp.read())
+            assert b'"c1"' in body
+
+            resp = await client.get(
+                "/v1/aggregates/expenses_by_category", headers={"If-None-Match": etag, "Accept-Encoding": "identity"}
+            )
+            assert resp.status == 304
+
+            resp = await client.get("/v1/aggregates/expenses_by_category", headers={"Accept-Encoding": "identity"})
+            assert "Content-Encoding" not in resp.headers
+            assert await resp.read() == body
+
+            cache.clear()
+            await client.get("/v1/aggregates/expenses_by_category")
+            assert (await client.get("/v1/aggregates/nope")).status == 404
+        finally:
+            await client.close()
+
+        assert fetch_rows.await_count == 2
+        fetch_rows.assert_awaited_with("SELECT * FROM marts.expenses_by_category_v")
+
+    async def test_invalidation_during_fetch_not_cached(self):
+        cache = TTLCache(8, 60)
+
+        async def fetch_rows(sql):
+            cache.clear()  # a marts_changed notification arrives while the view is being read
+            return [{"name": "a"}]
+
+        client = await self._client(fetch_rows, cache)
+        try:
+            assert (await client.get("/v1/aggregates/clients")).status == 200
+        finally:
+            await client.close()
+        assert len(cache) == 0
+
+
+class _FakeListener:
+    def __init__(self):
+        self.closed = False
+        self.on_terminate = None
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_listen_for_changes_clears_cache():
+    listeners, callbacks = [], []
+
+    async def connect(channel, callback):
+        assert channel == CHANGED_CHANNEL
+        callbacks.append(callback)
+        listeners.append(_FakeListener())
+        return listeners[-1]
+
+    cache = TTLCache(8, 60)
+    stop = asyncio.Event()
+    with (
+        patch("src.daemon.connect_listener", side_effect=connect),
+        patch("src.daemon.RECONNECT_MIN_SECONDS", 0.01),
+    ):
+        task = asyncio.create_task(listen_for_changes(cache, stop))
+        await asyncio.sleep(0.01)
+        cache.set("financials", b"{}")
+        callbacks[-1](None, 1, CHANGED_CHANNEL, "live")
+        assert cache.get("financials") is None
+
+        # Notifications sent while reconnecting are lost, so a reconnect clears the cache as well
+        cache.set("financials", b"{}")
+        listeners[-1].on_terminate(listeners[-1])
+        await asyncio.sleep(0.05)
+        assert len(listeners) == 2 and cache.get("financials") is None
+        stop.set()
+        await asyncio.wait_for(task, 1)
+    assert all(listener.closed for listener in listeners)
+
+
+async def test_normalize_and_upsert_notifies_readers():
+    import main
+    from src.rejects import RejectSink
+
+    raw = [{"raw_id": "a", "payload": {"Клиент": "X", "Дата": "01.01.2025"}, "payload_hash": b"h"}]
+    sink = RejectSink()
+    with (
+        patch("main.upsert_staging_records_batch", AsyncMock(return_value=1)),
+        patch("main.notify_marts_changed", AsyncMock()) as notify,
+        patch.object(sink, "flush", AsyncMock()),
+    ):
+        await main._normalize_and_upsert(raw, "live", sink, {})
+        notify.assert_awaited_once_with("live")
+
+        main.upsert_staging_records_batch.return_value = 0
+        await main._normalize_and_upsert(raw, "live", sink, {})
+        notify.assert_awaited_once()
@@ -0,0 +1,109 @@
+"""Tests for the rejected-records quarantine and the retry-rejected command."""
+
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.rejects import MAX_ERROR_MESSAGE, RejectSink
+from src.transform import normalize_records, upsert_staging_records_batch
+
+
+def _rows(count: int):
+    raw = [
+        {"raw_id": f"r{i}", "received_at": datetime(2024, 1, 1), "raw_payload": {"Client": f"c{i}"}}
+        for i in range(count)
+    ]
+    rows, _ = normalize_records(raw, as_rows=True)
+    return rows
+
+
+class TestRejectSink:
+    """Rejections are buffered and written in one statement per flush."""
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_batch(self):
+        sink = RejectSink("google_sheets", "live")
+        sink.add("r1", "normalize", ValueError("bad date"), b"\x01" * 16)
+        sink.add(2, "upsert", RuntimeError("x" * (MAX_ERROR_MESSAGE + 10)))
+
+        with patch("src.rejects.executemany", new_callable=AsyncMock) as executemany:
+            assert await sink.flush() == 2
+            assert await sink.flush() == 0  # buffer cleared
+
+        executemany.assert_awaited_once()
+        rows = executemany.call_args.args[1]
+        assert rows[0] == ("r1", "google_sheets", "live", "normalize", "ValueError", "bad date", b"\x01" * 16)
+        assert rows[1][0] == "2"
+        assert len(rows[1][5]) == MAX_ERROR_MESSAGE
+        assert sink.rejected_ids == {"r1", "2"}
+        assert sink.total == 2
+
+    @pytest.mark.asyncio
+    async def test_flush_failure_does_not_raise(self):
+        sink = RejectSink()
+        sink.add("r1", "upsert", ValueError("x"))
+        with patch("src.rejects.executemany", AsyncMock(side_effect=ConnectionError("down"))):
+            assert await sink.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_quarantined_and_flushed_per_batch():
+    sink = RejectSink("google_sheets", "live")
+    rows = _rows(5)
+
+    async def upsert(batch, reject_sink=None):
+        if batch[0].raw_id == "r2":
+            raise ConnectionError("connection lost")
+        return len(batch)
+
+    with (
+        patch("src.transform.upsert_staging_records", side_effect=upsert),
+        patch.object(sink, "flush", AsyncMock(return_value=0)) as flush,
+    ):
+        upserted = await upsert_staging_records_batch(rows, batch_size=2, reject_sink=sink)
+
+    assert upserted == 3
+    assert sink.rejected_ids == {"r2", "r3"}
+    assert flush.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_retry_rejected_resolves_only_fixed_rows():
+    import main
+
+    open_rejections = [
+        {"raw_id": "r1", "source": "google_sheets", "source_type": "live", "stage": "normalize"},
+        {"raw_id": "r2", "source": "google_sheets", "source_type": "live", "stage": "upsert"},
+    ]
+    raw = [
+        {"raw_id": "r1", "received_at": datetime(2024, 1, 1), "raw_payload": {"Client": "fixed"}, "payload_hash": None},
+        {"raw_id": "r2", "received_at": datetime(2024, 1, 1), "raw_payload": {"Client": 5}, "payload_hash": None},
+    ]
+    flush = AsyncMock(return_value=0)
+
+    with (
+        patch("main.init_db_pool", AsyncMock()),
+        patch("main.close_db_pool", AsyncMock()),
+        patch("main.fetch_open_rejections", AsyncMock(return_value=open_rejections)),
+        patch("main.get_raw_records_by_ids", AsyncMock(return_value=raw)) as get_raw,
+        patch("main.upsert_staging_records_batch", AsyncMock(return_value=1)) as upsert,
+        patch("main.resolve_rejections", AsyncMock()) as resolve,
+        patch.object(RejectSink, "flush", flush),
+    ):
+        await main.run_retry_rejected()
+
+    get_raw.assert_awaited_once_with(["r1", "r2"], "google_sheets")
+    assert [row.raw_id for row in upsert.call_args.args[0]] == ["r1"]
+    # r2 still fails normalization (non-string client); only this source's rejections are closed
+    resolve.assert_awaited_once_with(["r1"], "google_sheets", None)
+
+
+async def test_resolve_scoped_to_source_and_stage():
+    from src.rejects import resolve_rejections
+
+    with patch("src.rejects.execute", AsyncMock()) as execute:
+        await resolve_rejections(["r1"], "google_sheets", "upsert")
+    sql, *args = execute.call_args.args
+    assert "source IS NOT DISTINCT FROM $2" in sql and "stage = $3" in sql
+    assert args == [["r1"], "google_sheets", "upsert"]
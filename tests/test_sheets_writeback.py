@@ -0,0 +1,132 @@
+"""Tests for chunked write-back to Google Sheets."""
+
+import asyncio
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.sheets import iter_row_chunks, push_df_to_sheet
+
+
+def _frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "client": [f"Клиент {i}" for i in range(rows)],
+            "total_rub": [float(i) if i % 3 else None for i in range(rows)],
+        }
+    )
+
+
+class TestIterRowChunks:
+    """Test row chunking under API limits."""
+
+    def test_header_and_values(self):
+        chunks = list(iter_row_chunks(_frame(3)))
+
+        assert len(chunks) == 1
+        offset, rows = chunks[0]
+        assert offset == 0
+        assert rows[0] == ["client", "total_rub"]
+        assert rows[1] == ["Клиент 0", ""]  # NaN -> empty string, as fillna("") did
+        assert rows[2] == ["Клиент 1", "1.0"]
+
+    def test_split_by_rows(self):
+        chunks = list(iter_row_chunks(_frame(10), max_rows=4))
+
+        assert [offset for offset, _ in chunks] == [0, 4, 8]
+        assert sum(len(rows) for _, rows in chunks) == 11  # header + 10 rows
+
+    def test_split_by_bytes(self):
+        chunks = list(iter_row_chunks(_frame(50), max_bytes=500))
+
+        assert len(chunks) > 1
+        assert all(len(rows) >= 1 for _, rows in chunks)
+        assert sum(len(rows) for _, rows in chunks) == 51
+
+
+async def _push_to_fake_api(df: pd.DataFrame, **kwargs) -> tuple[dict, list[dict], list[dict]]:
+    """Runs push_df_to_sheet against a local Sheets API stub; returns (result, update bodies, clear bodies)."""
+    updates: list[dict] = []
+    clears: list[dict] = []
+
+    async def batch_update(request: web.Request) -> web.Response:
+        body = await request.json()
+        updates.append(body)
+        rows = body["data"][0]["values"]
+        return web.json_response({"totalUpdatedRows": len(rows)})
+
+    async def batch_clear(request: web.Request) -> web.Response:
+        clears.append(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post("/{spreadsheet_id}/values:batchUpdate", batch_update)
+    app.router.add_post("/{spreadsheet_id}/values:batchClear", batch_clear)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        with (
+            patch("src.sheets.get_google_access_token", return_value="fake_token"),
+            patch("src.sheets.SHEETS_API_URL", str(server.make_url("")).rstrip("/")),
+        ):
+            result = await push_df_to_sheet("sheet_id", "Mart", df, requests_per_minute=0, **kwargs)
+    finally:
+        await server.close()
+    return result, updates, clears
+
+
+@pytest.mark.asyncio
+async def test_push_df_to_sheet_batch_update():
+    """Every chunk is sent as its own batchUpdate range and all rows are written."""
+    result, received, _ = await _push_to_fake_api(_frame(10), max_rows=4)
+
+    assert result["updatedRows"] == 11
+    assert result["requests"] == 3
+    assert result["rowsPerSecond"] > 0
+    ranges = sorted(body["data"][0]["range"] for body in received)
+    assert ranges == ["'Mart'!A1", "'Mart'!A5", "'Mart'!A9"]
+    assert all(body["valueInputOption"] == "RAW" for body in received)
+
+
+@pytest.mark.asyncio
+async def test_push_df_to_sheet_clears_rows_below():
+    """Rows left from a longer previous push are cleared below the last written row, unless appending."""
+    _, _, clears = await _push_to_fake_api(_frame(10), max_rows=4, start_row=3)
+    assert clears == [{"ranges": ["'Mart'!A14:B"]}]  # header + 10 rows occupy rows 3..13
+
+    _, _, clears = await _push_to_fake_api(_frame(10), clear_below=False)
+    assert clears == []
+
+
+@pytest.mark.asyncio
+async def test_push_df_to_sheet_cancels_pending_chunks_on_failure():
+    """A failed batchUpdate stops the push: queued chunks are not sent and in-flight ones are cancelled."""
+    sent: list[str] = []
+    cancelled: list[str] = []
+
+    async def post_chunk(session, url, headers, range_a1, rows):
+        sent.append(range_a1)
+        if range_a1 == "'Mart'!A1":
+            await asyncio.sleep(0.01)
+            raise RuntimeError("Sheets batchUpdate HTTP 429: quota")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(range_a1)
+            raise
+        return len(rows)
+
+    with (
+        patch("src.sheets.get_google_access_token", return_value="fake_token"),
+        patch("src.sheets._post_values_chunk", post_chunk),
+        pytest.raises(RuntimeError, match="HTTP 429"),
+    ):
+        await asyncio.wait_for(
+            push_df_to_sheet("sheet_id", "Mart", _frame(40), max_rows=4, concurrency=2, requests_per_minute=0), 5
+        )
+
+    assert sent == ["'Mart'!A1", "'Mart'!A5"]
+    assert cancelled == ["'Mart'!A5"]
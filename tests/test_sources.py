@@ -0,0 +1,117 @@
+"""Tests for multi-source run: source specs, TOML config and concurrent processing."""
+
+import asyncio
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from src.sources import SourceSpec, check_unique, load_sources, parse_source_pair
+
+
+class TestSourceSpecs:
+    """--pair values and [[sources]] TOML entries."""
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [
+            ("google_sheets", SourceSpec("google_sheets", "live", 1)),
+            ("archive_2023:static", SourceSpec("archive_2023", "static", 1)),
+            ("ref_x:ref:3", SourceSpec("ref_x", "ref", 3)),
+        ],
+    )
+    def test_parse_pair(self, value, expected):
+        assert parse_source_pair(value) == expected
+
+    @pytest.mark.parametrize("value", ["", ":live", "a:b:0", "a:b:c:d"])
+    def test_parse_pair_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_source_pair(value)
+
+    def test_load_toml(self, tmp_path):
+        path = tmp_path / "sources.toml"
+        path.write_text(
+            'max_concurrency = 3\n[[sources]]\nsource = "a"\nconcurrency = 2\n'
+            '[[sources]]\nsource = "b"\nsource_type = "static"\n'
+        )
+        specs, max_concurrency = load_sources(path)
+        assert specs == [SourceSpec("a", "live", 2), SourceSpec("b", "static", 1)]
+        assert max_concurrency == 3
+
+    def test_shipped_config_parses(self):
+        specs, _ = load_sources(Path(__file__).resolve().parent.parent / "configs" / "sources.toml")
+        assert specs[0] == SourceSpec("google_sheets", "live", 2)
+
+    def test_duplicates_rejected(self):
+        with pytest.raises(ValueError, match="a/live"):
+            check_unique([SourceSpec("a"), SourceSpec("b"), SourceSpec("a")])
+
+
+class TestRunSources:
+    """Sources share one pool, run concurrently and are summarised separately."""
+
+    async def test_concurrent_with_per_source_summary(self):
+        import main
+
+        running = 0
+        peak = 0
+
+        async def process(spec, test_mode):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            if spec.source == "broken":
+                raise ConnectionError("boom")
+            return {**main._source_result(spec), "found": 5, "upserted": 5}
+
+        specs = [SourceSpec("a"), SourceSpec("b", "static"), SourceSpec("broken"), SourceSpec("c", "ref")]
+        with (
+            patch("main.init_db_pool", AsyncMock()) as init_pool,
+            patch("main.close_db_pool", AsyncMock()),
+            patch("main._export_metrics", AsyncMock()),
+            patch("main._process_source", side_effect=process),
+            pytest.raises(RuntimeError, match="broken/live"),
+        ):
+            await main.run_sources(specs, max_concurrency=2)
+
+        init_pool.assert_awaited_once()
+        assert peak == 2
+
+    async def test_results_returned(self):
+        import main
+
+        async def process(spec, test_mode):
+            return {**main._source_result(spec), "upserted": 1}
+
+        with (
+            patch("main.init_db_pool", AsyncMock()),
+            patch("main.close_db_pool", AsyncMock()),
+            patch("main._export_metrics", AsyncMock()),
+            patch("main._process_source", side_effect=process),
+        ):
+            results = await main.run_sources([SourceSpec("a"), SourceSpec("b")])
+
+        assert [(r["source"], r["status"]) for r in results] == [("a/live", "ok"), ("b/live", "ok")]
+
+
+async def test_batch_concurrency_limit():
+    from src.transform import upsert_staging_records_batch
+
+    running = 0
+    peak = 0
+
+    async def upsert(batch, reject_sink=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return len(batch)
+
+    with patch("src.transform.upsert_staging_records", side_effect=upsert):
+        total = await upsert_staging_records_batch(list(range(10)), batch_size=2, concurrency=3)
+
+    assert total == 10
+    assert peak == 3
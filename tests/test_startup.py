@@ -0,0 +1,61 @@
+"""Cold-start budget for the CLI, measured with `python -X importtime`."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+MAIN = Path(__file__).resolve().parent.parent / "main.py"
+# Heavy dependencies that only `load` (Sheets, storage, archive) may pull in
+HEAVY_MODULES = ("pandas", "pyarrow", "aiohttp", "aiofiles", "google.auth", "google.oauth2", "tenacity")
+HEAVY_PREFIXES = tuple(f"{name}." for name in HEAVY_MODULES)
+# Generous default so slow CI runners pass; override locally to tighten
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", "1000"))
+
+
+def _import_profile(tmp_path: Path, *argv: str) -> tuple[dict[str, int], int]:
+    """Run the CLI under -X importtime; return cumulative µs per module and the total import time."""
+    env = {
+        **os.environ,
+        # Unreachable DB: the command fails fast after all of its imports have happened
+        "POSTGRES_URI": "postgresql://u:p@127.0.0.1:1/db",
+        "METRICS_DIR": "",
+        "TRACE_EXPORTER": "none",
+    }
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(MAIN), *argv],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    modules: dict[str, int] = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, raw_name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header line
+        name = raw_name.strip()
+        modules[name] = int(cumulative_us)
+        # Nesting is encoded as two extra spaces per level; top-level entries add up to the total
+        if len(raw_name) - len(raw_name.lstrip()) == 1:
+            total_us += int(cumulative_us)
+    assert modules, proc.stderr[-2000:]
+    return modules, total_us
+
+
+@pytest.mark.parametrize("argv", [("check",), ("run", "--test")])
+def test_cli_cold_start(tmp_path, argv):
+    modules, total_us = _import_profile(tmp_path, *argv)
+    command = " ".join(argv)
+
+    heavy = sorted(name for name in modules if name in HEAVY_MODULES or name.startswith(HEAVY_PREFIXES))
+    assert not heavy, f"`{command}` imports heavy modules: {heavy[:10]}"
+
+    total_ms = total_us / 1000
+    assert total_ms < IMPORT_BUDGET_MS, f"`{command}` imports took {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
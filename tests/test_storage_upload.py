@@ -0,0 +1,179 @@
+"""Tests for resumable (TUS) uploads against a local stub storage server."""
+
+import asyncio
+import base64
+from unittest.mock import patch
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.db import upload_resumable_to_supabase_storage, upload_to_supabase_storage
+
+
+class StubTusStorage:
+    """Minimal TUS server mimicking Supabase /storage/v1/upload/resumable."""
+
+    def __init__(self, fail_patches: set[int] | None = None):
+        self.uploads: dict[str, dict] = {}
+        self.fail_patches = fail_patches or set()
+        self.patch_calls = 0
+        self.bytes_received = 0
+        self.put_calls = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/storage/v1/upload/resumable", self.create)
+        app.router.add_route("HEAD", "/storage/v1/upload/resumable/{upload_id}", self.head)
+        app.router.add_patch("/storage/v1/upload/resumable/{upload_id}", self.patch)
+        app.router.add_put("/storage/v1/object/{bucket}/{path:.*}", self.put)
+        return app
+
+    async def create(self, request: web.Request) -> web.Response:
+        assert request.headers["Tus-Resumable"] == "1.0.0"
+        meta = {}
+        for item in request.headers["Upload-Metadata"].split(","):
+            key, value = item.split(" ")
+            meta[key] = base64.b64decode(value).decode()
+        upload_id = f"u{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {"length": int(request.headers["Upload-Length"]), "data": b"", "meta": meta}
+        return web.Response(status=201, headers={"Location": f"/storage/v1/upload/resumable/{upload_id}"})
+
+    async def head(self, request: web.Request) -> web.Response:
+        upload = self.uploads[request.match_info["upload_id"]]
+        return web.Response(status=200, headers={"Upload-Offset": str(len(upload["data"]))})
+
+    async def patch(self, request: web.Request) -> web.Response:
+        self.patch_calls += 1
+        upload = self.uploads[request.match_info["upload_id"]]
+        offset = int(request.headers["Upload-Offset"])
+        if offset != len(upload["data"]):
+            return web.Response(status=409)
+        chunk = await request.read()
+        self.bytes_received += len(chunk)
+        upload["data"] += chunk
+        if self.patch_calls in self.fail_patches:
+            # Chunk is stored but the acknowledgement is lost
+            return web.Response(status=500)
+        return web.Response(status=204, headers={"Upload-Offset": str(len(upload["data"]))})
+
+    async def put(self, request: web.Request) -> web.Response:
+        self.put_calls += 1
+        await request.read()
+        return web.json_response({"Key": request.match_info["path"]})
+
+
+@pytest.fixture
+def payload_file(tmp_path):
+    path = tmp_path / "archive.parquet"
+    path.write_bytes(bytes(range(256)) * 40)  # 10 KB
+    return path
+
+
+async def _serve(storage: StubTusStorage) -> TestServer:
+    server = TestServer(storage.app())
+    await server.start_server()
+    return server
+
+
+@pytest.mark.asyncio
+class TestResumableUpload:
+    """Test chunked TUS uploads."""
+
+    async def test_uploads_in_chunks(self, payload_file):
+        storage = StubTusStorage()
+        server = await _serve(storage)
+        try:
+            with patch("src.db.settings") as mock_settings:
+                mock_settings.SUPABASE_URL = str(server.make_url("")).rstrip("/")
+                mock_settings.SUPABASE_SERVICE_KEY = "key"
+                result = await upload_resumable_to_supabase_storage(
+                    "archives", "dt=2024-01-01/a.parquet", payload_file, chunk_size=4096
+                )
+        finally:
+            await server.close()
+
+        upload = storage.uploads["u1"]
+        assert upload["data"] == payload_file.read_bytes()
+        assert upload["meta"] == {
+            "bucketName": "archives",
+            "objectName": "dt=2024-01-01/a.parquet",
+            "contentType": "application/octet-stream",
+        }
+        assert storage.patch_calls == 3
+        assert result["size"] == 10240
+
+    async def test_resumes_from_acknowledged_offset(self, payload_file):
+        """After a failed PATCH the client asks for the offset and does not resend stored bytes."""
+        storage = StubTusStorage(fail_patches={2})
+        server = await _serve(storage)
+        try:
+            with patch("src.db.settings") as mock_settings:
+                mock_settings.SUPABASE_URL = str(server.make_url("")).rstrip("/")
+                mock_settings.SUPABASE_SERVICE_KEY = "key"
+                await upload_resumable_to_supabase_storage(
+                    "archives", "a.parquet", payload_file, chunk_size=4096, backoff=0
+                )
+        finally:
+            await server.close()
+
+        assert storage.uploads["u1"]["data"] == payload_file.read_bytes()
+        assert storage.bytes_received == payload_file.stat().st_size
+
+    async def test_gives_up_after_retries(self, payload_file):
+        storage = StubTusStorage(fail_patches={1, 2, 3})
+        server = await _serve(storage)
+        try:
+            with patch("src.db.settings") as mock_settings:
+                mock_settings.SUPABASE_URL = str(server.make_url("")).rstrip("/")
+                mock_settings.SUPABASE_SERVICE_KEY = "key"
+                with pytest.raises(RuntimeError):
+                    await upload_resumable_to_supabase_storage(
+                        "archives", "a.parquet", payload_file, chunk_size=1024, retries=2, backoff=0
+                    )
+        finally:
+            await server.close()
+
+    async def test_file_shrinking_during_upload_fails(self, payload_file):
+        """A file truncated mid-upload raises instead of PATCHing empty chunks forever."""
+        storage = StubTusStorage()
+        stub_patch = storage.patch
+
+        async def patch_then_truncate(request: web.Request) -> web.Response:
+            response = await stub_patch(request)
+            payload_file.write_bytes(payload_file.read_bytes()[:2048])
+            return response
+
+        storage.patch = patch_then_truncate
+        server = await _serve(storage)
+        try:
+            with patch("src.db.settings") as mock_settings:
+                mock_settings.SUPABASE_URL = str(server.make_url("")).rstrip("/")
+                mock_settings.SUPABASE_SERVICE_KEY = "key"
+                with pytest.raises(OSError, match="shrank during upload"):
+                    await asyncio.wait_for(
+                        upload_resumable_to_supabase_storage(
+                            "archives", "a.parquet", payload_file, chunk_size=4096, backoff=0
+                        ),
+                        5,
+                    )
+        finally:
+            await server.close()
+
+        assert storage.patch_calls == 1
+
+    async def test_small_files_use_single_put(self, payload_file):
+        storage = StubTusStorage()
+        server = await _serve(storage)
+        try:
+            with patch("src.db.settings") as mock_settings:
+                mock_settings.SUPABASE_URL = str(server.make_url("")).rstrip("/")
+                mock_settings.SUPABASE_SERVICE_KEY = "key"
+                mock_settings.STORAGE_RESUMABLE_THRESHOLD = 1024 * 1024
+                result = await upload_to_supabase_storage("archives", "a.parquet", payload_file)
+        finally:
+            await server.close()
+
+        assert storage.put_calls == 1
+        assert not storage.uploads
+        assert result == {"Key": "a.parquet"}
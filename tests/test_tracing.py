@@ -0,0 +1,91 @@
+"""Tests for span-based tracing and its exporters."""
+
+import asyncio
+import json
+
+import pytest
+
+from src import tracing
+
+
+@pytest.fixture(autouse=True)
+def reset_exporter():
+    yield
+    tracing.configure("none")
+
+
+def _read_trace(path) -> list[dict]:
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    return json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+
+
+def test_nested_spans_form_single_trace(tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    tracing.configure("file", trace_file)
+
+    with tracing.span("command.run"):
+        with tracing.span("db.get_changed_raw_records", source="google_sheets"):
+            pass
+        with tracing.span("elt.normalize") as sp:
+            sp.set_attribute("rows", 3)
+
+    spans = {s["name"]: s for s in _read_trace(trace_file)}
+    root = spans["command.run"]
+    assert "parentSpanId" not in root
+    assert {s["traceId"] for s in spans.values()} == {root["traceId"]}
+    assert spans["elt.normalize"]["parentSpanId"] == root["spanId"]
+    assert {"key": "rows", "value": {"intValue": "3"}} in spans["elt.normalize"]["attributes"]
+
+
+@pytest.mark.asyncio
+async def test_async_tasks_inherit_parent(tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    tracing.configure("file", trace_file)
+
+    @tracing.traced("storage.upload")
+    async def upload():
+        await asyncio.sleep(0)
+
+    with tracing.span("command.load"):
+        await asyncio.gather(asyncio.create_task(upload()), asyncio.create_task(upload()))
+
+    spans = _read_trace(trace_file)
+    root = next(s for s in spans if s["name"] == "command.load")
+    uploads = [s for s in spans if s["name"] == "storage.upload"]
+    assert len(uploads) == 2
+    assert all(s["parentSpanId"] == root["spanId"] for s in uploads)
+
+
+def test_error_status_recorded(tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    tracing.configure("file", trace_file)
+
+    @tracing.traced("google.access_token")
+    def refresh():
+        raise RuntimeError("expired")
+
+    with pytest.raises(RuntimeError):
+        with tracing.span("command.load"):
+            refresh()
+
+    spans = {s["name"]: s for s in _read_trace(trace_file)}
+    assert spans["google.access_token"]["status"] == {"code": 2, "message": "RuntimeError: expired"}
+
+
+def test_waterfall_rendering():
+    tracing.configure("none")
+    with tracing.span("command.run") as root:
+        with tracing.span("elt.normalize") as child:
+            pass
+    root.end_ns = root.start_ns + 2_000_000_000
+    child.start_ns = root.start_ns + 1_000_000_000
+    child.end_ns = root.end_ns
+    spans = [root, child]
+
+    text = tracing.render_waterfall(spans, width=10)
+    lines = text.splitlines()
+    assert lines[0].startswith(f"trace {root.trace_id}")
+    assert lines[1].startswith("command.run")
+    assert lines[2].startswith("  elt.normalize")
+    assert "|     █████|" in lines[2]
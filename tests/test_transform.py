@@ -178,6 +178,20 @@ class TestNormalizeRecord:
         record3 = normalize_record(2, 2, datetime.now(), SAMPLE_PAYLOAD_2)
         assert record1["payload_hash"] != record3["payload_hash"]
 
+    def test_payload_hash_is_16_byte_digest(self):
+        """Both algorithms give a 16-byte digest; md5 matches the legacy hex hash after decode(hex)."""
+        import hashlib
+        import json
+
+        legacy_hex = hashlib.md5(
+            json.dumps(SAMPLE_PAYLOAD_1, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+
+        assert hash_func(SAMPLE_PAYLOAD_1, "md5") == bytes.fromhex(legacy_hex)
+        assert len(hash_func(SAMPLE_PAYLOAD_1, "blake2b")) == 16
+        assert hash_func(SAMPLE_PAYLOAD_1, "blake2b") != hash_func(SAMPLE_PAYLOAD_1, "md5")
+        assert hash_func(SAMPLE_PAYLOAD_1) == hash_func(SAMPLE_PAYLOAD_1, "blake2b")  # default setting
+
 
 class TestCDCMetadata:
     """Test CDC metadata extraction and normalization."""
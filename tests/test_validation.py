@@ -0,0 +1,115 @@
+"""Equivalence tests for the strict and fast StagingRecord validation modes."""
+
+from datetime import datetime
+from typing import get_args, get_type_hints
+
+import pytest
+from pydantic import ValidationError
+
+from benchmarks.payloads import generate_payloads
+from src.models import (
+    CHECKED_FIELDS,
+    StagingRecord,
+    StagingRow,
+    _CheckedRow,
+    validate_staging_batch,
+    validate_staging_record,
+)
+from src.transform import _staging_data, normalize_record, normalize_records
+
+RECEIVED_AT = datetime(2024, 1, 1)
+
+
+def _data(payload: dict, **overrides) -> dict:
+    data = _staging_data("r1", 1, RECEIVED_AT, payload, "live")
+    data.update(overrides)
+    return data
+
+
+class TestDeclaredTypes:
+    """The hand-written row types must follow StagingRecord."""
+
+    def test_staging_row_matches_model(self):
+        expected = {name: field.annotation for name, field in StagingRecord.model_fields.items()}
+        assert get_type_hints(StagingRow) == expected
+
+    def test_checked_row_matches_checked_fields(self):
+        expected = [StagingRecord.model_fields[name].annotation for name in CHECKED_FIELDS]
+        assert list(get_args(_CheckedRow)) == expected
+
+
+class TestEquivalence:
+    """fast must return exactly what StagingRecord(**data).model_dump() returns."""
+
+    @pytest.mark.parametrize("payload", generate_payloads(200, seed=7))
+    def test_generated_payloads(self, payload):
+        data = _data(payload)
+        assert validate_staging_record(data, "fast") == validate_staging_record(data, "strict")
+
+    def test_same_keys_and_order_as_model(self):
+        result = validate_staging_record(_data({"Client": "A"}), "fast")
+        assert list(result) == list(StagingRecord.model_fields)
+
+    def test_coercions_match(self):
+        # str hash -> bytes, int sheet row given as str -> int
+        data = _data({"Client": "A"}, payload_hash="abc", sheet_row_number="12")
+        fast = validate_staging_record(data, "fast")
+        assert fast == validate_staging_record(data, "strict")
+        assert fast["payload_hash"] == b"abc"
+        assert fast["sheet_row_number"] == 12
+
+    def test_defaults_for_missing_fields(self):
+        data = _data({"Client": "A"})
+        del data["source_type"], data["updated_by"], data["total_rub"]
+        assert validate_staging_record(data, "fast") == validate_staging_record(data, "strict")
+
+    @pytest.mark.parametrize(
+        "overrides",
+        [
+            {"client": 123},  # free-form fields must be strings, as in the model
+            {"description": ["a"]},
+            {"received_at": None},
+            {"raw_payload": "not a dict"},
+            {"raw_id": None},
+        ],
+    )
+    def test_both_modes_reject(self, overrides):
+        data = _data({"Client": "A"}, **overrides)
+        with pytest.raises(ValidationError):
+            validate_staging_record(data, "strict")
+        with pytest.raises(ValidationError):
+            validate_staging_record(data, "fast")
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            validate_staging_record(_data({}), "bogus")
+
+
+class TestBatch:
+    """Batch validation reports rejected rows by index in both modes."""
+
+    @pytest.mark.parametrize("mode", ["strict", "fast"])
+    def test_bad_rows_are_isolated(self, mode):
+        records = [_data(p) for p in generate_payloads(5)]
+        records[1]["client"] = 42
+        records[3]["received_at"] = "not a date"
+        records[4]["raw_payload"] = None
+
+        valid, failed = validate_staging_batch(records, mode)
+
+        assert [i for i, _ in failed] == [1, 3, 4]
+        assert len(valid) == 2
+        assert valid[0] == validate_staging_record(records[0], "strict")
+
+    def test_normalize_records_matches_per_row(self):
+        payloads = generate_payloads(20)
+        raw = [{"raw_id": i, "received_at": RECEIVED_AT, "raw_payload": p} for i, p in enumerate(payloads)]
+        raw.append({"raw_id": "bad", "received_at": RECEIVED_AT, "raw_payload": {"Client": 5}})
+
+        valid, failed = normalize_records(raw, "live", validation="fast")
+
+        expected = [
+            normalize_record(i, None, RECEIVED_AT, p, "live", validation="strict") for i, p in enumerate(payloads)
+        ]
+        assert valid == expected
+        assert [r["raw_id"] for r, _ in failed] == ["bad"]